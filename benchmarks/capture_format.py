@@ -0,0 +1,124 @@
+"""
+Compares the binary RCON capture to the text raw_rcon.log, on size, write and read throughput and seeking.
+
+    python benchmarks/capture_format.py raw_rcon.log --output raw_rcon.rcap
+
+The log is converted into a capture, receive times are taken from the Mordhau timestamps in the packets. Seeking reads
+every packet from the middle of the recording onward, the log has to be scanned up to that point while the capture
+starts at the indexed block. Without a log a synthetic one is generated. With `--output` the converted capture is
+kept, which also makes this a converter for old recordings.
+
+The tracker still expects the .env it runs with to exist, the connection details in it are never used.
+"""
+
+import argparse
+import gzip
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+root_path = Path(__file__).parent.parent
+sys.path.insert(0, str(root_path))
+
+from tracker.capture import CaptureReader  # noqa: E402
+from tracker.capture import CaptureWriter  # noqa: E402
+from tracker.capture import index_path  # noqa: E402
+from tracker.replay import packet_time  # noqa: E402
+from tracker.replay import read_packets  # noqa: E402
+from tracker.replay import recording_start  # noqa: E402
+
+
+def synthetic_log(path: Path, packets: int, players: int = 20):
+    ids = [f"{random.getrandbits(64):016X}" for _ in range(players)]
+    start = time.mktime((2021, 5, 1, 2, 0, 0, 0, 0, -1))
+    with open(path, "w") as f:
+        for count in range(packets):
+            timestamp = time.strftime("%Y.%m.%d-%H.%M.%S", time.localtime(start + count / 10))
+            killer, victim = random.sample(range(players), 2)
+            if count % 10:
+                line = f"Killfeed: {timestamp}: {ids[killer]} (Player{killer}) killed {ids[victim]} (Player{victim})"
+            else:
+                line = f"Chat: {ids[killer]}, Player{killer}, (0) gg"
+            f.write(repr(line.encode() + b"\x00\x00") + "\n")
+
+
+def convert(log_path: Path, capture_path: Path) -> int:
+    writer = CaptureWriter(capture_path)
+    received_at = recording_start([log_path]) or 0.0
+    count = 0
+    for _, body in read_packets([log_path]):
+        # Untimed packets, such as chat, keep the time of the packet before them
+        received_at = packet_time(body) or received_at
+        writer.write(body, received_at)
+        count += 1
+    writer.close()
+    return count
+
+
+def timed(function, *args) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def scan_log(log_path: Path, start: float) -> int:
+    """Counts the packets from `start` on, reading the log from the beginning like a replay does"""
+    count = 0
+    started = False
+    for _, body in read_packets([log_path]):
+        if not started:
+            recorded_at = packet_time(body)
+            if recorded_at is None or recorded_at < start:
+                continue
+            started = True
+        count += 1
+    return count
+
+
+def scan_capture(capture_path: Path, start: float) -> int:
+    return sum(1 for received_at, _ in CaptureReader(capture_path).packets(start) if received_at >= start)
+
+
+def main(args):
+    work_dir = Path(tempfile.mkdtemp(prefix="tracker-capture-"))
+    log_path = args.log
+    if not log_path:
+        log_path = work_dir / "raw_rcon.log"
+        synthetic_log(log_path, args.packets)
+    capture_path = args.output or work_dir / "raw_rcon.rcap"
+    if capture_path.exists():
+        sys.exit(f"\"{capture_path}\" already exists, converting into it would append to it")
+    gzip_path = work_dir / "raw_rcon.log.gz"
+    gzip_path.write_bytes(gzip.compress(log_path.read_bytes()))
+
+    write_time, packets = timed(convert, log_path, capture_path)
+    blocks = CaptureReader(capture_path).index()
+    middle = (blocks[0].first_timestamp + blocks[-1].last_timestamp) / 2
+
+    log_size, gzip_size = log_path.stat().st_size, gzip_path.stat().st_size
+    capture_size = capture_path.stat().st_size + index_path(capture_path).stat().st_size
+    print(f"{packets:,} packets in {len(blocks)} blocks")
+    print(f"{'format':<16}{'size MB':>10}{'ratio':>8}")
+    for name, size in (("text", log_size), ("text gzip", gzip_size), ("capture", capture_size)):
+        print(f"{name:<16}{size / 1e6:>10.2f}{log_size / size:>7.1f}x")
+
+    log_read, _ = timed(lambda: sum(1 for _ in read_packets([log_path])))
+    capture_read, _ = timed(lambda: sum(1 for _ in CaptureReader(capture_path).packets()))
+    log_seek, log_count = timed(scan_log, log_path, middle)
+    capture_seek, capture_count = timed(scan_capture, capture_path, middle)
+    print(f"Converted at {packets / write_time:,.0f} packets/sec, including reading the text log")
+    print(f"Full read: text {packets / log_read:,.0f} packets/sec, capture {packets / capture_read:,.0f} packets/sec")
+    print(f"Replay from the middle ({log_count:,} packets): text {log_seek * 1000:.1f}ms, "
+          f"capture {capture_seek * 1000:.1f}ms ({capture_count:,} packets)")
+    if args.output:
+        print(f"Wrote the capture to \"{args.output}\"")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("log", nargs="?", type=Path, help="A raw_rcon.log to convert, synthetic if not given")
+    parser.add_argument("--packets", type=int, default=500_000, help="Packets in the synthetic log")
+    parser.add_argument("--output", type=Path, help="Where to keep the converted capture")
+    main(parser.parse_args())
@@ -0,0 +1,82 @@
+"""
+Measures how fast RCON lines are classified into Mordhau events, comparing the original per-type substring search
+against the compiled single pass `classify`.
+
+    python benchmarks/classifier.py raw_rcon.log --repeat 5
+
+Without a log a synthetic corpus of Killfeed, Scorefeed, Chat and Login lines is used instead.
+"""
+
+import argparse
+import ast
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Importing the tracker has no side effects, so the benchmark imports it like anything else
+from tracker import mordhau_events
+from tracker import rcon
+
+
+def substring_classify(line: str) -> list[tuple[str, str]]:
+    """The classification mordhau_event_parser did before it was compiled into a single pass"""
+    events = []
+    for mord_type in mordhau_events.MordhauType:
+        mord_type = str(mord_type)
+        if mord_type in line:
+            for content in line.split(mord_type):
+                if content:
+                    events.append((mord_type, content.strip()))
+    return events
+
+
+def synthetic_corpus(size: int) -> list[str]:
+    templates = [
+        "Killfeed: 2021.05.01-02.25.29: 5E92E0B55E90869C (Sbinalla) killed 8A7C2E3B1F0D4C5A (Clinically Lazy)",
+        "Scorefeed: 2021.05.01-02.25.29: Team 0's is now 7.0 points from 6.0 points",
+        "Chat: 5E92E0B55E90869C, Sbinalla, (0) -match setup Vanquish, Racecar, skm_moshpit",
+        "Login: 2021.05.01-02.25.29: Sbinalla (5E92E0B55E90869C) logged in",
+        "MatchState: 2021.05.01-02.25.29: In progress",
+    ]
+    return [templates[index % len(templates)] for index in range(size)]
+
+
+def read_corpus(path: Path) -> list[str]:
+    lines = []
+    with open(path) as f:
+        for line in f:
+            try:
+                body = ast.literal_eval(line.strip())
+            except (ValueError, SyntaxError):
+                body = line.strip().encode()
+            lines.extend(rcon.split_messages(body))
+    return lines
+
+
+def bench(name: str, classify, lines: list[str], repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            classify(line)
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<10} {len(lines) / best:>14,.0f} events/sec ({best * 1000:.2f}ms for {len(lines)} lines)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("log", nargs="?", type=Path, help="A raw_rcon.log to classify")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--size", type=int, default=100_000, help="Lines in the synthetic corpus")
+    args = parser.parse_args()
+
+    if args.log:
+        if not args.log.exists():
+            sys.exit(f"The log \"{args.log}\" does not exist")
+        corpus = read_corpus(args.log)
+    else:
+        corpus = synthetic_corpus(args.size)
+    bench("substring", substring_classify, corpus, args.repeat)
+    bench("compiled", mordhau_events.classify, corpus, args.repeat)
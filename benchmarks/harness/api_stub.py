@@ -0,0 +1,144 @@
+"""
+A local stand-in for the MFC-ELO API, implementing the endpoints the tracker uses with injectable latency and errors.
+
+    python benchmarks/harness/api_stub.py --port 8000 --latency 20 --jitter 5 --error-rate 0.01
+
+Point the tracker at it with `API_URL=http://127.0.0.1:8000` and any `API_TOKEN`. Everything is kept in memory,
+players are registered on `/player/create` and teams are created the first time they are looked up by name, they're
+all listed on `/team/all`. Rounds can be created with their players, one at a time or in batches, and gzip compressed
+request bodies are accepted.
+Request counts per endpoint and status are served from `/stats`.
+"""
+
+import argparse
+import asyncio
+import itertools
+import random
+from collections import Counter
+
+from aiohttp import web
+
+
+class StubAPI:
+
+    def __init__(self, latency: float, jitter: float, error_rate: float):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.ids = itertools.count(1)
+        self.players: dict[str, int] = {}
+        self.teams: dict[str, int] = {}
+        self.round_players = 0
+        self.requests = Counter()
+        self.idempotent_responses: dict[str, bytes] = {}
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if request.path != "/stats" and random.random() < self.error_rate:
+            response = web.json_response({"detail": "Injected error"}, status=503)
+        elif (key := request.headers.get("Idempotency-Key")) in self.idempotent_responses:
+            # A replayed write gets the response of the original instead of being applied twice
+            response = web.Response(body=self.idempotent_responses[key], content_type="application/json")
+        else:
+            response = await handler(request)
+            if key and response.status == 200:
+                self.idempotent_responses[key] = response.body
+        self.requests[f"{request.method} {request.path} {response.status}"] += 1
+        return response
+
+    def created(self, **ids) -> web.Response:
+        return web.json_response({"extra": [ids]})
+
+    async def verify(self, request: web.Request):
+        return web.json_response({"detail": "Verified"})
+
+    async def player_by_playfab_id(self, request: web.Request):
+        if (player_id := self.players.get(request.query.get("playfab_id"))) is None:
+            return web.json_response({"detail": "Player not found"}, status=404)
+        return web.json_response({"id": player_id})
+
+    async def create_player(self, request: web.Request):
+        data = await request.json()
+        if data["playfab_id"] in self.players:
+            return web.json_response({"detail": "Player already exists"}, status=409)
+        self.players[data["playfab_id"]] = player_id = next(self.ids)
+        return self.created(player_id=player_id)
+
+    async def team_by_name(self, request: web.Request):
+        team_name = request.query.get("team_name", "")
+        if team_name not in self.teams:
+            self.teams[team_name] = next(self.ids)
+        return web.json_response({"id": self.teams[team_name], "team_name": team_name})
+
+    async def list_teams(self, request: web.Request):
+        return web.json_response([{"id": team_id, "team_name": name} for name, team_id in self.teams.items()])
+
+    async def create_match(self, request: web.Request):
+        await request.json()
+        return self.created(match_id=next(self.ids))
+
+    async def create_set(self, request: web.Request):
+        await request.json()
+        return self.created(set_id=next(self.ids))
+
+    async def create_round(self, request: web.Request):
+        await request.json()
+        return self.created(round_id=next(self.ids))
+
+    async def create_round_players(self, request: web.Request):
+        self.round_players += len((await request.json())["round_players"])
+        return web.json_response({"detail": "Created round players"})
+
+    async def create_round_with_players(self, request: web.Request):
+        self.round_players += len((await request.json())["round_players"])
+        return self.created(round_id=next(self.ids))
+
+    async def create_rounds(self, request: web.Request):
+        rounds = (await request.json())["rounds"]
+        self.round_players += sum(len(api_round["round_players"]) for api_round in rounds)
+        return web.json_response({"extra": [{"round_id": next(self.ids)} for _ in rounds]})
+
+    async def calculate_match_elo(self, request: web.Request):
+        return web.json_response({"detail": "Calculated match elo"})
+
+    async def stats(self, request: web.Request):
+        return web.json_response({
+            "players": len(self.players),
+            "teams": len(self.teams),
+            "round_players": self.round_players,
+            "requests": dict(self.requests),
+        })
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        app.add_routes([
+            web.post("/user/verify", self.verify),
+            web.get("/player/playfab-id", self.player_by_playfab_id),
+            web.post("/player/create", self.create_player),
+            web.get("/team/name", self.team_by_name),
+            web.get("/team/all", self.list_teams),
+            web.post("/match/create-match", self.create_match),
+            web.post("/set/create-set", self.create_set),
+            web.post("/round/create-round", self.create_round),
+            web.post("/round/create-round-players", self.create_round_players),
+            web.post("/round/create-round-with-players", self.create_round_with_players),
+            web.post("/round/create-rounds", self.create_rounds),
+            web.post("/match/calculate-match-elo", self.calculate_match_elo),
+            web.get("/stats", self.stats),
+        ])
+        return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0, help="Milliseconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0, help="Milliseconds the latency randomly varies by")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of requests answered with a 503")
+    args = parser.parse_args()
+    stub = StubAPI(args.latency / 1000, args.jitter / 1000, args.error_rate)
+    web.run_app(stub.app(), host=args.host, port=args.port)
@@ -0,0 +1,194 @@
+"""
+A fake Mordhau server speaking the Source RCON protocol, for load testing the tracker without a live server.
+
+    python benchmarks/harness/rcon_server.py --port 7778 --password password --players 20 --rate 2000
+
+It answers `info`, `scoreboard` and `changelevel`, accepts `say` and anything else with an empty response, and once a
+connection sends `listen allon` it streams synthetic kills and chat messages to it at `--rate` per second, each kill
+is a Killfeed event followed by the killer's Scorefeed. Simulated players log in when the stream starts and their
+scoreboard follows the kills that were streamed, a team scores a round every `--round-every` seconds.
+
+With `--merge` several events are packed into one packet, NUL separated, like a busy Mordhau server occasionally does.
+`--latency` delays every response, including the authentication, to simulate a server that isn't on the same host.
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[2]))
+
+from tracker import rcon  # noqa: E402
+
+TICK = 0.01
+PACKET_BODY_SIZE = 4096
+
+
+def packet(pkt_id: int, pkt_type: int, body: bytes) -> bytes:
+    return rcon.HEADER.pack(len(body) + 10, pkt_id, pkt_type) + body + b"\x00\x00"
+
+
+def timestamp() -> str:
+    return time.strftime("%Y.%m.%d-%H.%M.%S")
+
+
+@dataclass
+class SimulatedPlayer:
+    playfab_id: str
+    name: str
+    team: int
+    score: int = 0
+    kills: int = 0
+    deaths: int = 0
+    assists: int = 0
+
+    def scoreboard_row(self) -> str:
+        return (f"{self.playfab_id}, {self.name}, {self.team}, 0, {self.score}, {self.kills}, {self.deaths}, "
+                f"{self.assists}")
+
+
+class FakeMordhauServer:
+
+    def __init__(self, password: str, players: int, rate: float, round_every: float, merge: int, latency: float = 0):
+        self.password = password
+        self.latency = latency
+        self.rate = rate
+        self.round_every = round_every
+        self.merge = max(merge, 1)
+        self.map = "skm_moshpit"
+        self.players = [
+            SimulatedPlayer(f"{random.getrandbits(64):016X}", f"Player{index}", index % 2) for index in range(players)
+        ]
+        self.team_scores = [0, 0]
+        self.listeners: set[asyncio.StreamWriter] = set()
+        self.sent = 0
+
+    def command(self, command: str) -> str:
+        name, _, argument = command.partition(" ")
+        if name == "info":
+            return f"HostName: Fake Mordhau Server\nGame Mode: Skirmish\nMap: {self.map}"
+        if name == "scoreboard":
+            return "\n".join(player.scoreboard_row() for player in self.players)
+        if name == "changelevel":
+            self.map = argument.strip() or self.map
+            self.team_scores = [0, 0]
+            for player in self.players:
+                player.score = player.kills = player.deaths = player.assists = 0
+            self.broadcast([f"MatchState: {timestamp()}: Leaving map", f"MatchState: {timestamp()}: Waiting to start",
+                            f"MatchState: {timestamp()}: In progress"])
+        return ""
+
+    def broadcast(self, events: list[str]):
+        for start in range(0, len(events), self.merge):
+            data = packet(0, rcon.SERVERDATA_RESPONSE_VALUE, "\x00".join(events[start:start + self.merge]).encode())
+            for writer in list(self.listeners):
+                if writer.is_closing():
+                    self.listeners.discard(writer)
+                else:
+                    writer.write(data)
+        self.sent += len(events)
+
+    def event(self) -> list[str]:
+        roll = random.random()
+        killer, victim = random.sample(self.players, 2)
+        if roll < 0.9:
+            killer.kills += 1
+            killer.score += 100
+            victim.deaths += 1
+            return [f"Killfeed: {timestamp()}: {killer.playfab_id} ({killer.name}) killed {victim.playfab_id} "
+                    f"({victim.name})",
+                    f"Scorefeed: {timestamp()}: {killer.name} ({killer.playfab_id})'s score is now {killer.score} "
+                    f"points from {killer.score - 100} points"]
+        return [f"Chat: {killer.playfab_id}, {killer.name}, (0) gg"]
+
+    def round_end(self) -> str:
+        team = random.randint(0, 1)
+        self.team_scores[team] += 1
+        return (f"Scorefeed: {timestamp()}: Team {team}'s is now {self.team_scores[team]}.0 points from "
+                f"{self.team_scores[team] - 1}.0 points")
+
+    async def stream(self):
+        budget = 0.0
+        last_round = last_tick = time.monotonic()
+        while True:
+            await asyncio.sleep(TICK)
+            # Budgeted from the time that actually passed, sleeps overshoot the tick under load
+            now, elapsed = time.monotonic(), time.monotonic() - last_tick
+            last_tick = now
+            if not self.listeners:
+                continue
+            budget += self.rate * elapsed
+            events = [event for _ in range(int(budget)) for event in self.event()]
+            budget -= int(budget)
+            if time.monotonic() - last_round >= self.round_every:
+                last_round = time.monotonic()
+                events.append(self.round_end())
+            if events:
+                self.broadcast(events)
+
+    async def report(self):
+        while True:
+            sent = self.sent
+            await asyncio.sleep(5)
+            print(f"Streaming {(self.sent - sent) / 5:,.0f} events/sec to {len(self.listeners)} listeners")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        decoder = rcon.RconFrameDecoder()
+        authenticated = False
+        try:
+            while data := await reader.read(rcon.READ_SIZE):
+                for pkt_id, pkt_type, body in decoder.feed(data):
+                    if self.latency and pkt_type != rcon.SERVERDATA_RESPONSE_VALUE:  # Not the end of response packets
+                        await asyncio.sleep(self.latency)
+                    body = rcon.format_body(body)
+                    if pkt_type == rcon.SERVERDATA_AUTH:
+                        authenticated = body == self.password
+                        writer.write(packet(pkt_id, rcon.SERVERDATA_RESPONSE_VALUE, b""))
+                        writer.write(packet(pkt_id if authenticated else -1, rcon.SERVERDATA_AUTH_RESPONSE, b""))
+                    elif not authenticated:
+                        writer.close()
+                        return
+                    elif body == "listen allon":
+                        writer.write(packet(pkt_id, rcon.SERVERDATA_RESPONSE_VALUE, b"Listening to all"))
+                        self.listeners.add(writer)
+                        self.broadcast([f"Login: {timestamp()}: {player.name} ({player.playfab_id}) logged in"
+                                        for player in self.players])
+                    else:
+                        # Long responses are split over several packets, like a Mordhau server does
+                        response = self.command(body).encode()
+                        for start in range(0, max(len(response), 1), PACKET_BODY_SIZE):
+                            writer.write(packet(pkt_id, rcon.SERVERDATA_RESPONSE_VALUE,
+                                                response[start:start + PACKET_BODY_SIZE]))
+                await writer.drain()
+        except (ConnectionError, rcon.RconError):
+            pass
+        finally:
+            self.listeners.discard(writer)
+            writer.close()
+
+
+async def main(args):
+    fake_server = FakeMordhauServer(args.password, args.players, args.rate, args.round_every, args.merge,
+                                    args.latency / 1000)
+    server = await asyncio.start_server(fake_server.handle, args.host, args.port)
+    print(f"Fake Mordhau RCON listening on {args.host}:{args.port} with {args.players} players at {args.rate} "
+          f"events/sec")
+    async with server:
+        await asyncio.gather(server.serve_forever(), fake_server.stream(), fake_server.report())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7778)
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--players", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=100, help="Kills and chat messages streamed per second")
+    parser.add_argument("--round-every", type=float, default=30, help="Seconds between round ends")
+    parser.add_argument("--merge", type=int, default=1, help="Events packed into each streamed packet")
+    parser.add_argument("--latency", type=float, default=0, help="Milliseconds added to every response")
+    asyncio.run(main(parser.parse_args()))
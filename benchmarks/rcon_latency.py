@@ -0,0 +1,84 @@
+"""
+Compares RCON command latency between the old subprocess-per-command path (the external `RCON` CLI) and the persistent
+asyncio client in `tracker.rcon`.
+
+    python benchmarks/rcon_latency.py --command info --iterations 50 --concurrency 4
+
+Connection details are read from the same RCON_IP, RCON_PORT and RCON_PASSWORD environment variables as the tracker.
+The subprocess path is skipped when the `RCON` CLI is not on the PATH.
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from tracker import rcon  # noqa: E402
+
+
+async def subprocess_command(ip: str, port: int, password: str, command: str) -> str:
+    process = await asyncio.create_subprocess_shell(
+        f"RCON --Server {ip} --Port {port} --Password {password} -c \"{command}\"",
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    return (await process.communicate())[0].decode()
+
+
+async def measure(issue, iterations: int, concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def timed():
+        async with semaphore:
+            start = time.perf_counter()
+            await issue()
+            timings.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(timed() for _ in range(iterations)))
+    return timings
+
+
+def report(name: str, timings: list[float], elapsed: float):
+    timings = sorted(timings)
+    print(f"{name:<12} n={len(timings):<5} mean={statistics.fmean(timings):8.2f}ms "
+          f"p50={timings[len(timings) // 2]:8.2f}ms p95={timings[int(len(timings) * 0.95) - 1]:8.2f}ms "
+          f"total={elapsed:8.2f}s")
+
+
+async def main(args):
+    ip = os.getenv("RCON_IP", default="127.0.0.1")
+    port = int(os.getenv("RCON_PORT", default=7778))
+    password = os.getenv("RCON_PASSWORD", default="")
+
+    if shutil.which("RCON"):
+        start = time.perf_counter()
+        timings = await measure(lambda: subprocess_command(ip, port, password, args.command), args.iterations,
+                                args.concurrency)
+        report("subprocess", timings, time.perf_counter() - start)
+    else:
+        print("The `RCON` CLI is not installed, skipping the subprocess comparison")
+
+    pool = rcon.RconPool(ip, port, password, size=args.pool_size)
+    await pool.execute(args.command)  # Connect and authenticate ahead of the timed run
+    start = time.perf_counter()
+    timings = await measure(lambda: pool.execute(args.command), args.iterations, args.concurrency)
+    report("pool", timings, time.perf_counter() - start)
+    await pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--command", default="info")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--pool-size", type=int, default=2)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,267 @@
+"""
+Replays a recorded RCON corpus through the tracker's real pipeline and reports throughput and latency per stage.
+
+    python benchmarks/replay_pipeline.py raw_rcon.log --rcon-latency 5 --api-latency 20 --output results.json
+
+Packets go through `Base.run`, the ingest workers, `avents.parse`, `mordhau_event_parser`, the `ChatCommandHandler` and
+`Game.process_round_end` exactly as they do live. Only the edges are swapped out, RCON commands and API requests are
+answered by in-process stubs that wait a configurable latency. Without a corpus a synthetic match is generated.
+
+The stages reported are:
+    ingest          one message from an ingest worker until every listener has handled it
+    classification  mordhau_event_parser's classification of one line
+    command         dispatch of one chat command to its listeners
+    round_end       Game.process_round_end, from the Scorefeed event until the round is queued
+    saved           from the Scorefeed event until the outbox delivered the round to the API
+    api             one stubbed API request, including its latency
+    rcon            one stubbed RCON command, including its latency
+
+The .env the tracker runs with is loaded if there is one, the connection details are never used and placeholders stand
+in for them when they aren't set.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from types import SimpleNamespace
+
+root_path = Path(__file__).parent.parent
+sys.path.insert(0, str(root_path))
+
+# Keep the benchmark's player cache and outbox away from the real ones
+benchmark_dir = Path(tempfile.mkdtemp(prefix="tracker-bench-"))
+os.environ["PLAYER_CACHE_PATH"] = str(benchmark_dir / "player_cache.json")
+os.environ["OUTBOX_PATH"] = str(benchmark_dir / "outbox.sqlite3")
+os.environ["OUTBOX_BACKOFF"] = "0"
+# Waits are skipped in a replay, a periodic scoreboard check would never stop running
+os.environ["MATCH_RECONCILE_INTERVAL"] = "0"
+
+from tracker.settings import load_environment  # noqa: E402
+
+load_environment()
+for variable, placeholder in (("API_URL", "http://127.0.0.1"), ("API_TOKEN", "benchmark"), ("RCON_IP", "127.0.0.1"),
+                              ("RCON_PORT", "7778"), ("RCON_PASSWORD", "benchmark")):
+    os.environ.setdefault(variable, placeholder)
+
+from tracker import Base  # noqa: E402
+from tracker import base  # noqa: E402
+from tracker import mordhau_events  # noqa: E402
+from tracker.apirequest import APIRequest  # noqa: E402
+from tracker.mordhau_events.records import parse_killfeed  # noqa: E402
+from tracker.outbox import Outbox  # noqa: E402
+
+timings: dict[str, list[float]] = defaultdict(list)
+
+
+def timed(stage: str, coroutine_function):
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await coroutine_function(*args, **kwargs)
+        finally:
+            timings[stage].append(time.perf_counter() - start)
+
+    return wrapper
+
+
+def timed_sync(stage: str, function):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timings[stage].append(time.perf_counter() - start)
+
+    return wrapper
+
+
+class Stubs:
+    """In-process stand-ins for the Mordhau server and the MFC API"""
+
+    def __init__(self, rcon_latency: float, api_latency: float):
+        self.rcon_latency = rcon_latency
+        self.api_latency = api_latency
+        self.ids = itertools.count(1)
+        # playfab id: [name, team, score, kills, deaths, assists]
+        self.scoreboard: dict[str, list] = {}
+
+    async def rcon_execute(self, command: str) -> str:
+        await asyncio.sleep(self.rcon_latency)
+        if command == "info":
+            from tracker.mordhau_events.commands.game.game import Game
+
+            game = Game.of(None)
+            return f"Map: {game.current_set.map if game.current_set else 'skm_moshpit'}"
+        if command == "scoreboard":
+            return "\n".join(f"{playfab_id}, {name}, {team}, 0, {score}, {kills}, {deaths}, {assists}"
+                             for playfab_id, (name, team, score, kills, deaths, assists) in self.scoreboard.items())
+        return ""
+
+    async def api_request(self, method: str, full_url: str, retries: int = 0, **kwargs) -> APIRequest.Response:
+        await asyncio.sleep(self.api_latency)
+        endpoint = full_url[len(APIRequest.api_url):].split("?")[0]
+        if endpoint in ("/player/playfab-id", "/team/name"):
+            return APIRequest.Response({"id": next(self.ids)}, 200)
+        if endpoint == "/player/create":
+            return APIRequest.Response({"extra": [{"player_id": next(self.ids)}]}, 200)
+        if endpoint.startswith("/") and endpoint.count("/") == 2 and endpoint.split("/")[2].startswith("create-"):
+            kind = endpoint.split("/")[1]
+            return APIRequest.Response({"extra": [{f"{kind}_id": next(self.ids)}]}, 200)
+        return APIRequest.Response({}, 200)
+
+    def track_player(self, message: str):
+        """Keeps a scoreboard of every player seen logging in and their kills, so round ends have players to process"""
+        if message.startswith("Login:") and "logged in" in message:
+            name, playfab_id = message.rsplit(" (", 1)[0].split(": ")[-1], message.rsplit("(", 1)[1].split(")")[0]
+            team = len(self.scoreboard) % 2
+            self.scoreboard[playfab_id] = [name, team, 100, 0, 0, 1]
+        elif message.startswith("Killfeed:") and (kill := parse_killfeed(message.split(": ", 1)[1])):
+            if killer := self.scoreboard.get(kill.killer_id):
+                killer[3] += 1
+            if victim := self.scoreboard.get(kill.victim_id):
+                victim[4] += 1
+
+
+def synthetic_corpus(path: Path, rounds: int, players: int, kills_per_round: int):
+    """Writes a recorded match, a setup, logins, killfeed and chat between each round end and a match end"""
+    admin = "AD0000000000000A"
+    packets = [
+        f"Chat: {admin}, Admin, (0) -match setup Red, Blue, skm_moshpit",
+        f"Chat: {admin}, Admin, (0) -match start",
+    ]
+    packets += [f"Login: 2021.05.01-02.00.00: Player{i} (P{i:015d}) logged in" for i in range(players)]
+    second = 0
+    for round_number in range(rounds):
+        for kill in range(kills_per_round):
+            second += 1
+            killer, victim = kill % players, (kill + 1) % players
+            timestamp = f"2021.05.01-{2 + second // 3600:02d}.{second // 60 % 60:02d}.{second % 60:02d}"
+            packets.append(f"Killfeed: {timestamp}: P{killer:015d} (Player{killer}) killed P{victim:015d} "
+                           f"(Player{victim})")
+            if kill % 10 == 0:
+                packets.append(f"Chat: P{killer:015d}, Player{killer}, (0) gg")
+        packets.append(f"Scorefeed: {timestamp}: Team {round_number % 2}'s is now {round_number + 1}.0 points from "
+                       f"{round_number}.0 points")
+    packets.append(f"Chat: {admin}, Admin, (0) -match end")
+    with open(path, "w") as f:
+        for packet in packets:
+            f.write(repr(packet.encode() + b"\x00\x00") + "\n")
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(elapsed: float) -> dict:
+    stages = {}
+    for stage, values in timings.items():
+        values = sorted(values)
+        stages[stage] = {
+            "count": len(values),
+            "per_second": len(values) / elapsed if elapsed else 0,
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+            "max_ms": values[-1] * 1000,
+        }
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "version": (root_path / "VERSION").read_text().strip(),
+        "python": platform.python_version(),
+        "elapsed_s": elapsed,
+        "events_per_second": len(timings["ingest"]) / elapsed if elapsed else 0,
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        "peak_rss_mb": peak_rss / (1024 * 1024 if sys.platform == "darwin" else 1024),
+        "stages": stages,
+    }
+
+
+def instrument(stubs: Stubs):
+    from tracker import ingest
+    from tracker.mordhau_events.commands import CommandListener
+    from tracker.mordhau_events.commands.game import game
+    from tracker.mordhau_events.commands.game.game import Game
+
+    base.setup_logging = lambda settings: None
+    Base.configure()
+    for server in Base.servers.values():
+        server.rcon_pool.execute = timed("rcon", stubs.rcon_execute)
+    APIRequest._request = timed("api", stubs.api_request)
+
+    original_parse = ingest.parse
+
+    async def handle(event):
+        stubs.track_player(event.content)
+        await original_parse(event)
+
+    ingest.parse = timed("ingest", handle)
+    mordhau_events.classify = timed_sync("classification", mordhau_events.classify)
+    CommandListener.parse = timed("command", CommandListener.parse)
+    Game.process_round_end = timed("round_end", Game.process_round_end)
+    observe = game.round_end_time.observe
+
+    def observe_saved(value: float, *labels: str):
+        if labels == ("saved",):
+            timings["saved"].append(value)
+        observe(value, *labels)
+
+    game.round_end_time.observe = observe_saved
+    Game.check_admin_perm = classmethod(lambda cls, playfab_id: asyncio.sleep(0, True))
+    Game.valid_map = classmethod(lambda cls, map: map)
+    # next_set waits for the map to change, which there is no need for in a replay
+    game.asyncio = SimpleNamespace(**{**vars(asyncio), "sleep": lambda delay, result=None: asyncio.sleep(0, result)})
+
+    original_close = Base.close
+
+    async def close():
+        while Outbox.pending():  # Let the outbox finish submitting to the API before shutting down
+            await asyncio.sleep(0.01)
+        await original_close()
+
+    Base.close = close
+
+
+async def main(args):
+    corpus = args.corpus
+    if not corpus:
+        corpus = benchmark_dir / "raw_rcon.log"
+        synthetic_corpus(corpus, args.rounds, args.players, args.kills_per_round)
+
+    instrument(Stubs(args.rcon_latency / 1000, args.api_latency / 1000))
+    start = time.perf_counter()
+    await Base.run("--read-log", str(corpus))
+    results = summarize(time.perf_counter() - start)
+    results["corpus"] = str(args.corpus or "synthetic")
+    results["rcon_latency_ms"] = args.rcon_latency
+    results["api_latency_ms"] = args.api_latency
+
+    print(f"{results['events_per_second']:,.0f} events/sec over {results['elapsed_s']:.2f}s, "
+          f"peak RSS {results['peak_rss_mb']:.1f}MB")
+    print(f"{'stage':<16}{'count':>8}{'per sec':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, stats in results["stages"].items():
+        print(f"{stage:<16}{stats['count']:>8}{stats['per_second']:>12,.0f}{stats['p50_ms']:>10.3f}"
+              f"{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}{stats['max_ms']:>10.3f}")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"Wrote results to \"{args.output}\"")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("corpus", nargs="?", type=Path, help="A raw_rcon.log to replay, synthetic if not given")
+    parser.add_argument("--rcon-latency", type=float, default=0, help="Milliseconds each RCON command takes")
+    parser.add_argument("--api-latency", type=float, default=0, help="Milliseconds each API request takes")
+    parser.add_argument("--rounds", type=int, default=50, help="Rounds in the synthetic match")
+    parser.add_argument("--players", type=int, default=20, help="Players in the synthetic match")
+    parser.add_argument("--kills-per-round", type=int, default=100, help="Killfeed events per synthetic round")
+    parser.add_argument("--output", type=Path, help="Where to write the JSON results")
+    asyncio.run(main(parser.parse_args()))
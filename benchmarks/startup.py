@@ -0,0 +1,150 @@
+"""
+Measures how long the tracker takes to start, from launching its process until the first event arrives from the server.
+
+    python benchmarks/startup.py --iterations 10 --rcon-latency 30 --api-latency 30 --output results.json
+
+The fake Mordhau server and API stub in `benchmarks/harness` are started on free ports, with the given latency added to
+every response, and each iteration starts a fresh tracker process against them, so every run pays for the interpreter
+and its imports like a real start does. The stages reported are the time, from launching the process, until:
+
+    import          `tracker.base` is imported and the settings validated
+    connected       the servers answered `info`
+    authenticated   the event listeners were imported and the API verified the token
+    first_event     the first event from the server was handed to the ingest workers
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+root_path = Path(__file__).parent.parent
+harness_path = Path(__file__).parent / "harness"
+
+STAGES = ("import", "connected", "authenticated", "first_event")
+
+
+def child():
+    """Starts the tracker, printing when each stage finished, relative to the time the parent launched it"""
+    launched_at = float(os.environ["STARTUP_LAUNCHED_AT"])
+    sys.path.insert(0, str(root_path))
+
+    from tracker.settings import Settings
+
+    settings = Settings.from_environment()
+    from tracker import Base
+
+    stages = {"import": time.time()}
+
+    def timed(stage: str, coroutine_function):
+        async def wrapper(*args, **kwargs):
+            result = await coroutine_function(*args, **kwargs)
+            stages.setdefault(stage, time.time())
+            return result
+
+        return wrapper
+
+    Base.connect = timed("connected", Base.connect)
+    Base.authenticate = timed("authenticated", Base.authenticate)
+    ingest = Base.ingest
+
+    async def first_event(packets):
+        async for body in packets:
+            stages["first_event"] = time.time()
+            print(json.dumps({stage: (stages[stage] - launched_at) * 1000 for stage in STAGES}), flush=True)
+            os._exit(0)  # Shutting down isn't part of starting
+            yield body
+
+    Base.ingest = lambda server, packets, record=True: ingest(server, first_event(packets), record)
+    Base.configure(settings)
+    asyncio.run(Base.run())
+    sys.exit("The tracker stopped before the first event arrived")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"The harness did not start listening on port {port}")
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def main(args):
+    rcon_port, api_port = free_port(), free_port()
+    harness = [
+        subprocess.Popen([sys.executable, str(harness_path / "rcon_server.py"), "--port", str(rcon_port),
+                          "--password", "startup", "--latency", str(args.rcon_latency)], stdout=subprocess.DEVNULL),
+        subprocess.Popen([sys.executable, str(harness_path / "api_stub.py"), "--port", str(api_port),
+                          "--latency", str(args.api_latency)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL),
+    ]
+    runs = []
+    try:
+        wait_for_port(rcon_port)
+        wait_for_port(api_port)
+        with tempfile.TemporaryDirectory(prefix="tracker-startup-") as directory:
+            # The logs, outbox, caches and captures of the runs are kept away from the real ones
+            environment = {**os.environ, "RCON_IP": "127.0.0.1", "RCON_PORT": str(rcon_port),
+                           "RCON_PASSWORD": "startup", "API_URL": f"http://127.0.0.1:{api_port}",
+                           "API_TOKEN": "startup", "OUTBOX_PATH": str(Path(directory) / "outbox.sqlite3"),
+                           "PLAYER_CACHE_PATH": str(Path(directory) / "player_cache.json"),
+                           "CAPTURE_PATH": str(Path(directory) / "raw_rcon.rcap"), "METRICS_PORT": "0"}
+            for iteration in range(args.iterations):
+                environment["STARTUP_LAUNCHED_AT"] = str(time.time())
+                process = subprocess.run([sys.executable, __file__, "--child"], env=environment, cwd=directory,
+                                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, timeout=60)
+                if process.returncode != 0:
+                    sys.exit(f"Run {iteration + 1} of the tracker exited with code {process.returncode}")
+                runs.append(json.loads(process.stdout.strip().splitlines()[-1]))
+                print(f"Run {iteration + 1}: first event after {runs[-1]['first_event']:.0f}ms")
+    finally:
+        for process in harness:
+            process.terminate()
+            process.wait()
+
+    results = {
+        "iterations": args.iterations,
+        "rcon_latency_ms": args.rcon_latency,
+        "api_latency_ms": args.api_latency,
+        "python": sys.version.split()[0],
+        "stages": {stage: {"p50_ms": percentile([run[stage] for run in runs], 0.5),
+                           "min_ms": min(run[stage] for run in runs),
+                           "max_ms": max(run[stage] for run in runs)} for stage in STAGES},
+    }
+    print(f"{'stage':<16}{'p50 ms':>10}{'min ms':>10}{'max ms':>10}")
+    for stage, stats in results["stages"].items():
+        print(f"{stage:<16}{stats['p50_ms']:>10.1f}{stats['min_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"Wrote results to \"{args.output}\"")
+
+
+if __name__ == "__main__":
+    if "--child" in sys.argv:
+        child()
+    else:
+        parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+        parser.add_argument("--iterations", type=int, default=10, help="Tracker processes started")
+        parser.add_argument("--rcon-latency", type=float, default=0, help="Milliseconds each RCON response takes")
+        parser.add_argument("--api-latency", type=float, default=0, help="Milliseconds each API response takes")
+        parser.add_argument("--output", type=Path, help="Where to write the JSON results")
+        main(parser.parse_args())
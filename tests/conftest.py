@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The tests import the tracker from the checkout, whichever directory pytest is run from
+sys.path.insert(0, str(Path(__file__).parent.parent))
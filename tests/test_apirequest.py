@@ -0,0 +1,96 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+
+from tracker.apirequest import APIRequest
+
+
+@pytest.fixture
+def api(monkeypatch):
+    monkeypatch.setattr(APIRequest, "session", None)
+    monkeypatch.setattr(APIRequest, "api_url", "")
+    monkeypatch.setattr(APIRequest, "retry_backoff", 0)
+    monkeypatch.setattr(APIRequest, "pool_waits", 0)
+    return APIRequest
+
+
+def serve(*statuses: int):
+    """Runs a request against an API answering with the statuses given, in turn, then with 200"""
+    statuses = list(statuses)
+    hits = []
+
+    async def handle(request: web.Request) -> web.Response:
+        hits.append(request.path)
+        status = statuses.pop(0) if statuses else 200
+        return web.json_response({"status": status}, status=status)
+
+    async def run(request):
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        APIRequest.api_url = f"http://127.0.0.1:{runner.addresses[0][1]}"
+        try:
+            return await request()
+        finally:
+            await APIRequest.close()
+            await runner.cleanup()
+
+    return run, hits
+
+
+def test_retries_gets_on_server_errors(api, monkeypatch):
+    monkeypatch.setattr(api, "get_retries", 2)
+    run, hits = serve(503, 500)
+    response = asyncio.run(run(lambda: api.get("/team/name")))
+    assert response.status == 200
+    assert len(hits) == 3
+
+
+def test_returns_the_last_server_error_once_out_of_retries(api, monkeypatch):
+    monkeypatch.setattr(api, "get_retries", 1)
+    run, hits = serve(503, 502, 500)
+    assert asyncio.run(run(lambda: api.get("/team/name"))).status == 502
+    assert len(hits) == 2
+
+
+def test_does_not_retry_posts(api, monkeypatch):
+    monkeypatch.setattr(api, "get_retries", 2)
+    run, hits = serve(503)
+    assert asyncio.run(run(lambda: api.post("/set/create-set", {"map": "skm_moshpit"}))).status == 503
+    assert len(hits) == 1
+
+
+def test_connection_failures_have_their_own_status(api, monkeypatch):
+    monkeypatch.setattr(api, "get_retries", 1)
+    monkeypatch.setattr(api, "api_url", "http://127.0.0.1:1")
+
+    async def run():
+        try:
+            return await api.get("/team/name")
+        finally:
+            await api.close()
+
+    assert asyncio.run(run()).status == APIRequest.CONNECTION_FAILED
+
+
+def test_pool_stats_count_idle_kept_alive_connections(api):
+    run, _ = serve()
+
+    async def request():
+        await api.get("/team/name")
+        return api.pool_stats()
+
+    stats = asyncio.run(run(request))
+    assert (stats["in_use"], stats["idle"]) == (0, 1)
+    assert stats["limit"] == api.connection_limit
+
+
+def test_pool_stats_without_the_private_pool_attributes(api, monkeypatch):
+    monkeypatch.setattr(api, "session", SimpleNamespace(closed=False, connector=SimpleNamespace(_conns=None)))
+    stats = api.pool_stats()
+    assert (stats["in_use"], stats["idle"]) == (0, 0)
@@ -0,0 +1,81 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from tracker import cache
+from tracker.cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(cache, "time", SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def test_entries_expire_after_the_ttl(clock):
+    ids = TTLCache(ttl=10, max_size=10)
+    ids.set("5E9", 1)
+    clock.now += 9.9
+    assert ids.get("5E9") == 1
+    assert "5E9" in ids
+    clock.now += 0.1
+    assert ids.get("5E9") is None
+    assert "5E9" not in ids
+    assert len(ids) == 0
+    assert ids.stats() == {"size": 0, "hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_evicts_the_least_recently_used(clock):
+    ids = TTLCache(ttl=10, max_size=2)
+    ids.set("a", 1)
+    ids.set("b", 2)
+    ids.get("a")  # b is now the least recently used
+    ids.set("c", 3)
+    assert ids.get("b") is None
+    assert (ids.get("a"), ids.get("c")) == (1, 3)
+
+
+def test_persists_between_instances(clock, tmp_path):
+    path = tmp_path / "ids.json"
+    ids = TTLCache(ttl=10, max_size=10, path=path)
+    ids.set("a", 1)
+    ids.set("b", 2)
+    ids.invalidate("b")
+    ids.save()
+    assert not path.with_name("ids.json.tmp").exists()
+
+    clock.now += 5
+    loaded = TTLCache(ttl=10, max_size=10, path=path)
+    assert loaded.get("a") == 1
+    assert loaded.get("b") is None
+    clock.now += 5
+    assert TTLCache(ttl=10, max_size=10, path=path).get("a") is None  # It kept its original expiry
+
+
+def test_loads_only_the_newest_entries_that_fit(clock, tmp_path):
+    path = tmp_path / "ids.json"
+    path.write_text(json.dumps({"old": [1, 1005], "new": [2, 1010], "expired": [3, 999]}))
+    ids = TTLCache(ttl=10, max_size=1, path=path)
+    assert ids.get("new") == 2
+    assert ids.get("old") is None
+    assert len(ids) == 1
+
+
+def test_only_saves_when_changed(clock, tmp_path):
+    path = tmp_path / "ids.json"
+    ids = TTLCache(ttl=10, max_size=10, path=path)
+    ids.get("a")
+    ids.save()
+    assert not path.exists()
+
+
+def test_starts_empty_from_a_corrupt_file(clock, tmp_path):
+    path = tmp_path / "ids.json"
+    path.write_text("{not json")
+    ids = TTLCache(ttl=10, max_size=10, path=path)
+    assert ids.get("a") is None
+    ids.set("a", 1)
+    ids.save()
+    assert json.loads(path.read_text()) == {"a": [1, 1010.0]}
@@ -0,0 +1,75 @@
+import pytest
+
+from tracker.capture import BLOCK_HEADER
+from tracker.capture import CaptureReader
+from tracker.capture import CaptureWriter
+from tracker.capture import index_path
+from tracker.capture import is_capture
+
+PACKETS = [(1000.0 + number, f"Killfeed: packet {number}".encode()) for number in range(10)]
+
+
+def capture(path, packets=PACKETS, per_block: int = 2):
+    """Writes the packets into blocks of `per_block` packets"""
+    writer = CaptureWriter(path)
+    for number, (received_at, body) in enumerate(packets, 1):
+        writer.write(body, received_at)
+        if number % per_block == 0:
+            writer.flush()
+    writer.close()
+
+
+def test_reads_back_what_was_written(tmp_path):
+    path = tmp_path / "raw_rcon.rcap"
+    capture(path)
+    assert is_capture(path)
+    assert list(CaptureReader(path).packets()) == PACKETS
+    assert [block.packets for block in CaptureReader(path).index()] == [2] * 5
+
+
+def test_seeks_to_the_block_holding_the_start(tmp_path):
+    path = tmp_path / "raw_rcon.rcap"
+    capture(path)
+    assert list(CaptureReader(path).packets(1005.0)) == PACKETS[4:]  # Its block starts with the packet before it
+    assert list(CaptureReader(path).packets(1004.0)) == PACKETS[4:]
+    assert list(CaptureReader(path).packets(0)) == PACKETS
+    assert list(CaptureReader(path).packets(2000.0)) == PACKETS[8:]
+
+
+def test_appends_to_an_existing_capture(tmp_path):
+    path = tmp_path / "raw_rcon.rcap"
+    capture(path, PACKETS[:5])
+    capture(path, PACKETS[5:])
+    assert list(CaptureReader(path).packets()) == PACKETS
+
+
+def test_rebuilds_a_missing_or_partial_index(tmp_path):
+    path = tmp_path / "raw_rcon.rcap"
+    capture(path)
+    blocks = CaptureReader(path).index()
+    index_path(path).unlink()
+    assert CaptureReader(path).index() == blocks
+    assert index_path(path).exists()
+
+    index = index_path(path).read_bytes()
+    index_path(path).write_bytes(index[:-3])
+    assert CaptureReader(path).index() == blocks
+    assert index_path(path).read_bytes() == index
+
+
+def test_cuts_off_a_half_written_block_before_appending(tmp_path):
+    path = tmp_path / "raw_rcon.rcap"
+    capture(path, PACKETS[:4])
+    with open(path, "ab") as f:
+        f.write(BLOCK_HEADER.pack(1004.0, 1005.0, 1000, 2) + b"\x78\x9c")  # As a crash part way through would leave it
+    assert list(CaptureReader(path).packets()) == PACKETS[:4]
+    capture(path, PACKETS[4:])
+    assert list(CaptureReader(path).packets()) == PACKETS
+
+
+def test_refuses_to_write_over_other_files(tmp_path):
+    path = tmp_path / "raw_rcon.log"
+    path.write_text("b'Chat: ...'\n")
+    assert not is_capture(path)
+    with pytest.raises(ValueError):
+        CaptureWriter(path)
@@ -0,0 +1,30 @@
+import pytest
+
+from tracker.mordhau_events import commands
+from tracker.mordhau_events.commands import CommandEventType
+from tracker.mordhau_events.commands import resolve_command
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("register", CommandEventType.REGISTER),
+    ("register Sbinalla", CommandEventType.REGISTER),
+    ("match setup Vanquish, Racecar, skm_moshpit", CommandEventType.MATCH_SETUP),
+    ("MATCH Start", CommandEventType.MATCH_START),
+    ("match end now", CommandEventType.MATCH_END),
+])
+def test_resolves_known_commands(message, expected):
+    assert resolve_command(message.split(" ")) is expected
+
+
+@pytest.mark.parametrize("message", ["", "match", "match bogus", "registers", "setup match", "hello there"])
+def test_does_not_resolve_unknown_commands(message):
+    assert resolve_command(message.split(" ")) is None
+
+
+def test_the_longest_matching_command_wins(monkeypatch):
+    lookup = {**commands.COMMAND_LOOKUP, ("match",): "match", ("match", "setup", "teams"): "match setup teams"}
+    monkeypatch.setattr(commands, "COMMAND_LOOKUP", lookup)
+    monkeypatch.setattr(commands, "MAX_COMMAND_WORDS", 3)
+    assert resolve_command(["match", "setup", "teams", "A"]) == "match setup teams"
+    assert resolve_command(["match", "setup", "A"]) is CommandEventType.MATCH_SETUP
+    assert resolve_command(["match", "A"]) == "match"
@@ -0,0 +1,52 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from tracker.apirequest import APIRequest
+from tracker.mordhau_events.commands.game import Match
+from tracker.mordhau_events.commands.game import Team
+from tracker.mordhau_events.commands.game.game import Game
+from tracker.outbox import Outbox
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    monkeypatch.setattr(Outbox, "path", tmp_path / "outbox.sqlite3")
+    monkeypatch.setattr(Outbox, "connection", None)
+    monkeypatch.setattr(Outbox, "callbacks", {})
+    yield Outbox
+    Outbox.connection.close()
+
+
+def game() -> tuple[Game, list[str]]:
+    said = []
+
+    async def rcon_command(command: str) -> str:
+        said.append(command)
+        return ""
+
+    current = Game(SimpleNamespace(id="test", rcon_command=rcon_command))
+    current.match = Match(Team(1, "Red"), Team(2, "Blue"))
+    current.match.id = 7
+    return current, said
+
+
+@pytest.mark.parametrize("status, reported", [(200, False), (422, True)])
+def test_reports_a_failed_elo_calculation_in_chat(outbox, monkeypatch, status: int, reported: bool):
+    async def post(endpoint: str, data: dict = None, headers: dict = None) -> APIRequest.Response:
+        return APIRequest.Response({}, status)
+
+    monkeypatch.setattr(APIRequest, "post", post)
+    current, said = game()
+
+    async def run():
+        await current.end_match()
+        await Outbox._deliver(Outbox._next())
+        await asyncio.gather(*Outbox.notifying)
+
+    asyncio.run(run())
+    assert current.match is None
+    assert said[0] == "say Match ended"
+    assert said[1:] == (["say Could not calculate the ELO of the last match, please contact an admin!"]
+                        if reported else [])
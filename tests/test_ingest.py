@@ -0,0 +1,93 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from tracker import ingest
+from tracker.ingest import Ingest
+from tracker.ingest import droppable
+from tracker.ingest import handling_queue
+from tracker.server import current_server
+
+SERVERS = [SimpleNamespace(id=f"server{number}") for number in range(4)]
+
+
+@pytest.fixture
+def workers(monkeypatch):
+    monkeypatch.setattr(Ingest, "workers", 4)
+    monkeypatch.setattr(Ingest, "queue_size", 10)
+    monkeypatch.setattr(Ingest, "shed_threshold", 0.5)
+    monkeypatch.setattr(Ingest, "queues", [asyncio.Queue(10) for _ in range(4)])
+    return Ingest
+
+
+def test_routes_a_servers_ordered_events_to_one_worker(workers):
+    for server in SERVERS:
+        queues = {id(workers.route(message, server)) for message in
+                  ("Killfeed: 2021.05.01-02.25.29: a killed b", "Chat: 5E9, Player, (0) -match start", "Login: x")}
+        assert len(queues) == 1
+
+
+def test_routes_other_messages_to_the_shortest_queue(workers):
+    for queue in workers.queues[:3]:
+        queue.put_nowait(("", None, 0))
+    assert workers.route("Punishment: 5E9 was kicked", SERVERS[0]) is workers.queues[3]
+
+
+def test_sheds_load_by_the_handling_workers_queue(workers):
+    busy, idle = workers.queues[0], workers.queues[1]
+    for _ in range(5):
+        busy.put_nowait(("", None, 0))
+    assert workers.overloaded(busy)
+    assert not workers.overloaded(idle)
+    assert workers.overloaded()  # Outside of a worker, any overloaded queue counts
+
+    async def handled_by(queue: asyncio.Queue) -> bool:
+        handling_queue.set(queue)
+        return workers.overloaded()
+
+    assert asyncio.run(handled_by(busy))
+    assert not asyncio.run(handled_by(idle))
+
+
+def test_skips_droppable_listeners_while_overloaded(workers, monkeypatch):
+    handled = []
+
+    @droppable("test")
+    async def listener(message: str):
+        handled.append(message)
+
+    async def run():
+        await listener("kept")
+        monkeypatch.setattr(Ingest, "overloaded", lambda queue=None: True)
+        await listener("dropped")
+
+    dropped = ingest.dropped.values.get(("test",), 0)
+    asyncio.run(run())
+    assert handled == ["kept"]
+    assert ingest.dropped.values[("test",)] == dropped + 1
+
+
+def test_handles_each_servers_ordered_events_in_order(monkeypatch):
+    handled = []
+
+    async def parse(event):
+        await asyncio.sleep(0)
+        handled.append((current_server.get().id, event.content))
+
+    monkeypatch.setattr(ingest, "parse", parse)
+    monkeypatch.setattr(Ingest, "workers", 3)
+    monkeypatch.setattr(Ingest, "queues", [])
+    monkeypatch.setattr(Ingest, "tasks", [])
+
+    async def run():
+        Ingest.start()
+        for number in range(20):
+            for server in SERVERS:
+                await Ingest.submit(f"Killfeed: {number}", server)
+        await Ingest.stop()
+
+    asyncio.run(run())
+    for server in SERVERS:
+        assert [content for server_id, content in handled if server_id == server.id] == \
+               [f"Killfeed: {number}" for number in range(20)]
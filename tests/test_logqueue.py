@@ -0,0 +1,73 @@
+import logging
+import queue
+import threading
+import time
+
+import pytest
+
+from tracker.logqueue import BoundedQueueHandler
+
+
+def record(message: str, level: int = logging.INFO, *args) -> logging.LogRecord:
+    return logging.LogRecord("tracker", level, __file__, 1, message, args, None)
+
+
+def queued(handler: BoundedQueueHandler) -> list[str]:
+    messages = []
+    while not handler.queue.empty():
+        messages.append(handler.queue.get_nowait().msg)
+    return messages
+
+
+def drain_later(handler: BoundedQueueHandler, into: list[str], count: int) -> threading.Thread:
+    """Takes `count` records off the queue from another thread, as the listener would, once the caller blocks"""
+
+    def drain():
+        for _ in range(count):
+            time.sleep(0.02)
+            into.append(handler.queue.get(timeout=2).msg)
+
+    thread = threading.Thread(target=drain)
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize("overflow, kept", [("drop-new", ["one", "two"]), ("drop-old", ["two", "three"])])
+def test_drops_records_once_the_queue_is_full(overflow: str, kept: list[str]):
+    handler = BoundedQueueHandler(queue.Queue(2), overflow)
+    for message in ("one", "two", "three"):
+        handler.emit(record(message))
+    assert queued(handler) == kept
+    assert handler.dropped == {"INFO": 1}
+
+
+def test_blocks_until_there_is_room():
+    handler = BoundedQueueHandler(queue.Queue(1), "block")
+    taken = []
+    thread = drain_later(handler, taken, 2)
+    for message in ("one", "two", "three"):
+        handler.emit(record(message))
+    thread.join()
+    assert taken + queued(handler) == ["one", "two", "three"]
+    assert not handler.dropped
+
+
+@pytest.mark.parametrize("overflow", ["drop-new", "drop-old"])
+def test_never_drops_errors(overflow: str):
+    handler = BoundedQueueHandler(queue.Queue(1), overflow)
+    handler.emit(record("one"))
+    taken = []
+    thread = drain_later(handler, taken, 1)
+    handler.emit(record("failed", logging.ERROR))
+    thread.join()
+    assert taken + queued(handler) == ["one", "failed"]
+    assert not handler.dropped
+
+
+def test_merges_the_arguments_when_queued():
+    handler = BoundedQueueHandler(queue.Queue(1))
+    players = ["5E9"]
+    handler.emit(record("players: %s", logging.INFO, players))
+    players.append("6F0")
+    queued_record = handler.queue.get_nowait()
+    assert (queued_record.msg, queued_record.args) == ("players: ['5E9']", None)
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from tracker.metrics import Counter
+from tracker.metrics import Gauge
+from tracker.metrics import Histogram
+from tracker.metrics import Metrics
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    monkeypatch.setattr(Metrics, "registry", {})
+    return Metrics
+
+
+def test_renders_counters_with_escaped_labels():
+    events = Counter("tracker_events_total", "Mordhau events received", ("type",))
+    events.inc("Killfeed:")
+    events.inc("Killfeed:", amount=2)
+    events.inc("Chat: \"hi\"\n")
+    assert events.render() == ["tracker_events_total{type=\"Killfeed:\"} 3",
+                               "tracker_events_total{type=\"Chat: \\\"hi\\\"\\n\"} 1"]
+
+
+def test_renders_cumulative_histogram_buckets():
+    latency = Histogram("tracker_latency_seconds", "Latency", ("server",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 5):
+        latency.observe(value, "default")
+    assert latency.render() == [
+        "tracker_latency_seconds_bucket{server=\"default\",le=\"0.1\"} 2",
+        "tracker_latency_seconds_bucket{server=\"default\",le=\"1\"} 3",
+        "tracker_latency_seconds_bucket{server=\"default\",le=\"+Inf\"} 4",
+        "tracker_latency_seconds_sum{server=\"default\"} 5.65",
+        "tracker_latency_seconds_count{server=\"default\"} 4",
+    ]
+
+
+def test_estimates_quantiles_by_bucket():
+    latency = Histogram("tracker_latency_seconds", "Latency", buckets=(0.1, 1))
+    for value in (0.05, 0.05, 0.5, 5):
+        latency.observe(value)
+    series = latency.values[()]
+    assert latency.quantile(series, 0.5) == 0.1
+    assert latency.quantile(series, 0.75) == 1
+    assert latency.quantile(series, 0.99) is None  # Beyond the largest bucket
+
+
+def test_gauges_are_read_when_collected():
+    depth = {"value": 1}
+    gauge = Gauge("tracker_depth", "Depth", lambda: depth["value"])
+    depth["value"] = 5
+    assert gauge.render() == ["tracker_depth 5"]
+    labelled = Gauge("tracker_depths", "Depths", lambda: {("0",): 2, ("1",): 3}, ("worker",))
+    assert labelled.render() == ["tracker_depths{worker=\"0\"} 2", "tracker_depths{worker=\"1\"} 3"]
+
+
+def test_a_failing_gauge_keeps_its_last_value():
+    values = iter([4])
+    gauge = Gauge("tracker_depth", "Depth", lambda: next(values))
+    assert gauge.render() == ["tracker_depth 4"]
+    assert gauge.render() == ["tracker_depth 4"]
+
+
+def test_renders_the_registry_in_the_text_format(metrics):
+    metrics.counter("tracker_events_total", "Mordhau events received").inc()
+    assert metrics.counter("tracker_events_total", "Registered once") is metrics.registry["tracker_events_total"]
+    assert metrics.render() == ("# HELP tracker_events_total Mordhau events received\n"
+                                "# TYPE tracker_events_total counter\n"
+                                "tracker_events_total 1\n")
+
+
+def test_writes_json_snapshots(metrics, tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "snapshot_path", tmp_path / "metrics.json")
+    metrics.histogram("tracker_latency_seconds", "Latency", buckets=(0.1,)).observe(0.05)
+    metrics.write_snapshot()
+    snapshot = json.loads((tmp_path / "metrics.json").read_text())
+    series, = snapshot["metrics"]["tracker_latency_seconds"]
+    assert (series["count"], series["p50"]) == (1, 0.1)
+    assert not (tmp_path / "metrics.json.tmp").exists()
@@ -0,0 +1,76 @@
+from datetime import datetime
+
+import pytest
+
+from tracker.mordhau_events import classify
+from tracker.mordhau_events import records
+
+TIMESTAMP = datetime(2021, 5, 1, 2, 25, 29)
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("Killfeed: 2021.05.01-02.25.29: A (B) killed C (D)", ("Killfeed:", "2021.05.01-02.25.29: A (B) killed C (D)")),
+    ("Login:   2021.05.01-02.25.29: B (A) logged in  ", ("Login:", "2021.05.01-02.25.29: B (A) logged in")),
+    ("MatchState: 2021.05.01-02.25.29: In progress", ("MatchState:", "2021.05.01-02.25.29: In progress")),
+    ("Chat:", ("Chat:", "")),
+])
+def test_classifies_tagged_lines(line, expected):
+    assert classify(line) == expected
+
+
+def test_the_first_tag_wins():
+    assert classify("Chat: 5E9, Sbinalla, (0) Killfeed: fake") == ("Chat:", "5E9, Sbinalla, (0) Killfeed: fake")
+
+
+@pytest.mark.parametrize("line", ["", "Keeping client alive for another 30 seconds", "killfeed: lowercase"])
+def test_does_not_classify_untagged_lines(line):
+    assert classify(line) is None
+
+
+def test_parses_killfeed():
+    record = records.parse_killfeed("2021.05.01-02.25.29: 5E92E0B55E90869C (Sbin (alla)) killed 8A7C2E3B1F0D4C5A "
+                                    "(Clinically Lazy) with Zweihander")
+    assert record == records.Killfeed(TIMESTAMP, "5E92E0B55E90869C", "Sbin (alla)", "8A7C2E3B1F0D4C5A",
+                                      "Clinically Lazy", "Zweihander")
+    assert records.parse_killfeed("2021.05.01-02.25.29:  (Bot) killed 8A7C (Victim)").weapon is None
+    assert records.parse_killfeed("2021.05.01-02.25.29: someone fell") is None
+
+
+@pytest.mark.parametrize("content, team, playfab_id, name, scores", [
+    ("2021.05.01-02.25.29: Team 0's is now 7.0 points from 6.0 points", 0, None, None, (6, 7)),
+    ("2021.05.01-02.25.29: Team -1's is now 1 point from 0 points", -1, None, None, (0, 1)),
+    ("2021.05.01-02.25.29: Sbinalla (5E92E0B55E90869C)'s score is now 30 points from 20 points", None,
+     "5E92E0B55E90869C", "Sbinalla", (20, 30)),
+    ("2021.05.01-02.25.29: Someone's is now -5 points from 0 points", None, None, "Someone", (0, -5)),
+])
+def test_parses_scorefeed(content, team, playfab_id, name, scores):
+    assert records.parse_scorefeed(content) == records.Scorefeed(TIMESTAMP, team, playfab_id, name, *scores)
+
+
+def test_does_not_parse_malformed_scorefeed():
+    assert records.parse_scorefeed("2021.05.01-02.25.29: Team 0's is now 1.2.3 points from 0 points") is None
+    assert records.parse_scorefeed("2021.05.01-02.25.29: Team 0 scored") is None
+
+
+def test_parses_login():
+    assert records.parse_login("2021.05.01-02.25.29: Sbi nalla (5E92E0B55E90869C) logged out") == records.Login(
+        TIMESTAMP, "5E92E0B55E90869C", "Sbi nalla", False)
+    assert records.parse_login("2021.05.01-02.25.29: Sbinalla (5E92E0B55E90869C) logged in").logged_in
+    assert records.parse_login("2021.05.01-02.25.29: Sbinalla logged in") is None
+
+
+def test_parses_chat():
+    assert records.parse_chat("5E92E0B55E90869C, Sbin, alla, (0) -match setup A, B") == records.Chat(
+        "5E92E0B55E90869C", "Sbin, alla", 0, "-match setup A, B")
+    assert records.parse_chat("5E92E0B55E90869C, Sbinalla, (1)") == records.Chat("5E92E0B55E90869C", "Sbinalla", 1, "")
+    assert records.parse_chat("5E92E0B55E90869C, Sbinalla, (0) line\nbreak").message == "line\nbreak"
+    assert records.parse_chat("not a chat line") is None
+
+
+def test_parses_timestamped_records():
+    assert records.parse_match_state("2021.05.01-02.25.29:  In progress ") == records.MatchState(TIMESTAMP,
+                                                                                                "In progress")
+    assert records.parse_punishment("2021.05.01-02.25.29: Sbinalla was kicked") == records.Punishment(
+        TIMESTAMP, "Sbinalla was kicked")
+    assert records.parse_punishment("no timestamp") == records.Punishment(None, "no timestamp")
+    assert records.parse_timestamp("2021.05.01 02:25:29") is None
@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+
+from tracker.apirequest import APIRequest
+from tracker.outbox import Outbox
+from tracker.outbox import UnresolvedReference
+
+
+class API:
+    """Answers the outbox's POSTs with the statuses given, in turn, then with 200"""
+
+    def __init__(self, *statuses: int):
+        self.statuses = list(statuses)
+        self.requests = []
+
+    async def post(self, endpoint: str, data: dict = None, headers: dict = None) -> APIRequest.Response:
+        self.requests.append((endpoint, data, headers["Idempotency-Key"]))
+        status = self.statuses.pop(0) if self.statuses else 200
+        return APIRequest.Response({"extra": [{"set_id": len(self.requests)}]} if status == 200 else {}, status)
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    monkeypatch.setattr(Outbox, "path", tmp_path / "outbox.sqlite3")
+    monkeypatch.setattr(Outbox, "connection", None)
+    monkeypatch.setattr(Outbox, "batches", {})
+    monkeypatch.setattr(Outbox, "callbacks", {})
+    monkeypatch.setattr(Outbox, "max_attempts", 3)
+    yield Outbox
+    Outbox.connection.close()
+
+
+def deliver(api: API, monkeypatch, rounds: int = 20) -> list[bool]:
+    """Runs the outbox worker's deliveries, without its backoff, until nothing is pending"""
+    monkeypatch.setattr(APIRequest, "post", api.post)
+
+    async def run():
+        delivered = []
+        while rounds > len(delivered) and (entries := Outbox._next()):
+            delivered.append(await Outbox._deliver(entries))
+        await asyncio.sleep(0)  # Let the callbacks run
+        return delivered
+
+    return asyncio.run(run())
+
+
+def states(outbox) -> list[str]:
+    return [state for state, in outbox.connection.execute("SELECT state FROM outbox ORDER BY seq")]
+
+
+def test_delivers_in_order_with_the_idempotency_keys(outbox, monkeypatch):
+    keys = [outbox.enqueue(f"/write/{number}", {"number": number}) for number in range(3)]
+    api = API()
+    assert deliver(api, monkeypatch) == [True, True, True]
+    assert api.requests == [(f"/write/{number}", {"number": number}, keys[number]) for number in range(3)]
+    assert states(outbox) == ["delivered"] * 3
+
+
+def test_fills_in_references_to_earlier_responses(outbox, monkeypatch):
+    set_key = outbox.enqueue("/set/create-set", {"map": "skm_moshpit"})
+    outbox.enqueue("/round/create-round", {"set_id": outbox.ref(set_key, "extra", 0, "set_id")})
+    api = API()
+    deliver(api, monkeypatch)
+    assert api.requests[1][1] == {"set_id": 1}
+
+
+def test_batches_consecutive_writes_under_a_stable_key(outbox, monkeypatch):
+    outbox.batch("/round/create-round", "/round/create-rounds", "rounds")
+    for number in range(3):
+        outbox.enqueue("/round/create-round", {"number": number})
+    outbox.enqueue("/match/calculate-match-elo")
+    api = API(503)
+    assert deliver(api, monkeypatch) == [False, True, True]
+    (first_endpoint, first_body, first_key), retry, elo = api.requests
+    assert first_endpoint == "/round/create-rounds"
+    assert first_body == {"rounds": [{"number": number} for number in range(3)]}
+    assert retry == (first_endpoint, first_body, first_key)
+    assert elo[0] == "/match/calculate-match-elo"
+
+
+@pytest.mark.parametrize("status", [APIRequest.CONNECTION_FAILED, 408, 429, 500, 502, 503])
+def test_retries_transport_errors_timeouts_rate_limits_and_server_errors(status):
+    assert Outbox._retryable(status)
+
+
+@pytest.mark.parametrize("status", [400, 401, 404, 409, 422])
+def test_does_not_retry_rejections(status):
+    assert not Outbox._retryable(status)
+
+
+def test_a_rejected_write_does_not_hold_up_the_ones_after_it(outbox, monkeypatch):
+    outbox.enqueue("/bad")
+    outbox.enqueue("/good")
+    api = API(400)
+    assert deliver(api, monkeypatch) == [True, True]
+    assert [endpoint for endpoint, _, _ in api.requests] == ["/bad", "/good"]
+    assert states(outbox) == ["failed", "delivered"]
+
+
+def test_dead_letters_a_write_after_max_attempts(outbox, monkeypatch):
+    outbox.enqueue("/flaky")
+    outbox.enqueue("/after")
+    api = API(500, 503, 500)
+    assert deliver(api, monkeypatch) == [False, False, True, True]
+    assert states(outbox) == ["dead", "delivered"]
+
+
+def test_connection_failures_do_not_count_as_attempts(outbox, monkeypatch):
+    outbox.enqueue("/write")
+    api = API(*[APIRequest.CONNECTION_FAILED] * 5)
+    assert deliver(api, monkeypatch) == [False] * 5 + [True]
+    assert outbox.connection.execute("SELECT attempts FROM outbox").fetchone() == (0,)
+
+
+def test_drops_writes_that_reference_a_failed_write(outbox, monkeypatch):
+    set_key = outbox.enqueue("/set/create-set")
+    outbox.enqueue("/round/create-round", {"set_id": outbox.ref(set_key, "extra", 0, "set_id")})
+    api = API(422)
+    assert deliver(api, monkeypatch) == [True, True]
+    assert len(api.requests) == 1
+    assert states(outbox) == ["failed", "failed"]
+
+
+def test_calls_back_once_a_write_is_delivered_or_given_up_on(outbox, monkeypatch):
+    results = {}
+
+    def callback(name: str):
+        async def done(delivered: bool):
+            results[name] = delivered
+
+        return done
+
+    outbox.enqueue("/good", on_done=callback("good"))
+    outbox.enqueue("/bad", on_done=callback("bad"))
+    deliver(API(200, 400), monkeypatch)
+    assert results == {"good": True, "bad": False}
+    assert not outbox.callbacks
+
+
+def test_resolves_references_to_delivered_writes_only(outbox, monkeypatch):
+    set_key = outbox.enqueue("/set/create-set")
+    with pytest.raises(UnresolvedReference):
+        outbox.resolve(outbox.ref(set_key, "extra", 0, "set_id"))
+    deliver(API(), monkeypatch)
+    assert outbox.resolve({"set_id": outbox.ref(set_key, "extra", 0, "set_id")}) == {"set_id": 1}
+    with pytest.raises(UnresolvedReference):
+        outbox.resolve(outbox.ref(set_key, "extra", 1, "set_id"))
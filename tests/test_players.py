@@ -0,0 +1,72 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from tracker.apirequest import APIRequest
+from tracker.cache import TTLCache
+from tracker.mordhau_events.commands.game import Player
+
+
+@pytest.fixture
+def lookups(monkeypatch) -> SimpleNamespace:
+    """The endpoints the players were looked up with, each lookup waits until `lookups.release` is set"""
+    monkeypatch.setattr(Player, "id_cache", TTLCache(ttl=60, max_size=10))
+    monkeypatch.setattr(Player, "prefetch_enabled", True)
+    monkeypatch.setattr(Player, "prefetching", {})
+    monkeypatch.setattr(Player, "_prefetch_limit", None)
+    lookups = SimpleNamespace(endpoints=[], release=None)
+
+    async def get(endpoint: str = "/") -> APIRequest.Response:
+        lookups.endpoints.append(endpoint)
+        await lookups.release.wait()
+        return APIRequest.Response({"id": "api-" + endpoint.rsplit("=", 1)[1]}, 200)
+
+    monkeypatch.setattr(APIRequest, "get", get)
+    return lookups
+
+
+def player(playfab_id: str) -> Player:
+    return Player(playfab_id, None, None, None, 1, playfab_id, 0, 0, 0, 0)
+
+
+def test_prefetches_a_player_once_however_often_they_log_in(lookups):
+    async def run():
+        lookups.release = asyncio.Event()
+        Player.id_cache.set("cached", 3)
+        for playfab_id in ("5E9", "5E9", "cached", "5E9"):
+            Player.prefetch(playfab_id, playfab_id)
+        await asyncio.sleep(0)
+        assert list(Player.prefetching) == ["5E9"]
+        lookups.release.set()
+        await asyncio.gather(*Player.prefetching.values())
+
+    asyncio.run(run())
+    assert lookups.endpoints == ["/player/playfab-id?playfab_id=5E9"]
+    assert Player.id_cache.get("5E9") == "api-5E9"
+    assert not Player.prefetching
+
+
+def test_prefetching_can_be_turned_off(lookups, monkeypatch):
+    monkeypatch.setattr(Player, "prefetch_enabled", False)
+    Player.prefetch("5E9", "Player")
+    assert not Player.prefetching
+    assert not lookups.endpoints
+
+
+def test_resolving_waits_on_a_prefetch_instead_of_repeating_it(lookups):
+    players = [player("5E9"), player("6F0"), player("5E9")]
+
+    async def run():
+        lookups.release = asyncio.Event()
+        Player.prefetch("5E9", "5E9")
+        await asyncio.sleep(0)
+        resolving = asyncio.create_task(Player.resolve_api_ids(players))
+        await asyncio.sleep(0)
+        assert not resolving.done()
+        lookups.release.set()
+        await resolving
+
+    asyncio.run(run())
+    assert lookups.endpoints == ["/player/playfab-id?playfab_id=5E9", "/player/playfab-id?playfab_id=6F0"]
+    assert [current.player_id for current in players] == ["api-5E9", "api-6F0", "api-5E9"]
@@ -0,0 +1,169 @@
+import asyncio
+
+import pytest
+
+from tracker.rcon import HEADER
+from tracker.rcon import SERVERDATA_AUTH
+from tracker.rcon import SERVERDATA_AUTH_RESPONSE
+from tracker.rcon import SERVERDATA_RESPONSE_VALUE
+from tracker.rcon import RconClient
+from tracker.rcon import RconError
+from tracker.rcon import RconFrameDecoder
+from tracker.rcon import RconPool
+from tracker.rcon import pack_packet
+from tracker.rcon import split_messages
+
+
+def test_decodes_whole_packets():
+    decoder = RconFrameDecoder()
+    assert decoder.feed(pack_packet(7, SERVERDATA_RESPONSE_VALUE, "info")) == [(7, SERVERDATA_RESPONSE_VALUE,
+                                                                                 b"info\x00\x00")]
+    assert len(decoder) == 0
+
+
+def test_decodes_packets_split_across_reads():
+    decoder = RconFrameDecoder()
+    data = pack_packet(1, SERVERDATA_RESPONSE_VALUE, "Killfeed: one") + pack_packet(2, 0, "Killfeed: two")
+    packets = [packet for byte in range(len(data)) for packet in decoder.feed(data[byte:byte + 1])]
+    assert [(pkt_id, body) for pkt_id, _, body in packets] == [(1, b"Killfeed: one\x00\x00"),
+                                                               (2, b"Killfeed: two\x00\x00")]
+    assert len(decoder) == 0
+
+
+def test_decodes_coalesced_packets_and_keeps_the_partial_one():
+    decoder = RconFrameDecoder()
+    data = b"".join(pack_packet(pkt_id, 0, f"message {pkt_id}") for pkt_id in range(3))
+    packets = decoder.feed(data + data[:5])
+    assert [pkt_id for pkt_id, _, _ in packets] == [0, 1, 2]
+    assert len(decoder) == 5
+    assert [pkt_id for pkt_id, _, _ in decoder.feed(data[5:])] == [0, 1, 2]
+    assert len(decoder) == 0
+
+
+def test_rejects_malformed_sizes():
+    with pytest.raises(RconError):
+        RconFrameDecoder().feed(HEADER.pack(4, 1, 0))
+
+
+def test_split_messages():
+    body = "Chat: 1, José, (0) hi\x07\x00Login: 2\x00\x00".encode()
+    assert split_messages(body) == ["Chat: 1, José, (0) hi", "Login: 2"]
+    assert split_messages(b"\xffbad\x00") == ["�bad"]
+
+
+async def serve(chunks: int, echoes: int):
+    """An RCON server answering every command with `chunks` packets, and every empty packet `echoes` times"""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        decoder = RconFrameDecoder()
+        while data := await reader.read(4096):
+            for pkt_id, pkt_type, body in decoder.feed(data):
+                if pkt_type == SERVERDATA_AUTH:
+                    writer.write(pack_packet(pkt_id, SERVERDATA_AUTH_RESPONSE, ""))
+                elif pkt_type == SERVERDATA_RESPONSE_VALUE:
+                    for _ in range(echoes):
+                        writer.write(pack_packet(pkt_id, SERVERDATA_RESPONSE_VALUE, ""))
+                else:
+                    command = body.rstrip(b"\x00").decode()
+                    for chunk in range(chunks):
+                        writer.write(pack_packet(pkt_id, SERVERDATA_RESPONSE_VALUE, f"{command} {chunk};"))
+            await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+@pytest.mark.parametrize("echoes", [1, 2])
+def test_joins_responses_spanning_several_packets(echoes: int):
+    async def run():
+        server = await serve(chunks=3, echoes=echoes)
+        client = RconClient("127.0.0.1", server.sockets[0].getsockname()[1], "password", timeout=2)
+        try:
+            return await asyncio.gather(client.execute("scoreboard"), client.execute("info"))
+        finally:
+            await client.close()
+            server.close()
+
+    assert asyncio.run(run()) == ["scoreboard 0;scoreboard 1;scoreboard 2;", "info 0;info 1;info 2;"]
+
+
+def test_single_packet_responses():
+    async def run():
+        server = await serve(chunks=1, echoes=0)
+        client = RconClient("127.0.0.1", server.sockets[0].getsockname()[1], "password", timeout=2,
+                            multi_packet=False)
+        try:
+            return await client.execute("info")
+        finally:
+            await client.close()
+            server.close()
+
+    assert asyncio.run(run()) == "info 0;"
+
+
+async def serve_dropping_first_command(received: list[str]):
+    """An RCON server that runs the first command it's sent and then drops the connection before answering"""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        decoder = RconFrameDecoder()
+        while data := await reader.read(4096):
+            for pkt_id, pkt_type, body in decoder.feed(data):
+                if pkt_type == SERVERDATA_AUTH:
+                    writer.write(pack_packet(pkt_id, SERVERDATA_AUTH_RESPONSE, ""))
+                elif pkt_type != SERVERDATA_RESPONSE_VALUE:
+                    received.append(command := body.rstrip(b"\x00").decode())
+                    if len(received) == 1:
+                        writer.close()
+                        return
+                    writer.write(pack_packet(pkt_id, SERVERDATA_RESPONSE_VALUE, command))
+            await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+@pytest.mark.parametrize("command, retried", [("scoreboard", True), ("say hi", False), ("kick 5E9", False)])
+def test_only_retries_commands_that_can_safely_run_twice(command: str, retried: bool):
+    received = []
+
+    async def run():
+        server = await serve_dropping_first_command(received)
+        pool = RconPool("127.0.0.1", server.sockets[0].getsockname()[1], "password", size=1, timeout=2,
+                        multi_packet=False)
+        try:
+            return await pool.execute(command)
+        finally:
+            await pool.close()
+            server.close()
+
+    if retried:
+        assert asyncio.run(run()) == command
+    else:
+        with pytest.raises(ConnectionError):
+            asyncio.run(run())
+    assert received == [command] * (2 if retried else 1)
+
+
+def test_retries_commands_that_were_never_sent():
+    async def run():
+        server = await serve(chunks=1, echoes=0)
+        port = server.sockets[0].getsockname()[1]
+        pool = RconPool("127.0.0.1", port, "password", size=1, timeout=2, multi_packet=False)
+        client = pool.clients[0]
+        connect = client.connect
+        attempts = []
+
+        async def flaky_connect():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise ConnectionRefusedError()
+            await connect()
+
+        client.connect = flaky_connect
+        try:
+            return await pool.execute("say hi"), len(attempts)
+        finally:
+            await pool.close()
+            server.close()
+
+    assert asyncio.run(run()) == ("say hi 0;", 2)
@@ -0,0 +1,48 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from tracker.base import Base
+from tracker.settings import Settings
+
+ENVIRONMENT = {"API_URL": "https://example.com/api/", "API_TOKEN": "token", "RCON_IP": "127.0.0.1",
+               "RCON_PORT": "7778", "RCON_PASSWORD": "password"}
+
+
+@pytest.mark.parametrize("start", ["2021.05.01-02.25.29", "1619835929", "1619835929.5", "+90", "+1.5"])
+def test_accepts_replay_starts(start):
+    assert Base.replay_args(["--read-log", "--replay-from", start])[-1] == start
+
+
+@pytest.mark.parametrize("start", ["yesterday", "+later", "2021-05-01", ""])
+def test_rejects_invalid_replay_starts(start):
+    with pytest.raises(SystemExit) as exit_info:
+        Base.replay_args(["--read-log", "--replay-from", start])
+    assert exit_info.value.code == 2
+
+
+def test_replays_from_the_start_without_a_start():
+    assert Base.replay_args(["--read-log", "--replay-from"])[-1] is None
+
+
+@pytest.mark.parametrize("speed, expected", [("2", 2.0), ("0.5", 0.5), ("fast", 1)])
+def test_accepts_replay_speeds(speed, expected):
+    assert Base.replay_args(["--read-log", "--replay-paced", "--replay-speed", speed])[3] == expected
+
+
+@pytest.mark.parametrize("speed", ["0", "-2", "nan", "inf"])
+def test_rejects_replay_speeds_that_are_not_above_zero(speed):
+    with pytest.raises(SystemExit) as exit_info:
+        Base.replay_args(["--read-log", "--replay-paced", "--replay-speed", speed])
+    assert exit_info.value.code == 2
+
+
+def test_reads_the_log_from_the_log_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(Base, "settings", Settings.from_environment({**ENVIRONMENT, "LOG_DIRECTORY": str(tmp_path)}))
+    (tmp_path / "raw_rcon.log").write_text(repr(b"Chat: 5E9, Player, (0) hi\x00") + "\n")
+
+    async def read():
+        return [body async for body in Base.read(SimpleNamespace(id="default"), read_log=True)]
+
+    assert asyncio.run(read()) == [b"Chat: 5E9, Player, (0) hi\x00"]
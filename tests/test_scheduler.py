@@ -0,0 +1,118 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from tracker import scheduler
+from tracker.scheduler import CHAT
+from tracker.scheduler import CHAT_MESSAGE_LIMIT
+from tracker.scheduler import CONTROL
+from tracker.scheduler import QUERY
+from tracker.scheduler import RconScheduler
+from tracker.scheduler import TokenBucket
+from tracker.scheduler import priority
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=100.0)
+    monkeypatch.setattr(scheduler, "time", SimpleNamespace(monotonic=lambda: clock.now,
+                                                           perf_counter=lambda: clock.now))
+    return clock
+
+
+class Server:
+    """Records the commands sent, answering each with its own text"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def execute(self, command: str) -> str:
+        self.sent.append(command)
+        await asyncio.sleep(0)
+        return command
+
+
+@pytest.mark.parametrize("command, level", [("scoreboard", QUERY), ("Info", QUERY), ("say hi", CHAT),
+                                            ("changelevel skm_moshpit", CONTROL), ("kick 5E9", CONTROL)])
+def test_priority(command, level):
+    assert priority(command) == level
+
+
+def test_token_bucket_allows_a_burst_then_the_rate(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    for _ in range(3):
+        assert bucket.delay() == 0
+        bucket.take()
+    assert bucket.delay() == pytest.approx(0.5)
+    clock.now += 0.25
+    assert bucket.delay() == pytest.approx(0.25)
+    clock.now += 10
+    assert bucket.delay() == 0
+    assert bucket.tokens == 3  # Never more than the burst
+
+
+def chat(rcon: RconScheduler, *messages: tuple[str, float]):
+    for message, queued_at in messages:
+        rcon.queues[CHAT].append((f"say {message}", None, queued_at))
+
+
+def test_merges_chat_queued_within_the_window_of_each_other(clock):
+    rcon = RconScheduler("test", Server().execute)
+    rcon.merge_window = 0.05
+    chat(rcon, ("one", 1.0), ("two", 1.04), ("three", 1.08), ("late", 1.2))
+    command, entries = rcon._take(CHAT)
+    assert command == "say one\ntwo\nthree"
+    assert len(entries) == 3
+    assert rcon._take(CHAT)[0] == "say late"
+
+
+def test_merges_chat_up_to_the_message_limit(clock):
+    rcon = RconScheduler("test", Server().execute)
+    half = "x" * (CHAT_MESSAGE_LIMIT // 2)
+    chat(rcon, (half, 1.0), (half, 1.0), ("next", 1.0))
+    assert rcon._take(CHAT)[0] == f"say {half}"
+    assert rcon._take(CHAT)[0] == f"say {half}\nnext"
+
+
+def test_each_chat_message_takes_a_token(clock):
+    rcon = RconScheduler("test", Server().execute)
+    rcon.bucket = TokenBucket(rate=1, burst=2)
+    chat(rcon, ("one", 1.0), ("two", 5.0), ("three", 9.0))
+    rcon._take(CHAT)
+    rcon._take(CHAT)
+    assert rcon.bucket.delay() == pytest.approx(1)
+
+
+def test_queries_are_sent_before_chat():
+    server = Server()
+
+    async def run():
+        rcon = RconScheduler("test", server.execute)
+        rcon.max_in_flight = 1
+        rcon.bucket = None
+        rcon.merge_window = 0
+        await rcon.submit("say hello")
+        await rcon.submit("say world")
+        assert await rcon.submit("scoreboard") == "scoreboard"
+        await rcon.close()
+
+    asyncio.run(run())
+    assert server.sent == ["scoreboard", "say hello", "say world"]
+
+
+def test_closing_flushes_chat_and_the_scheduler_can_be_reused():
+    server = Server()
+
+    async def run():
+        rcon = RconScheduler("test", server.execute)
+        rcon.bucket = TokenBucket(rate=0.001, burst=1)
+        for number in range(3):
+            await rcon.submit(f"say {number}")
+        await rcon.close()
+        assert isinstance(rcon.bucket, TokenBucket) and not rcon.closing
+        assert await rcon.submit("info") == "info"
+        await rcon.close()
+
+    asyncio.run(run())
+    assert server.sent == ["say 0\n1\n2", "info"]  # Closing doesn't wait on the rate limit
@@ -0,0 +1,97 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from tracker.base import Base
+from tracker.mordhau_events import MordhauListener
+from tracker.mordhau_events import MordhauType
+from tracker.mordhau_events import server_state
+from tracker.mordhau_events.records import Login
+from tracker.mordhau_events.records import MatchState
+from tracker.mordhau_events.server_state import LEAVING_MAP
+from tracker.mordhau_events.server_state import LEVEL_CHANGE_TIMEOUT
+from tracker.mordhau_events.server_state import ServerState
+from tracker.mordhau_events.server_state import parse_info_map
+from tracker.mordhau_events.server_state import same_map
+
+INFO = "HostName: Test\nGame Mode: Skirmish\nMap: {map}\nPlayers: 2 / 16\n"
+
+
+@pytest.fixture
+def state(monkeypatch):
+    clock = SimpleNamespace(now=100.0)
+    monkeypatch.setattr(server_state, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    server = SimpleNamespace(id="test", info="")
+
+    async def rcon_command(command: str) -> str:
+        return server.info
+
+    server.rcon_command = rcon_command
+    monkeypatch.setattr(Base, "servers", {"test": server})
+    monkeypatch.setattr(ServerState, "states", {})
+    state = ServerState.of("test")
+    state.clock = clock
+    return state
+
+
+def event(record) -> SimpleNamespace:
+    return SimpleNamespace(record=record, server="test")
+
+
+def hook(mord_type: MordhauType, name: str):
+    """The listener ServerState registered for `mord_type`, the decorator leaves None in its place on the class"""
+    listeners = MordhauListener()._listening_events[MordhauListener][str(mord_type)]
+    return next(listener for listener in listeners if listener.__name__ == name)
+
+
+def test_parses_the_map_from_the_info():
+    assert parse_info_map(INFO.format(map="skm_moshpit")) == "skm_moshpit"
+    assert parse_info_map("HostName: Test\n") is None
+
+
+@pytest.mark.parametrize("current, expected, same", [("SKM_Moshpit", "skm_moshpit", True),
+                                                     ("Contraband Grad", "contraband_grad_v2", True),
+                                                     ("skm_moshpit", "skm_grad", False)])
+def test_compares_maps(current, expected, same):
+    assert same_map(current, expected) is same
+
+
+def test_keeps_the_map_the_tracker_changed_to_when_leaving_the_old_one(state):
+    state.changing_level("skm_grad")
+    asyncio.run(hook(MordhauType.MATCH_STATE, "_match_state_hook")(event(MatchState(None, LEAVING_MAP))))
+    assert (state.map, state.phase, state.changing_to) == ("skm_grad", LEAVING_MAP, None)
+    assert state.on_map("skm_grad")
+
+
+def test_a_level_change_it_didnt_make_leaves_the_map_unknown(state):
+    state.map = "skm_moshpit"
+    asyncio.run(hook(MordhauType.MATCH_STATE, "_match_state_hook")(event(MatchState(None, LEAVING_MAP))))
+    assert state.map is None
+    assert state.on_map("skm_moshpit") is None
+
+
+def test_corrects_a_drifted_map_from_the_info(state):
+    state.map = "skm_moshpit"
+    state.server.info = INFO.format(map="skm_grad")
+    drift = server_state.state_drift.values.get(("test",), 0)
+    assert asyncio.run(state.refresh()) == "skm_grad"
+    assert state.map == "skm_grad"
+    assert server_state.state_drift.values[("test",)] == drift + 1
+
+
+def test_trusts_its_own_level_change_over_the_info_for_a_while(state):
+    state.changing_level("skm_grad")
+    state.server.info = INFO.format(map="skm_moshpit")  # Not left yet
+    asyncio.run(state.refresh())
+    assert state.map == "skm_grad"
+    state.clock.now += LEVEL_CHANGE_TIMEOUT
+    asyncio.run(state.refresh())
+    assert state.map == "skm_moshpit"
+
+
+def test_follows_the_players_logging_in_and_out(state):
+    asyncio.run(hook(MordhauType.LOGIN, "_login_hook")(event(Login(None, "5E9", "Player", True))))
+    asyncio.run(hook(MordhauType.LOGIN, "_login_hook")(event(Login(None, "6F0", "Other", True))))
+    asyncio.run(hook(MordhauType.LOGIN, "_login_hook")(event(Login(None, "5E9", "Player", False))))
+    assert state.players == {"6F0": "Other"}
@@ -0,0 +1,103 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from tracker import settings as settings_module
+from tracker.settings import ConfigError
+from tracker.settings import Settings
+from tracker.settings import on_configure
+
+ENVIRONMENT = {"API_URL": "https://example.com/api/", "API_TOKEN": "token", "RCON_IP": "127.0.0.1",
+               "RCON_PORT": "7778", "RCON_PASSWORD": "password"}
+
+
+def test_reads_the_sections_with_their_defaults():
+    settings = Settings.from_environment({**ENVIRONMENT, "OUTBOX_MAX_ATTEMPTS": "0", "MATCH_ADMINS": "a, b,",
+                                          "INGEST_ORDERED_TYPES": "Chat, Killfeed:", "LOG_QUEUE_OVERFLOW": "Block"})
+    assert settings.api_url == "https://example.com/api"
+    assert settings.outbox.max_attempts == 0
+    assert settings.outbox.batch_size == 20
+    assert settings.match.admins == ("a", "b")
+    assert settings.ingest.ordered_types == ("Chat:", "Killfeed:")
+    assert settings.log_queue.overflow == "block"
+    assert settings.metrics.port is None
+    assert settings.shard is None
+    assert settings.log_directory == Path(".")
+
+
+def test_reads_the_shard_and_log_paths():
+    settings = Settings.from_environment({**ENVIRONMENT, "RCON_SHARD": "1", "LOG_CONFIG_PATH": "/etc/tracker/log.yaml",
+                                          "LOG_DIRECTORY": "/var/log/tracker"})
+    assert settings.shard == 1
+    assert settings.log_config_path == Path("/etc/tracker/log.yaml")
+    assert settings.log_directory == Path("/var/log/tracker")
+
+
+def test_lists_every_invalid_setting():
+    with pytest.raises(ConfigError) as error:
+        Settings.from_environment({**ENVIRONMENT, "API_READ_TIMEOUT": "soon", "INGEST_WORKERS": "0",
+                                   "CAPTURE_FORMAT": "pcap"})
+    assert error.value.problems == [
+        "API_READ_TIMEOUT should be a number, not \"soon\"",
+        "CAPTURE_FORMAT should be one of text, binary, both, not \"pcap\"",
+        "INGEST_WORKERS should be at least 1, not \"0\"",
+    ]
+
+
+def test_configures_registered_classes_when_applied_or_as_they_register(monkeypatch):
+    monkeypatch.setattr(settings_module, "_configures", [])
+    monkeypatch.setattr(settings_module, "_applied", None)
+    configured = []
+    on_configure(lambda settings: configured.append(("early", settings)))
+    assert not configured
+    settings = Settings.from_environment(ENVIRONMENT)
+    settings.apply()
+    on_configure(lambda settings: configured.append(("late", settings)))
+    assert configured == [("early", settings), ("late", settings)]
+
+
+def test_game_reads_its_section(monkeypatch):
+    from tracker.mordhau_events.commands.game.game import Game
+
+    for name in ("admins", "valid_maps", "round_end_concurrency", "live_stats", "reconcile_interval"):
+        monkeypatch.setattr(Game, name, getattr(Game, name))
+    Game.configure(Settings.from_environment({**ENVIRONMENT, "MATCH_VALID_MAPS": "SKM_Moshpit, skm_grad",
+                                              "MATCH_LIVE_STATS": "true"}))
+    assert Game.valid_maps == {"skm_moshpit": "SKM_Moshpit", "skm_grad": "skm_grad"}
+    assert Game.live_stats
+
+
+def test_importing_the_listeners_reads_nothing_and_logs_nothing():
+    result = subprocess.run(
+        [sys.executable, "-c", "import logging; logging.basicConfig(); "
+                               "import tracker.mordhau_events.event_registration"],
+        cwd=Path(__file__).parent.parent, env={"OUTBOX_BATCH_SIZE": "x"}, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stderr == ""
+
+
+@pytest.mark.parametrize("name, value, problem", [
+    ("CAPTURE_COMPRESSION_LEVEL", "12", "CAPTURE_COMPRESSION_LEVEL should be at most 9, not \"12\""),
+    ("API_COMPRESSION_LEVEL", "0", "API_COMPRESSION_LEVEL should be at least 1, not \"0\""),
+    ("RCON_COMMAND_TIMEOUT", "0", "RCON_COMMAND_TIMEOUT should be above 0, not \"0\""),
+    ("INGEST_SHED_THRESHOLD", "-1.0", "INGEST_SHED_THRESHOLD should be above 0, not \"-1.0\""),
+    ("INGEST_SHED_THRESHOLD", "1.5", "INGEST_SHED_THRESHOLD should be at most 1, not \"1.5\""),
+    ("RCON_CHAT_RATE", "nan", "RCON_CHAT_RATE should be a number, not \"nan\""),
+    ("OUTBOX_MAX_BACKOFF", "inf", "OUTBOX_MAX_BACKOFF should be a number, not \"inf\""),
+    ("OUTBOX_BACKOFF", "-1", "OUTBOX_BACKOFF should be at least 0, not \"-1\""),
+    ("MATCH_RECONCILE_INTERVAL", "-60", "MATCH_RECONCILE_INTERVAL should be at least 0, not \"-60\""),
+])
+def test_rejects_numbers_out_of_bounds(name: str, value: str, problem: str):
+    with pytest.raises(ConfigError) as error:
+        Settings.from_environment({**ENVIRONMENT, name: value})
+    assert error.value.problems == [problem]
+
+
+def test_accepts_the_bounds_themselves():
+    settings = Settings.from_environment({**ENVIRONMENT, "CAPTURE_COMPRESSION_LEVEL": "9", "INGEST_SHED_THRESHOLD": "1",
+                                          "MATCH_RECONCILE_INTERVAL": "0"})
+    assert (settings.capture.compression_level, settings.ingest.shed_threshold) == (9, 1.0)
+    assert settings.match.reconcile_interval == 0
@@ -0,0 +1,50 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from tracker import base
+from tracker.base import Base
+from tracker.outbox import Outbox
+from tracker.settings import Settings
+
+ENVIRONMENT = {"API_URL": "https://example.com/api", "API_TOKEN": "token", "RCON_SERVERS": "eu,na",
+               "RCON_IP": "127.0.0.1", "RCON_PORT": "7778", "RCON_PASSWORD": "password", "RCON_PROCESSES": "2",
+               "PLAYER_CACHE_PATH": "/data/player_cache.json", "OUTBOX_PATH": "/data/outbox.sqlite3"}
+
+
+class Process:
+    pid = 1
+    returncode = 0
+
+    async def wait(self) -> int:
+        return 0
+
+
+@pytest.fixture
+def started(monkeypatch):
+    environments = []
+
+    async def create_subprocess_exec(*args, env: dict = None, **kwargs):
+        environments.append(env)
+        return Process()
+
+    monkeypatch.setattr(base.asyncio, "create_subprocess_exec", create_subprocess_exec)
+    monkeypatch.delenv("PLAYER_CACHE_PATH", raising=False)
+    monkeypatch.delenv("OUTBOX_PATH", raising=False)
+    monkeypatch.setattr(Base, "settings", None)
+    monkeypatch.setattr(Base, "servers", {})
+    # Only the shards are configured from these settings, not the classes the tests share
+    monkeypatch.setattr(Settings, "apply", lambda settings: None)
+    monkeypatch.setattr(Outbox, "path", Path(ENVIRONMENT["OUTBOX_PATH"]))
+    Base.configure(Settings.from_environment(ENVIRONMENT))
+    return environments
+
+
+def test_every_shard_but_the_first_has_its_own_outbox_and_player_cache(started):
+    asyncio.run(Base.run_shards())
+    first, second = started
+    assert (first["RCON_SERVERS"], second["RCON_SERVERS"]) == ("eu", "na")
+    assert "PLAYER_CACHE_PATH" not in first and "OUTBOX_PATH" not in first
+    assert Path(second["PLAYER_CACHE_PATH"]) == Path("/data/player_cache.shard1.json")
+    assert Path(second["OUTBOX_PATH"]) == Path("/data/outbox.shard1.sqlite3")
@@ -0,0 +1,59 @@
+from tracker.mordhau_events.commands.game.stats import LiveStats
+from tracker.mordhau_events.commands.game.stats import ScoreboardRow
+from tracker.mordhau_events.commands.game.stats import SetSnapshot
+from tracker.mordhau_events.records import Killfeed
+
+
+def kill(killer: str, victim: str) -> Killfeed:
+    return Killfeed(None, killer, killer.title(), victim, victim.title(), "Zweihander")
+
+
+def row(playfab_id: str, team: int, kills: int = 0, deaths: int = 0, score: int = 0, assists: int = 0) -> ScoreboardRow:
+    return ScoreboardRow(playfab_id, playfab_id.title(), team, score, kills, deaths, assists)
+
+
+def test_teamkills_are_deaths_but_not_kills():
+    stats = LiveStats()
+    stats.reconcile([row("red", 0), row("ally", 0), row("blue", 1)])
+    stats.record_kill(kill("red", "ally"))
+    stats.record_kill(kill("red", "blue"))
+    assert {row.playfab_id: (row.kills, row.deaths) for row in stats.rows()} == {
+        "red": (1, 0), "ally": (0, 1), "blue": (0, 1)}
+    assert stats.weapons("red") == {"Zweihander": 1}
+
+
+def test_kills_count_until_the_teams_are_known():
+    stats = LiveStats()
+    stats.record_kill(kill("red", "ally"))
+    assert {row.playfab_id: row.kills for row in stats.rows()} == {"red": 1, "ally": 0}
+
+
+def test_advance_returns_each_rounds_stats():
+    snapshot = SetSnapshot()
+    assert snapshot.advance([row("red", 0, kills=2, deaths=1, score=30, assists=1)]) == [(30, 2, 1, 1)]
+    assert snapshot.advance([row("red", 0, kills=5, deaths=1, score=80, assists=1)]) == [(50, 3, 0, 0)]
+    assert snapshot.advance([row("red", 0, kills=5, deaths=1, score=80, assists=1)]) == [(0, 0, 0, 0)]
+
+
+def test_advance_takes_everything_from_a_player_who_joined_since():
+    snapshot = SetSnapshot()
+    snapshot.advance([row("red", 0, kills=3)])
+    assert snapshot.advance([row("red", 0, kills=4), row("late", 1, kills=2, score=20)]) == [(0, 1, 0, 0),
+                                                                                         (20, 2, 0, 0)]
+    assert len(snapshot) == 2
+
+
+def test_advance_starts_over_for_a_player_who_rejoined():
+    snapshot = SetSnapshot()
+    snapshot.advance([row("red", 0, kills=6, deaths=4, score=90)])
+    assert snapshot.advance([row("red", 0, kills=1, deaths=4, score=10)]) == [(10, 1, 0, 4)]
+    assert snapshot.advance([row("red", 0, kills=2, deaths=4, score=25)]) == [(15, 1, 0, 0)]
+
+
+def test_advance_keeps_players_who_sat_a_round_out():
+    snapshot = SetSnapshot()
+    snapshot.advance([row("red", 0, kills=3), row("blue", 1, kills=1)])
+    snapshot.advance([row("blue", 1, kills=2)])
+    assert snapshot.advance([row("red", 0, kills=4), row("blue", 1, kills=2)]) == [(0, 1, 0, 0), (0, 0, 0, 0)]
+    snapshot.reset()
+    assert snapshot.advance([row("red", 0, kills=4)]) == [(0, 4, 0, 0)]
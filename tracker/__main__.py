@@ -13,12 +13,29 @@ import asyncio
 import logging
 import sys
 
-from tracker import Base
+from tracker.settings import ConfigError
+from tracker.settings import Settings
+from tracker.settings import environment_path
+from tracker.settings import load_environment
 
 log = logging.getLogger(__name__)
 
 
 def main(*args):
+    if not load_environment():
+        log.warning(f"A .env file is not defined at \"{environment_path}\", ensure your variables are exported in the "
+                    f"environment")
+    try:
+        settings = Settings.from_environment()
+    except ConfigError as error:
+        for problem in error.problems:
+            log.critical(problem)
+        sys.exit(1)
+
+    # Imported once the settings are read, so a misconfigured tracker exits without importing the rest of it
+    from tracker import Base
+
+    Base.configure(settings)
     loop = asyncio.get_event_loop()
 
     lower_args = [arg.casefold() for arg in args[0]]
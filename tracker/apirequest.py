@@ -1,14 +1,34 @@
+import asyncio
+import gzip
 import logging
-import os
-import sys
+import random
+import time
 
+from types import SimpleNamespace
 from urllib import parse
 
 from aiohttp import ClientSession
 from aiohttp import ClientConnectionError
+from aiohttp import ClientTimeout
+from aiohttp import TCPConnector
+from aiohttp import TraceConfig
+from aiohttp import TraceConnectionQueuedStartParams
+from aiohttp import TraceConnectionQueuedEndParams
+
+from tracker.jsoncodec import JSONCodec
+from tracker.metrics import Metrics
+from tracker.settings import APISettings
+from tracker.settings import Settings
+from tracker.settings import on_configure
 
 log = logging.getLogger(__name__)
 
+request_time = Metrics.histogram("tracker_api_request_seconds", "Time taken for API requests, including retries",
+                                 ("method", "endpoint"))
+request_bytes = Metrics.counter("tracker_api_request_bytes_total", "Bytes of request bodies sent to the API, as sent",
+                                ("endpoint", "encoding"))
+responses = Metrics.counter("tracker_api_responses_total", "API responses by status", ("method", "endpoint", "status"))
+
 
 class APIError(Exception):
 
@@ -18,17 +38,29 @@ class APIError(Exception):
 
 
 class APIRequest:
-    api_url = os.getenv("API_URL", default=None)
-    if not api_url:
-        log.critical(f"A(n) API URL (API_URL) was not passed to the environment")
-        sys.exit(128)
-    api_url = api_url.strip("/")
-    log.debug(f"API url registered as {api_url}")
-    api_token = os.getenv("API_TOKEN", default=None)
-    if not api_token:
-        log.critical(f"A(n) API Token (API_TOKEN) was not passed to the environment")
-        sys.exit(128)
-    headers = {"Authorization": "Bearer " + api_token}
+    # The status of a response when the API could not be reached at all, so it isn't mistaken for one of its own 400s
+    CONNECTION_FAILED = 0
+
+    # Set from the settings by `configure` when the tracker starts
+    api_url = ""
+    api_token = ""
+
+    connect_timeout = APISettings.connect_timeout
+    read_timeout = APISettings.read_timeout
+    connection_limit = APISettings.connection_limit
+    connection_limit_per_host = APISettings.connection_limit_per_host
+    keepalive_timeout = APISettings.keepalive_timeout
+    get_retries = APISettings.get_retries
+    retry_backoff = APISettings.retry_backoff
+    compression = APISettings.compression
+    compression_min_size = APISettings.compression_min_size
+    compression_level = APISettings.compression_level
+
+    # A single session is shared by every request so connections are pooled and kept alive between calls
+    session: [ClientSession, None] = None
+    pool_waits: int = 0
+    pool_wait_time: float = 0
+    pool_max_wait_time: float = 0
 
     class Response:
 
@@ -36,44 +68,169 @@ class APIRequest:
             self.json = json
             self.status = status
 
+    @classmethod
+    def configure(cls, settings: Settings):
+        cls.api_url = settings.api_url.strip("/")
+        cls.api_token = settings.api_token
+        api = settings.api
+        cls.connect_timeout = api.connect_timeout
+        cls.read_timeout = api.read_timeout
+        cls.connection_limit = api.connection_limit
+        cls.connection_limit_per_host = api.connection_limit_per_host
+        cls.keepalive_timeout = api.keepalive_timeout
+        cls.get_retries = api.get_retries
+        cls.retry_backoff = api.retry_backoff
+        cls.compression = api.compression
+        cls.compression_min_size = api.compression_min_size
+        cls.compression_level = api.compression_level
+        log.debug(f"API url registered as {cls.api_url}")
+
     @staticmethod
     def verify_url(url: str, checks=("scheme", "netloc")):
         valid_url = parse.urlparse(url)
         return all([getattr(valid_url, check_attr) for check_attr in checks])
 
     @classmethod
-    async def get(cls, endpoint: str = "/") -> Response:
-        full_url = cls.api_url + endpoint
-        if not cls.verify_url(full_url):
-            return cls.Response({}, 418)
-        async with ClientSession(headers=cls.headers) as session:
+    async def _on_queued_start(cls, session: ClientSession, context: SimpleNamespace,
+                               params: TraceConnectionQueuedStartParams):
+        context.queued_at = time.perf_counter()
+
+    @classmethod
+    async def _on_queued_end(cls, session: ClientSession, context: SimpleNamespace,
+                             params: TraceConnectionQueuedEndParams):
+        waited = time.perf_counter() - context.queued_at
+        cls.pool_waits += 1
+        cls.pool_wait_time += waited
+        cls.pool_max_wait_time = max(cls.pool_max_wait_time, waited)
+
+    @classmethod
+    def get_session(cls) -> ClientSession:
+        """Returns the shared session, creating it on first use"""
+        if cls.session is None or cls.session.closed:
+            trace_config = TraceConfig()
+            trace_config.on_connection_queued_start.append(cls._on_queued_start)
+            trace_config.on_connection_queued_end.append(cls._on_queued_end)
+            cls.session = ClientSession(
+                headers={"Authorization": "Bearer " + cls.api_token},
+                connector=TCPConnector(
+                    limit=cls.connection_limit,
+                    limit_per_host=cls.connection_limit_per_host,
+                    keepalive_timeout=cls.keepalive_timeout,
+                ),
+                timeout=ClientTimeout(connect=cls.connect_timeout, sock_read=cls.read_timeout),
+                trace_configs=[trace_config],
+            )
+        return cls.session
+
+    @classmethod
+    def pool_stats(cls) -> dict:
+        """Reports connection pool usage, used to size API_CONNECTION_LIMIT and API_CONNECTION_LIMIT_PER_HOST"""
+        stats = {
+            "in_use": 0,
+            "idle": 0,
+            "limit": cls.connection_limit,
+            "limit_per_host": cls.connection_limit_per_host,
+            "waits": cls.pool_waits,
+            "wait_time_total": cls.pool_wait_time,
+            "wait_time_max": cls.pool_max_wait_time,
+        }
+        if cls.session and not cls.session.closed:
+            # aiohttp doesn't expose its pool, the sizes are read from its private attributes and left at 0 if a
+            # release changes them
+            connector = cls.session.connector
+            try:
+                stats["in_use"] = len(connector._acquired)
+                stats["idle"] = sum(len(conns) for conns in connector._conns.values())
+            except (AttributeError, TypeError):
+                stats["in_use"] = stats["idle"] = 0
+        return stats
+
+    @classmethod
+    async def close(cls):
+        if cls.session and not cls.session.closed:
+            log.info(f"Closing the API session, pool stats: {cls.pool_stats()}")
+            await cls.session.close()
+        cls.session = None
+
+    @classmethod
+    async def _request(cls, method: str, full_url: str, retries: int = 0, **kwargs) -> Response:
+        """
+        Issues a request on the shared session. Connection failures, timeouts and server errors are retried up to
+        `retries` times with a jittered exponential backoff, only idempotent requests should pass retries.
+        """
+        session = cls.get_session()
+        for attempt in range(retries + 1):
+            if attempt:
+                delay = random.uniform(0, cls.retry_backoff * 2 ** attempt)
+                log.debug(f"Retrying {method} \"{full_url}\" in {delay:.2f} seconds, attempt {attempt} of {retries}")
+                await asyncio.sleep(delay)
             try:
-                log.debug(f"GET request issued to \"{full_url}\"")
-                async with session.get(full_url, ssl=False) as get_session:
-                    json_dict = await get_session.json() or {}
-                    return cls.Response(json_dict, get_session.status)
+                async with session.request(method, full_url, ssl=False, **kwargs) as response:
+                    if response.status >= 500 and attempt < retries:
+                        continue
+                    json_dict = await response.json(loads=JSONCodec.loads) or {}
+                    return cls.Response(json_dict, response.status)
             except ClientConnectionError as error:
+                if attempt < retries:
+                    continue
                 log.warning(f"Could not connect to the API at url {cls.api_url}, error: {error}")
-                return cls.Response({}, 400)
+                return cls.Response({}, cls.CONNECTION_FAILED)
+            except asyncio.TimeoutError:
+                if attempt < retries:
+                    continue
+                log.warning(f"Timed out waiting on the API for {method} \"{full_url}\"")
+                return cls.Response({}, 408)
             except UnicodeError:
                 log.warning(f"Unicode error thrown due to URL, likely malformed, URL: {full_url}")
                 return cls.Response({}, 400)
 
+    @staticmethod
+    def _record(method: str, endpoint: str, issued_at: float, response: Response) -> Response:
+        endpoint = endpoint.split("?", 1)[0]  # Query strings would make a series per player
+        request_time.observe(time.perf_counter() - issued_at, method, endpoint)
+        responses.inc(method, endpoint, response.status)
+        return response
+
+    @classmethod
+    def encode(cls, endpoint: str, data) -> tuple[bytes, dict]:
+        """Encodes a request body with the JSON codec, compressing it if it's large enough, and returns its headers"""
+        body = JSONCodec.dumps(data)
+        headers = {"Content-Type": "application/json"}
+        encoding = "identity"
+        if cls.compression and len(body) >= cls.compression_min_size:
+            body = gzip.compress(body, compresslevel=cls.compression_level)
+            headers["Content-Encoding"] = encoding = "gzip"
+        request_bytes.inc(endpoint.split("?", 1)[0], encoding, amount=len(body))
+        return body, headers
+
     @classmethod
-    async def post(cls, endpoint: str = "/", data: dict = None) -> Response:
+    async def get(cls, endpoint: str = "/") -> Response:
+        full_url = cls.api_url + endpoint
+        if not cls.verify_url(full_url):
+            return cls.Response({}, 418)
+        log.debug(f"GET request issued to \"{full_url}\"")
+        issued_at = time.perf_counter()
+        response = await cls._request("GET", full_url, retries=cls.get_retries)
+        return cls._record("GET", endpoint, issued_at, response)
+
+    @classmethod
+    async def post(cls, endpoint: str = "/", data: dict = None, headers: dict = None) -> Response:
         full_url = cls.api_url + endpoint
         if not cls.verify_url(full_url):
             log.warning(f"URL {full_url} is not a valid url!")
             return cls.Response({}, 400)
-        async with ClientSession(headers=cls.headers) as session:
-            try:
-                log.debug(f"POST request issued to \"{full_url}\" with data \"{data}\"")
-                async with session.post(full_url, json=data, ssl=False) as post_session:
-                    json_dict = await post_session.json() or {}
-                    return cls.Response(json_dict, post_session.status)
-            except UnicodeError:
-                log.warning(f"Unicode error thrown due to URL, likely malformed, URL: {full_url}")
-                return cls.Response({}, 400)
-            except ClientConnectionError as error:
-                log.warning(f"Could not connect to the API at url {cls.api_url}, error: {error}")
-                return cls.Response({}, 400)
+        log.debug(f"POST request issued to \"{full_url}\" with data \"{data}\"")
+        issued_at = time.perf_counter()
+        if data is None:
+            response = await cls._request("POST", full_url, headers=headers)
+        else:
+            body, body_headers = cls.encode(endpoint, data)
+            response = await cls._request("POST", full_url, data=body, headers={**body_headers, **(headers or {})})
+        return cls._record("POST", endpoint, issued_at, response)
+
+
+Metrics.gauge("tracker_api_pool_connections", "Pooled API connections, by state",
+              lambda: {(state,): APIRequest.pool_stats()[state] for state in ("in_use", "idle")}, ("state",))
+Metrics.gauge("tracker_api_pool_waits", "Requests that waited on a free pooled connection",
+              lambda: APIRequest.pool_waits)
+on_configure(APIRequest.configure)
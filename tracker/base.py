@@ -0,0 +1,388 @@
+import os
+import sys
+import logging
+import asyncio
+from importlib import import_module
+from pathlib import Path
+from logging import config
+from typing import AsyncIterator
+
+import yaml
+
+from tracker import root_path
+from tracker.rcon import RconError
+from tracker.rcon import split_messages
+from tracker.metrics import Metrics
+from tracker.server import DEFAULT_SERVER
+from tracker.server import Server
+from tracker.server import current_server
+from tracker.settings import Settings
+
+log = logging.getLogger(__name__)
+
+# Imported when the tracker starts, registering the event listeners. With the API client they use, importing them is
+# most of the time it takes to start
+handler_modules = (
+    "tracker.apirequest",
+    "tracker.outbox",
+    "tracker.ingest",
+    "tracker.mordhau_events.event_registration",
+    "tracker.mordhau_events.server_state",
+)
+
+
+def shard_path(path: Path, shard_number) -> Path:
+    """The path a shard writes to instead of `path`, e.g. rcon.log becomes rcon.shard1.log"""
+    path = Path(path)
+    return path.with_name(f"{path.stem}.shard{shard_number}{path.suffix}")
+
+
+def setup_logging(settings: Settings) -> None:
+    try:
+        with open(settings.log_config_path) as f:
+            log_config = yaml.safe_load(f)
+    except FileNotFoundError as error:
+        print(f"Could not find your log config at: {str(error).split(' ')[-1]}")
+        return
+
+    settings.log_directory.mkdir(parents=True, exist_ok=True)
+    for handler in log_config.get("handlers", {}).values():
+        if "filename" not in handler:
+            continue
+        handler["filename"] = str(settings.log_directory / handler["filename"])
+        # Processes can't safely share (and rotate) a log file, each shard writes its own
+        if settings.shard is not None:
+            handler["filename"] = str(shard_path(handler["filename"], settings.shard))
+
+    config.dictConfig(log_config)
+
+    from tracker.logqueue import LogQueue
+
+    LogQueue.start()  # Handlers write from a background thread so disk stalls don't stall the event loop
+
+
+packets_received = Metrics.counter("tracker_rcon_packets_total", "RCON packets received, or replayed", ("server",))
+
+
+class Base:
+    # Set by `configure`, before the tracker runs
+    settings: [Settings, None] = None
+    servers: dict[str, Server] = {}
+    processes = 1
+
+    @classmethod
+    def configure(cls, settings: Settings = None) -> Settings:
+        """
+        Sets the tracker up to run with the settings, read from the environment if none are given, and creates its
+        servers. Nothing is connected until it runs.
+        """
+        settings = settings or Settings.from_environment()
+        cls.settings = settings
+        settings.apply()
+        cls.processes = settings.processes
+        cls.servers = {server.id: Server(server.id, server.ip, server.port, server.password,
+                                         pool_size=settings.pool_size, timeout=settings.command_timeout,
+                                         multi_packet=settings.multi_packet)
+                       for server in settings.servers}
+        return settings
+
+    @classmethod
+    def server(cls) -> Server:
+        """The server whose messages are being handled, or the first server outside of handling a message"""
+        return current_server.get(None) or next(iter(cls.servers.values()))
+
+    @classmethod
+    async def read(cls, server: Server, read_log=False, log_paths: list[Path] = None, paced=False, speed: float = 1,
+                   start: str = None):
+        if read_log:
+            from tracker.capture import CaptureWriter
+            from tracker.capture import server_capture_path
+            from tracker.replay import log_files
+            from tracker.replay import replay
+
+            default_path = server_capture_path(server.id) if CaptureWriter.capture_format == "binary" else \
+                cls.settings.log_directory / "raw_rcon.log"
+            paths = [path for log_path in log_paths or [default_path] for path in log_files(Path(log_path))]
+            if not paths:
+                log.error(f"Expected the log \"{default_path}\" but it did not exist! The "
+                          f"`read log` flag requires that file, or the paths passed after it, to read data from!")
+                return
+            log.info(f"Reading the log data in {', '.join(str(path) for path in paths)} as \"{server.id}\", "
+                     f"{f'paced at {speed}x speed' if paced else 'as fast as possible'}"
+                     f"{f', from {start}' if start else ''}")
+            async for body in replay(paths, paced=paced, speed=speed, start=start):
+                yield body
+        else:
+            async for body in server.listener.listen():
+                yield body
+
+    @staticmethod
+    def replay_args(args) -> tuple[bool, list[Path], bool, float, [str, None]]:
+        """
+        Parses the replay flags, `--read-log` (or `-r`) optionally followed by the logs to replay,
+        `--replay-paced` to reproduce the recorded timing, `--replay-speed <multiplier>` and
+        `--replay-from <timestamp or +seconds>`
+        """
+        read_log = "--read-log" in args or "-r" in args
+        log_paths = []
+        if read_log:
+            flag_index = args.index("--read-log" if "--read-log" in args else "-r")
+            for arg in args[flag_index + 1:]:
+                if arg.startswith("-"):
+                    break
+                log_paths.append(Path(arg))
+        speed = 1
+        if "--replay-speed" in args:
+            try:
+                speed = float(args[args.index("--replay-speed") + 1])
+            except (IndexError, ValueError):
+                log.warning("The --replay-speed flag expects a number after it, replaying at normal speed")
+            if not 0 < speed < float("inf"):
+                log.critical(f"The --replay-speed flag expects a multiplier above 0 (e.g. 2 for twice as fast), not "
+                             f"\"{args[args.index('--replay-speed') + 1]}\"")
+                sys.exit(2)
+        start = None
+        if "--replay-from" in args:
+            from tracker.replay import valid_start
+
+            try:
+                start = args[args.index("--replay-from") + 1]
+            except IndexError:
+                log.warning("The --replay-from flag expects a timestamp after it, replaying from the start")
+            if start is not None and not valid_start(start):
+                log.critical(f"The --replay-from flag expects a Mordhau timestamp (e.g. 2021.05.01-02.25.29), seconds "
+                             f"since the epoch or +<seconds> into the recording, not \"{start}\"")
+                sys.exit(2)
+        return read_log, log_paths, "--replay-paced" in args, speed, start
+
+    @staticmethod
+    def start_stream(packets: AsyncIterator[bytes]) -> tuple[AsyncIterator[bytes], asyncio.Task]:
+        """
+        Starts reading a stream in the background, and returns it with the task reading its first packet. The packets
+        that arrive before the stream is iterated are queued by its connection.
+        """
+        first = asyncio.create_task(anext(packets))
+
+        async def stream():
+            try:
+                yield await first
+            except StopAsyncIteration:
+                return
+            async for body in packets:
+                yield body
+
+        return stream(), first
+
+    @classmethod
+    async def connect(cls, server: Server) -> bool:
+        try:
+            info = await server.rcon_command("info")
+        except ConnectionRefusedError:
+            log.error(f"Connection was refused to \"{server.ip}:{server.port}\" (\"{server.id}\"), verify that your "
+                      f"connection info is correct and that the server is up.")
+            return False
+        except (RconError, OSError, asyncio.TimeoutError):
+            log.exception(f"Could not connect to the server \"{server.id}\"")
+            return False
+        log.info(f"RCON connected to \"{server.id}\" at {server.ip}:{server.port}")
+        log.info("RCON info: " + " - ".join(info.split("\n")))
+        return True
+
+    @staticmethod
+    def import_handlers():
+        for module in handler_modules:
+            import_module(module)
+
+    @classmethod
+    async def authenticate(cls) -> bool:
+        """
+        Imports the event listeners and the API client, in a thread so the servers keep connecting in the meantime,
+        and verifies the API token
+        """
+        await asyncio.to_thread(cls.import_handlers)
+
+        from aiohttp import ContentTypeError
+        from tracker.apirequest import APIRequest
+
+        auth_fail_msg = f"Could not authenticate with the API located at \"{APIRequest.api_url}\""
+        try:
+            authenticated = await APIRequest.post("/user/verify")
+        except ContentTypeError:
+            log.error(auth_fail_msg)
+            return False
+        if authenticated.status != 200:
+            log.error(auth_fail_msg)
+            return False
+        return True
+
+    @classmethod
+    async def run(cls, *args):
+        if cls.settings is None:
+            cls.configure()
+        setup_logging(cls.settings)
+
+        read_log = cls.replay_args(args)[0]
+        if cls.processes > 1 and len(cls.servers) > 1 and not read_log:
+            await cls.run_shards(*args)
+            return
+
+        servers = list(cls.servers.values())
+        # The event streams start as the servers connect and the API is verified, none of them wait on the others
+        streams = {} if read_log else {server: cls.start_stream(cls.read(server)) for server in servers}
+        authenticated, *connections = await asyncio.gather(cls.authenticate(), *map(cls.connect, servers))
+        connected = [server for server, ok in zip(servers, connections) if ok]
+        if not authenticated or not connected:
+            from tracker.apirequest import APIRequest
+
+            for _, first in streams.values():
+                first.cancel()
+            await asyncio.gather(*(first for _, first in streams.values()), return_exceptions=True)
+            await asyncio.gather(*(server.close() for server in servers), APIRequest.close())
+            return
+        if len(connected) < len(servers):
+            log.warning(f"Continuing with {len(connected)} of {len(servers)} servers, the others are retried until "
+                        f"their RCON stream connects")
+
+        from tracker.ingest import Ingest
+        from tracker.outbox import Outbox
+        from tracker.mordhau_events.commands.game import Team
+        from tracker.mordhau_events.server_state import ServerState
+
+        Outbox.start()  # Delivers queued match data writes, including any left over from the last run
+        await Metrics.start()
+        Team.start()  # Match setups find the teams in the team index rather than waiting on the API
+        Ingest.start()  # Messages are handled by worker tasks, so reading never waits on a slow listener
+        ServerState.start()  # Reads each server's map, the event stream keeps it up to date from there
+        version = open(root_path.parent / 'VERSION').read()
+        for server in connected:  # Chat is queued, the greeting doesn't hold up the streams
+            await server.rcon_command(f"say RCON Data Ingester Online, Version {version}.\n"
+                                      f"Written by Price Hiller (Sbinalla), contributors:\n"
+                                      f"   - Jacob Sanders (Null Byte)\n"
+                                      f"   - Clinically Lazy (Clinically Lazy)")
+        if read_log:
+            # A replay is handled as the first server's traffic, and is not captured again, it would be appended to
+            # the recording being replayed
+            read_log, log_paths, paced, speed, start = cls.replay_args(args)
+            readers = [asyncio.create_task(cls.ingest(servers[0], cls.read(
+                servers[0], read_log=read_log, log_paths=log_paths, paced=paced, speed=speed, start=start
+            ), record=False))]
+        else:
+            readers = [asyncio.create_task(cls.ingest(server, streams[server][0])) for server in servers]
+        try:
+            await asyncio.gather(*readers)
+        finally:
+            for reader in readers:
+                reader.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+            await Ingest.stop()
+            await cls.close()
+
+    @classmethod
+    async def ingest(cls, server: Server, packets, record: bool = True):
+        """Records the packets read from a server, and submits their messages to the ingest workers"""
+        from tracker.capture import CaptureWriter
+        from tracker.capture import server_capture_path
+        from tracker.ingest import Ingest
+
+        # Other servers are logged to a child logger, which can be given its own handler to record it to its own file
+        raw_rcon = logging.getLogger("raw_rcon" if server.id == DEFAULT_SERVER else f"raw_rcon.{server.id}")
+        capture_text = record and CaptureWriter.capture_format in ("text", "both")
+        capture = CaptureWriter(server_capture_path(server.id)) \
+            if record and CaptureWriter.capture_format in ("binary", "both") else None
+        try:
+            async for event in packets:
+                debug = log.isEnabledFor(logging.DEBUG)  # Skips building the debug messages when they'd be discarded
+                if debug:
+                    log.debug(f"Received RCON emission from \"{server.id}\": {event}")
+                if capture_text:
+                    raw_rcon.info(event)
+                packets_received.inc(server.id)
+                if capture:
+                    capture.write(event)
+
+                # RCON occasionally combines two messages into one packet with a NULL character between them
+                for message in split_messages(event):
+                    if debug:
+                        log.debug(f"Received event from \"{server.id}\": \"{message.strip()}\"")
+                    await Ingest.submit(message, server)
+        finally:
+            if capture:
+                capture.close()
+
+    @classmethod
+    async def run_shards(cls, *args):
+        """
+        Splits the servers between `RCON_PROCESSES` tracker processes and waits for them to exit. Every shard has its
+        own outbox, player cache, metrics port and snapshot, and log files. The first shard keeps the default outbox,
+        so writes left pending by an unsharded run are still delivered, and the default player cache.
+        """
+        from tracker.outbox import Outbox
+
+        server_ids = list(cls.servers)
+        shards = [server_ids[shard_number::cls.processes] for shard_number in range(cls.processes)]
+        processes = []
+        try:
+            for shard_number, shard_servers in enumerate(shard for shard in shards if shard):
+                environment = {**os.environ, "RCON_SERVERS": ",".join(shard_servers), "RCON_PROCESSES": "1",
+                               "RCON_SHARD": str(shard_number)}
+                if shard_number:
+                    environment["OUTBOX_PATH"] = str(shard_path(Outbox.path, shard_number))
+                    # Shards saving the one cache would overwrite each other's entries
+                    environment["PLAYER_CACHE_PATH"] = str(shard_path(cls.settings.player.cache_path, shard_number))
+                if Metrics.port:
+                    environment["METRICS_PORT"] = str(Metrics.port + shard_number)
+                if Metrics.snapshot_path:
+                    environment["METRICS_SNAPSHOT_PATH"] = str(shard_path(Metrics.snapshot_path, shard_number))
+                # Only flags are passed on, a replay is never sharded
+                processes.append(await asyncio.create_subprocess_exec(
+                    sys.executable, "-m", "tracker", *(arg for arg in args if arg.startswith("-")),
+                    cwd=root_path.parent, env=environment
+                ))
+                log.info(f"Started shard {shard_number} (pid {processes[-1].pid}) for the servers: "
+                         f"{', '.join(shard_servers)}")
+            for shard_number, code in enumerate(await asyncio.gather(*(process.wait() for process in processes))):
+                log.log(logging.INFO if code == 0 else logging.ERROR, f"Shard {shard_number} exited with code {code}")
+        finally:
+            for process in processes:
+                if process.returncode is None:
+                    process.terminate()
+            await asyncio.gather(*(process.wait() for process in processes))
+
+            from tracker.logqueue import LogQueue
+
+            LogQueue.stop()
+
+    @classmethod
+    async def close(cls):
+        from tracker.apirequest import APIRequest
+        from tracker.outbox import Outbox
+        from tracker.mordhau_events.commands.game import Player
+        from tracker.mordhau_events.commands.game import Team
+        from tracker.mordhau_events.commands.game.game import Game
+        from tracker.mordhau_events.server_state import ServerState
+
+        for game in Game.games.values():
+            game.stop_reconciling()
+        await asyncio.gather(Team.stop(), ServerState.stop(), Player.stop_prefetching())
+        await Outbox.stop()
+        await asyncio.gather(*(server.close() for server in cls.servers.values()), APIRequest.close(), Metrics.stop())
+
+        from tracker.logqueue import LogQueue
+
+        LogQueue.stop()
+
+    @classmethod
+    async def rcon_command(cls, command: str) -> str:
+        """Issues a command to the server whose messages are being handled"""
+        return await cls.server().rcon_command(command)
+
+
+Metrics.gauge("tracker_rcon_commands_in_flight", "RCON commands awaiting a response, by server",
+              lambda: {(server.id,): sum(client.pending for client in server.rcon_pool.clients)
+                       for server in Base.servers.values()}, ("server",))
+
+rcon_command = Base.rcon_command
+
+__all__ = [
+    "rcon_command"
+]
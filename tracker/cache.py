@@ -0,0 +1,107 @@
+import json
+import logging
+import os
+import time
+
+from collections import OrderedDict
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    An in-memory LRU cache whose entries expire after `ttl` seconds.
+
+    If a path is given the cache is loaded from it on first use and can be written back with `save`, so the entries
+    survive restarts. Expiry uses wall clock time so it carries over between processes.
+    """
+
+    def __init__(self, ttl: float, max_size: int, path: [Path, None] = None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[object, float]] = OrderedDict()
+        self._loaded = path is None
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: str):
+        self._load()
+        entry = self._entries.get(key)
+        return entry is not None and entry[1] > time.time()
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as error:
+            log.warning(f"Unable to load the cache at \"{self.path}\", starting empty: {error}")
+            return
+        now = time.time()
+        for key, (value, expires_at) in sorted(saved.items(), key=lambda item: item[1][1]):
+            if expires_at > now:
+                self._entries[key] = (value, expires_at)
+        self._evict()
+        log.debug(f"Loaded {len(self._entries)} cache entries from \"{self.path}\"")
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str, default=None):
+        self._load()
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+                self._dirty = True
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: str, value):
+        self._load()
+        self._entries[key] = (value, time.time() + self.ttl)
+        self._entries.move_to_end(key)
+        self._evict()
+        self._dirty = True
+
+    def invalidate(self, key: str):
+        self._load()
+        if self._entries.pop(key, None) is not None:
+            self._dirty = True
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0,
+        }
+
+    def save(self):
+        """Writes the cache to its path if it changed since it was last saved"""
+        if self.path is None or not self._dirty:
+            return
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(dict(self._entries), f)
+            os.replace(temp_path, self.path)
+        except OSError as error:
+            log.warning(f"Unable to save the cache to \"{self.path}\": {error}")
+            return
+        self._dirty = False
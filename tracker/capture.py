@@ -0,0 +1,227 @@
+"""
+A compact, seekable binary capture of raw RCON traffic.
+
+A capture file starts with `MAGIC` and is followed by zlib compressed blocks. Each block holds the packets received
+over `CAPTURE_BLOCK_SIZE` bytes or `CAPTURE_FLUSH_INTERVAL` seconds, whichever comes first, and each packet is stored
+length prefixed alongside the time it was received:
+
+    block   <first timestamp: f64><last timestamp: f64><compressed size: u32><packets: u32><zlib data>
+    packet  <received at: f64><body size: u32><body>
+
+Timestamps are seconds since the epoch, advanced by the monotonic clock from when the capture was opened, so they never
+go backwards. A sidecar index (`<capture>.idx`) maps the first timestamp of every block to its offset, which lets a
+replay start from any point of a match by decompressing only the blocks from there on. A missing or outdated index is
+rebuilt from the block headers, without decompressing anything.
+"""
+
+import bisect
+import logging
+import os
+import struct
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+from tracker.server import DEFAULT_SERVER
+from tracker.settings import CaptureSettings
+from tracker.settings import Settings
+from tracker.settings import on_configure
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"MFCRCAP1"
+BLOCK_HEADER = struct.Struct("<ddII")
+PACKET_HEADER = struct.Struct("<dI")
+INDEX_ENTRY = struct.Struct("<ddQII")
+INDEX_SUFFIX = ".idx"
+
+
+@dataclass(frozen=True)
+class Block:
+    __slots__ = ("first_timestamp", "last_timestamp", "offset", "size", "packets")
+    first_timestamp: float
+    last_timestamp: float
+    # The offset of the block's header, its data follows the header
+    offset: int
+    size: int
+    packets: int
+
+    @property
+    def end(self) -> int:
+        return self.offset + BLOCK_HEADER.size + self.size
+
+    def index_entry(self) -> bytes:
+        return INDEX_ENTRY.pack(self.first_timestamp, self.last_timestamp, self.offset, self.size, self.packets)
+
+
+def is_capture(path: Path) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def index_path(path: Path) -> Path:
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def server_capture_path(server_id: str) -> Path:
+    """Where a server is captured, servers other than the default one each have their own capture next to it"""
+    if server_id == DEFAULT_SERVER:
+        return CaptureWriter.path
+    return CaptureWriter.path.with_name(f"{CaptureWriter.path.stem}.{server_id}{CaptureWriter.path.suffix}")
+
+
+class CaptureWriter:
+    # Set from the settings by `configure` when the tracker starts
+    capture_format = CaptureSettings.format
+    path = CaptureSettings.path
+    block_size = CaptureSettings.block_size
+    flush_interval = CaptureSettings.flush_interval
+    compression_level = CaptureSettings.compression_level
+
+    @classmethod
+    def configure(cls, settings: Settings):
+        cls.capture_format = settings.capture.format
+        cls.path = settings.capture.path
+        cls.block_size = settings.capture.block_size
+        cls.flush_interval = settings.capture.flush_interval
+        cls.compression_level = settings.capture.compression_level
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path or self.path)
+        new = not self.path.exists() or self.path.stat().st_size == 0
+        if not new and not is_capture(self.path):
+            raise ValueError(f"\"{self.path}\" exists and is not an RCON capture")
+        if not new:
+            # Brings the index up to date, and cuts off a block left half written by a crash, before appending
+            blocks = CaptureReader(self.path).index()
+            os.truncate(self.path, blocks[-1].end if blocks else len(MAGIC))
+        self.file = open(self.path, "ab")
+        if new:
+            self.file.write(MAGIC)
+        self.index_file = open(index_path(self.path), "ab")
+        self.buffer = bytearray()
+        self.packets = 0
+        self.first_timestamp = self.last_timestamp = 0.0
+        self.block_started_at = 0.0
+        self._wall_start = time.time()
+        self._monotonic_start = time.monotonic()
+
+    def timestamp(self) -> float:
+        return self._wall_start + (time.monotonic() - self._monotonic_start)
+
+    def write(self, body: bytes, received_at: float = None):
+        received_at = self.timestamp() if received_at is None else received_at
+        if not self.packets:
+            self.first_timestamp = received_at
+            self.block_started_at = time.monotonic()
+        self.buffer += PACKET_HEADER.pack(received_at, len(body))
+        self.buffer += body
+        self.packets += 1
+        self.last_timestamp = received_at
+        if len(self.buffer) >= self.block_size or time.monotonic() - self.block_started_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Compresses the buffered packets into a block, and indexes it"""
+        if not self.packets:
+            return
+        data = zlib.compress(self.buffer, self.compression_level)
+        offset = self.file.tell()
+        self.file.write(BLOCK_HEADER.pack(self.first_timestamp, self.last_timestamp, len(data), self.packets))
+        self.file.write(data)
+        self.file.flush()
+        # The index is written after the block, so it never points at a block that isn't on disk
+        self.index_file.write(Block(self.first_timestamp, self.last_timestamp, offset, len(data),
+                                    self.packets).index_entry())
+        self.index_file.flush()
+        self.buffer.clear()
+        self.packets = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        self.index_file.close()
+
+
+class CaptureReader:
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._blocks: [list[Block], None] = None
+
+    def _scan(self, f, offset: int) -> list[Block]:
+        """Reads the block headers from `offset` to the end of the file"""
+        blocks = []
+        size = os.fstat(f.fileno()).st_size
+        f.seek(offset)
+        while offset + BLOCK_HEADER.size <= size:
+            first_timestamp, last_timestamp, data_size, packets = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+            block = Block(first_timestamp, last_timestamp, offset, data_size, packets)
+            if block.end > size:
+                log.warning(f"The capture \"{self.path}\" ends with a truncated block at offset {offset}, ignoring it")
+                break
+            blocks.append(block)
+            offset = block.end
+            f.seek(offset)
+        return blocks
+
+    def index(self) -> list[Block]:
+        """Every block in the capture, from the sidecar index with any blocks missing from it rebuilt and saved"""
+        if self._blocks is not None:
+            return self._blocks
+        sidecar = index_path(self.path)
+        data = sidecar.read_bytes() if sidecar.exists() else b""
+        # A partial entry at the end is left by a crash while indexing, the block it was for is rescanned
+        rewrite = len(data) % INDEX_ENTRY.size != 0
+        blocks = [Block(*entry) for entry in INDEX_ENTRY.iter_unpack(data[:len(data) - len(data) % INDEX_ENTRY.size])]
+
+        with open(self.path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"\"{self.path}\" is not an RCON capture")
+            end = os.fstat(f.fileno()).st_size
+            if blocks and blocks[-1].end > end:
+                log.warning(f"The index of \"{self.path}\" does not match the capture, rebuilding it")
+                blocks = []
+            if (indexed_to := blocks[-1].end if blocks else len(MAGIC)) < end:
+                blocks += self._scan(f, indexed_to)
+                rewrite = True
+        if rewrite:
+            sidecar.write_bytes(b"".join(block.index_entry() for block in blocks))
+        self._blocks = blocks
+        return blocks
+
+    def packets(self, start: float = None) -> Iterator[tuple[float, bytes]]:
+        """
+        Lazily yields the receive time and body of every packet, from the first block that may hold packets received
+        at or after `start` when it is given. Earlier packets in that block are still yielded.
+        """
+        blocks = self.index()
+        first = 0
+        if start is not None:
+            # The last block that starts at or before `start`
+            first = max(bisect.bisect_right([block.first_timestamp for block in blocks], start) - 1, 0)
+        with open(self.path, "rb") as f:
+            for block in blocks[first:]:
+                f.seek(block.offset + BLOCK_HEADER.size)
+                data = memoryview(zlib.decompress(f.read(block.size)))
+                position = 0
+                while position < len(data):
+                    received_at, size = PACKET_HEADER.unpack_from(data, position)
+                    position += PACKET_HEADER.size
+                    yield received_at, bytes(data[position:position + size])
+                    position += size
+
+
+on_configure(CaptureWriter.configure)
+
+__all__ = [
+    "CaptureWriter",
+    "CaptureReader",
+    "is_capture",
+    "server_capture_path"
+]
@@ -0,0 +1,162 @@
+"""
+Decouples reading RCON from handling what was read.
+
+The reader submits each message to a bounded queue and goes straight back to the socket, a pool of worker tasks hands
+the messages to the listeners. Each worker has its own queue:
+
+    - Events that change the game (Scorefeed, MatchState and Chat, which carries the match commands) and the events
+      the live stats are built from (Killfeed and Login) must be handled in the order they arrived, they always go to
+      the same worker for the server they came from
+    - Everything else goes to the worker with the shortest queue
+
+Workers handle each message with the server it came from set as the `current_server`.
+
+When a worker's queue is full the reader waits for room, which pushes back on the RCON connection rather than growing
+memory without bound. Before it gets that far, once a worker's queue is `INGEST_SHED_THRESHOLD` full, listeners marked
+`droppable` (such as the event log) are skipped for the messages it handles so it catches up on the work that matters.
+A single backed up worker (the one a busy server's ordered events go to) sheds load even while the others are idle.
+Queue depths, waits and drops are recorded in the metrics.
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from contextvars import ContextVar
+
+from avents import Event
+from avents import parse
+
+from tracker.metrics import Metrics
+from tracker.mordhau_events import MORDHAU_TAGS
+from tracker.server import Server
+from tracker.server import current_server
+from tracker.settings import IngestSettings
+from tracker.settings import Settings
+from tracker.settings import on_configure
+
+log = logging.getLogger(__name__)
+
+queue_wait_time = Metrics.histogram("tracker_ingest_queue_seconds", "Time messages waited in the ingest queue")
+handling_time = Metrics.histogram("tracker_ingest_seconds", "Time taken for every listener to handle an RCON message")
+backpressure = Metrics.counter("tracker_ingest_backpressure_total",
+                               "Messages the reader had to wait to queue, because the worker's queue was full")
+# The queue of the worker handling the current message
+handling_queue: ContextVar[asyncio.Queue] = ContextVar("handling_queue")
+
+dropped = Metrics.counter("tracker_ingest_dropped_total", "Droppable work skipped under load, by listener",
+                          ("listener",))
+
+
+class Ingest:
+    # Set from the settings by `configure` when the tracker starts
+    workers = IngestSettings.workers
+    queue_size = IngestSettings.queue_size
+    shed_threshold = IngestSettings.shed_threshold
+    drain_timeout = IngestSettings.drain_timeout
+    ordered_types = IngestSettings.ordered_types
+
+    queues: list[asyncio.Queue] = []
+    tasks: list[asyncio.Task] = []
+
+    @classmethod
+    def configure(cls, settings: Settings):
+        cls.workers = settings.ingest.workers
+        cls.queue_size = settings.ingest.queue_size
+        cls.shed_threshold = settings.ingest.shed_threshold
+        cls.drain_timeout = settings.ingest.drain_timeout
+        cls.ordered_types = settings.ingest.ordered_types
+
+    @classmethod
+    def start(cls):
+        if cls.tasks:
+            return
+        cls.queues = [asyncio.Queue(cls.queue_size) for _ in range(cls.workers)]
+        cls.tasks = [asyncio.create_task(cls._work(queue)) for queue in cls.queues]
+
+    @classmethod
+    def depth(cls) -> int:
+        return sum(queue.qsize() for queue in cls.queues)
+
+    @classmethod
+    def overloaded(cls, queue: asyncio.Queue = None) -> bool:
+        """
+        Whether a queue is at least `shed_threshold` full, by default the one of the worker handling the current
+        message, or any of them outside of a worker
+        """
+        queues = [queue] if (queue := queue or handling_queue.get(None)) else cls.queues
+        return any(queue.qsize() >= cls.shed_threshold * cls.queue_size for queue in queues)
+
+    @classmethod
+    def route(cls, message: str, server: Server = None) -> asyncio.Queue:
+        """The queue for a message, ordered events from the same server (the game they are for) share one"""
+        if (match := MORDHAU_TAGS.search(message)) and match.group() in cls.ordered_types:
+            return cls.queues[hash(server.id if server else "") % len(cls.queues)]
+        return min(cls.queues, key=asyncio.Queue.qsize)
+
+    @classmethod
+    async def submit(cls, message: str, server: Server = None):
+        """Queues a message for the workers, waiting for room if its worker has fallen too far behind"""
+        queue = cls.route(message, server)
+        item = (message, server, time.perf_counter())
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            backpressure.inc()
+            await queue.put(item)
+
+    @classmethod
+    async def _work(cls, queue: asyncio.Queue):
+        handling_queue.set(queue)
+        while True:
+            message, server, queued_at = await queue.get()
+            started_at = time.perf_counter()
+            queue_wait_time.observe(started_at - queued_at)
+            current_server.set(server)
+            try:
+                await parse(Event(name="RCON", content=message))
+            except Exception:
+                log.exception(f"Unable to handle the RCON message \"{message}\"")
+            finally:
+                handling_time.observe(time.perf_counter() - started_at)
+                queue.task_done()
+
+    @classmethod
+    async def stop(cls):
+        """Handles everything still queued, then stops the workers"""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in cls.queues)), cls.drain_timeout)
+        except asyncio.TimeoutError:
+            log.warning(f"Stopped ingest with {cls.depth()} RCON messages still queued after waiting "
+                        f"{cls.drain_timeout} seconds for them")
+        for task in cls.tasks:
+            task.cancel()
+        await asyncio.gather(*cls.tasks, return_exceptions=True)
+        if drops := {values[0]: count for values, count in dropped.values.items()}:
+            log.info(f"Droppable work skipped under load: {drops}")
+        cls.queues, cls.tasks = [], []
+
+
+def droppable(name: str):
+    """Marks a listener as low priority, it's skipped while the ingest queues are overloaded"""
+    def decorator(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            if Ingest.overloaded():
+                dropped.inc(name)
+                return
+            return await function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+Metrics.gauge("tracker_ingest_queue_depth", "Messages waiting in each worker's ingest queue",
+              lambda: {(str(worker),): queue.qsize() for worker, queue in enumerate(Ingest.queues)}, ("worker",))
+on_configure(Ingest.configure)
+
+__all__ = [
+    "Ingest",
+    "droppable"
+]
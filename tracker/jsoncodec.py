@@ -0,0 +1,56 @@
+"""
+The JSON encoder and decoder for API requests and responses.
+
+`API_JSON` picks the implementation: `orjson` or `ujson` when they are installed, or the standard library's `json`. With
+the default `auto` the fastest one installed is used. A library that is asked for but isn't installed falls back to the
+standard library with a warning, so neither is a requirement.
+"""
+
+import json
+import logging
+from typing import Callable
+
+from tracker.settings import JSON_CODECS
+from tracker.settings import Settings
+from tracker.settings import on_configure
+
+log = logging.getLogger(__name__)
+
+
+def _load(name: str) -> tuple[Callable[[object], bytes], Callable]:
+    """The `(dumps, loads)` of a codec, raises ImportError if its library isn't installed"""
+    if name == "orjson":
+        import orjson
+        return orjson.dumps, orjson.loads
+    if name == "ujson":
+        import ujson
+        return lambda obj: ujson.dumps(obj, ensure_ascii=False).encode(), ujson.loads
+    return lambda obj: json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode(), json.loads
+
+
+def _choose(preference: str) -> tuple[str, Callable[[object], bytes], Callable]:
+    for name in JSON_CODECS if preference == "auto" else (preference,):
+        try:
+            return name, *_load(name)
+        except ImportError:
+            if preference != "auto":
+                log.warning(f"The JSON codec \"{name}\" is not installed, using the standard library instead")
+    return "json", *_load("json")
+
+
+class JSONCodec:
+    # The fastest one installed until `configure` picks the one the settings ask for
+    name, dumps, loads = _choose("auto")
+
+    @classmethod
+    def configure(cls, settings: Settings):
+        cls.name, cls.dumps, cls.loads = _choose(settings.api.json)
+        log.debug(f"Encoding API JSON with {cls.name}")
+
+
+on_configure(JSONCodec.configure)
+
+
+__all__ = [
+    "JSONCodec"
+]
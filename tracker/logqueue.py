@@ -0,0 +1,150 @@
+"""
+Moves log output off the event loop.
+
+Once the log config is applied, every configured logger has its handlers swapped for a `BoundedQueueHandler`, and a
+`QueueListener` thread passes the queued records to the original handlers. The event loop then only appends to a
+queue, and slow disk writes in a `RotatingFileHandler` no longer stall RCON ingest.
+
+The queues are bounded so a disk that can't keep up doesn't grow memory without limit. When a queue is full the
+overflow policy decides what happens:
+
+    drop-new    the record being logged is dropped (the default)
+    drop-old    the oldest queued record is dropped to make room
+    block       the event loop waits for room, no records are lost
+
+Records at ERROR or above are never dropped, they wait for room like `block`. Dropped records are counted per logger
+and reported by `stats()` and when logging stops.
+"""
+
+import atexit
+import logging
+import queue
+from collections import Counter
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
+
+from tracker.metrics import Metrics
+from tracker.settings import LogQueueSettings
+from tracker.settings import Settings
+from tracker.settings import on_configure
+
+log = logging.getLogger(__name__)
+
+
+class BoundedQueueHandler(QueueHandler):
+
+    def __init__(self, log_queue: queue.Queue, overflow: str = "drop-new"):
+        super().__init__(log_queue)
+        self.overflow = overflow
+        self.dropped = Counter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Unlike the default this does not format the record, the handlers do that on the listener thread. Only the
+        arguments are merged so they can't change before the record is written.
+        """
+        if record.args:
+            record = logging.makeLogRecord(record.__dict__)
+            record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.overflow == "block" or record.levelno >= logging.ERROR:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if self.overflow == "drop-old":
+                try:
+                    dropped = self.queue.get_nowait()
+                    self.dropped[dropped.levelname] += 1
+                    self.queue.put_nowait(record)
+                    return
+                except (queue.Empty, queue.Full):
+                    pass
+            self.dropped[record.levelname] += 1
+
+
+class BoundedQueueListener(QueueListener):
+
+    def enqueue_sentinel(self):
+        # The queue may be full when stopping, the sentinel waits for room rather than being lost
+        self.queue.put(self._sentinel)
+
+
+class LogQueue:
+    # Set from the settings by `configure` when the tracker starts
+    enabled = LogQueueSettings.enabled
+    size = LogQueueSettings.size
+    overflow = LogQueueSettings.overflow
+
+    # (logger, its queue handler, the listener writing to its original handlers)
+    queues: list[tuple[logging.Logger, BoundedQueueHandler, BoundedQueueListener]] = []
+
+    @classmethod
+    def configure(cls, settings: Settings):
+        cls.enabled = settings.log_queue.enabled
+        cls.size = settings.log_queue.size
+        cls.overflow = settings.log_queue.overflow
+
+    @classmethod
+    def start(cls):
+        """Puts the handlers of the root logger and every configured logger behind a queue"""
+        if not cls.enabled or cls.queues:
+            return
+        loggers = [logging.getLogger()] + [
+            logger for logger in logging.Logger.manager.loggerDict.values()
+            if isinstance(logger, logging.Logger) and logger.handlers
+        ]
+        for logger in loggers:
+            handlers = [handler for handler in logger.handlers if not isinstance(handler, QueueHandler)]
+            if not handlers:
+                continue
+            queue_handler = BoundedQueueHandler(queue.Queue(cls.size), cls.overflow)
+            # Records none of the handlers would write are never queued
+            queue_handler.setLevel(min(handler.level for handler in handlers))
+            listener = BoundedQueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+            for handler in handlers:
+                logger.removeHandler(handler)
+            logger.addHandler(queue_handler)
+            listener.start()
+            cls.queues.append((logger, queue_handler, listener))
+        atexit.register(cls.stop)
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            logger.name: {
+                "queued": queue_handler.queue.qsize(),
+                "dropped": sum(queue_handler.dropped.values()),
+                "dropped_by_level": dict(queue_handler.dropped),
+            }
+            for logger, queue_handler, _ in cls.queues
+        }
+
+    @classmethod
+    def stop(cls):
+        """Writes out every queued record and restores the original handlers"""
+        if not cls.queues:
+            return
+        for logger, queue_handler, listener in cls.queues:
+            listener.stop()
+            logger.removeHandler(queue_handler)
+            for handler in listener.handlers:
+                logger.addHandler(handler)
+        if dropped := {name: stats["dropped"] for name, stats in cls.stats().items() if stats["dropped"]}:
+            log.warning(f"Log records were dropped because the log queue was full: {dropped}")
+        cls.queues = []
+        atexit.unregister(cls.stop)
+
+
+Metrics.gauge("tracker_log_queue_depth", "Log records waiting to be written, by logger",
+              lambda: {(name,): stats["queued"] for name, stats in LogQueue.stats().items()}, ("logger",))
+Metrics.gauge("tracker_log_records_dropped", "Log records dropped because the log queue was full, by logger",
+              lambda: {(name,): stats["dropped"] for name, stats in LogQueue.stats().items()}, ("logger",))
+on_configure(LogQueue.configure)
+
+__all__ = [
+    "LogQueue"
+]
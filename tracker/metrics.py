@@ -0,0 +1,277 @@
+"""
+In process metrics for the tracker: counters, histograms and gauges that are cheap enough to always be recorded.
+
+Metrics are created once where they are used and recorded in place, a counter increment or histogram observation is a
+dictionary lookup and an addition:
+
+    >>> events = Metrics.counter("tracker_events_total", "Mordhau events received", ("type",))
+    >>> events.inc("Killfeed:")
+
+Gauges are read from a function when the metrics are collected, so queue depths cost nothing between collections.
+
+They are exposed in the Prometheus text format on `http://METRICS_HOST:METRICS_PORT/metrics` (and as JSON on
+`/metrics.json`) when `METRICS_PORT` is set, and/or written as JSON snapshots to `METRICS_SNAPSHOT_PATH` every
+`METRICS_SNAPSHOT_INTERVAL` seconds.
+"""
+
+import asyncio
+import bisect
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Callable
+
+from tracker.settings import MetricsSettings
+from tracker.settings import Settings
+from tracker.settings import on_configure
+
+log = logging.getLogger(__name__)
+
+# Seconds, from a tenth of a millisecond to half a minute
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30)
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(names: tuple, values: tuple, extra: dict = None) -> str:
+    labels = [f"{name}=\"{escape(value)}\"" for name, value in zip(names, values)]
+    labels += [f"{name}=\"{escape(value)}\"" for name, value in (extra or {}).items()]
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{format_labels(self.labels, values)} {value}" for values, value in self.values.items()]
+
+    def snapshot(self) -> list[dict]:
+        return [{"labels": dict(zip(self.labels, values)), "value": value} for values, value in self.values.items()]
+
+
+class Gauge(Counter):
+    """A value read when the metrics are collected, `function` returns it or a dict of label values to values"""
+    type = "gauge"
+
+    def __init__(self, name: str, description: str, function: Callable, labels: tuple = ()):
+        super().__init__(name, description, labels)
+        self.function = function
+
+    def collect(self):
+        try:
+            value = self.function()
+        except Exception:
+            log.exception(f"Unable to collect the gauge \"{self.name}\"")
+            return
+        self.values = value if isinstance(value, dict) else {(): value}
+
+    def render(self) -> list[str]:
+        self.collect()
+        return super().render()
+
+    def snapshot(self) -> list[dict]:
+        self.collect()
+        return super().snapshot()
+
+
+class HistogramSeries:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * (buckets + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.values: dict[tuple, HistogramSeries] = {}
+
+    def observe(self, value: float, *label_values):
+        if (series := self.values.get(label_values)) is None:
+            series = self.values[label_values] = HistogramSeries(len(self.buckets))
+        series.counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.sum += value
+        series.count += 1
+
+    def quantile(self, series: HistogramSeries, fraction: float) -> [float, None]:
+        """An estimate of the quantile, the upper bound of the bucket it falls in, None if beyond the largest bucket"""
+        rank = fraction * series.count
+        seen = 0
+        for bound, count in zip(self.buckets, series.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def render(self) -> list[str]:
+        lines = []
+        for values, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series.counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, values, {'le': bound})} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, values)} {series.sum}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, values)} {series.count}")
+        return lines
+
+    def snapshot(self) -> list[dict]:
+        return [
+            {
+                "labels": dict(zip(self.labels, values)),
+                "count": series.count,
+                "sum": series.sum,
+                "p50": self.quantile(series, 0.50),
+                "p95": self.quantile(series, 0.95),
+                "p99": self.quantile(series, 0.99),
+            }
+            for values, series in self.values.items()
+        ]
+
+
+class Metrics:
+    # Set from the settings by `configure` when the tracker starts
+    host = MetricsSettings.host
+    port = MetricsSettings.port
+    snapshot_path = MetricsSettings.snapshot_path
+    snapshot_interval = MetricsSettings.snapshot_interval
+    # How often the event loop is checked for lag, a callback running late means something blocked the loop
+    loop_lag_interval = 0.25
+
+    registry: dict[str, [Counter, Gauge, Histogram]] = {}
+    started_at = time.time()
+    runner = None
+    tasks: list[asyncio.Task] = []
+
+    @classmethod
+    def configure(cls, settings: Settings):
+        cls.host = settings.metrics.host
+        cls.port = settings.metrics.port
+        cls.snapshot_path = settings.metrics.snapshot_path
+        cls.snapshot_interval = settings.metrics.snapshot_interval
+
+    @classmethod
+    def counter(cls, name: str, description: str, labels: tuple = ()) -> Counter:
+        return cls.registry.setdefault(name, Counter(name, description, labels))
+
+    @classmethod
+    def histogram(cls, name: str, description: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return cls.registry.setdefault(name, Histogram(name, description, labels, buckets))
+
+    @classmethod
+    def gauge(cls, name: str, description: str, function: Callable, labels: tuple = ()) -> Gauge:
+        return cls.registry.setdefault(name, Gauge(name, description, function, labels))
+
+    @classmethod
+    def render(cls) -> str:
+        """The metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in cls.registry.values():
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        return {
+            "timestamp": time.time(),
+            "uptime": time.time() - cls.started_at,
+            "metrics": {name: metric.snapshot() for name, metric in cls.registry.items()},
+        }
+
+    @classmethod
+    def write_snapshot(cls):
+        path = Path(cls.snapshot_path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(json.dumps(cls.snapshot(), indent=2))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    async def _write_snapshots(cls):
+        while True:
+            await asyncio.sleep(cls.snapshot_interval)
+            try:
+                cls.write_snapshot()
+            except OSError as error:
+                log.warning(f"Unable to write the metrics snapshot to \"{cls.snapshot_path}\": {error}")
+
+    @classmethod
+    async def _watch_loop_lag(cls):
+        lag = cls.histogram("tracker_event_loop_lag_seconds", "How late the event loop ran a scheduled callback")
+        while True:
+            scheduled = time.perf_counter()
+            await asyncio.sleep(cls.loop_lag_interval)
+            lag.observe(max(time.perf_counter() - scheduled - cls.loop_lag_interval, 0))
+
+    @classmethod
+    async def start(cls):
+        """Starts watching the event loop, and serving or snapshotting the metrics if configured to"""
+        if cls.tasks:
+            return
+        cls.tasks.append(asyncio.create_task(cls._watch_loop_lag()))
+        if cls.snapshot_path:
+            cls.tasks.append(asyncio.create_task(cls._write_snapshots()))
+            log.info(f"Writing metrics snapshots to \"{cls.snapshot_path}\" every {cls.snapshot_interval} seconds")
+        if cls.port:
+            from aiohttp import web
+
+            async def metrics(request: web.Request) -> web.Response:
+                return web.Response(text=cls.render(), content_type="text/plain", charset="utf-8",
+                                    headers={"X-Content-Type-Options": "nosniff"})
+
+            async def metrics_json(request: web.Request) -> web.Response:
+                return web.json_response(cls.snapshot())
+
+            app = web.Application()
+            app.router.add_get("/metrics", metrics)
+            app.router.add_get("/metrics.json", metrics_json)
+            cls.runner = web.AppRunner(app, access_log=None)
+            await cls.runner.setup()
+            try:
+                await web.TCPSite(cls.runner, cls.host, cls.port).start()
+                log.info(f"Serving metrics on http://{cls.host}:{cls.port}/metrics")
+            except OSError as error:
+                log.error(f"Unable to serve metrics on {cls.host}:{cls.port}: {error}")
+
+    @classmethod
+    async def stop(cls):
+        for task in cls.tasks:
+            task.cancel()
+        await asyncio.gather(*cls.tasks, return_exceptions=True)
+        cls.tasks = []
+        if cls.runner:
+            await cls.runner.cleanup()
+            cls.runner = None
+        if cls.snapshot_path:
+            try:
+                cls.write_snapshot()
+            except OSError as error:
+                log.warning(f"Unable to write the metrics snapshot to \"{cls.snapshot_path}\": {error}")
+
+
+on_configure(Metrics.configure)
+
+__all__ = [
+    "Metrics"
+]
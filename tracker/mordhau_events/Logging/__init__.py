@@ -1,8 +1,10 @@
 import logging
 
+from tracker import Base
 from tracker import rcon_command
+from tracker.ingest import droppable
 
-from avents import Event
+from tracker.mordhau_events import MordhauEvent
 from tracker.mordhau_events import MordhauListener
 from tracker.mordhau_events import MordhauType
 
@@ -14,8 +16,12 @@ class LogEvents:
 
     @staticmethod
     @MordhauListener.listen(*[mord_type for mord_type in MordhauType])
-    async def log_event(event: Event):
-        log.info(f"\"{event.name.strip()}\": \"{event.content.strip()}\"")
+    @droppable("log_event")
+    async def log_event(event: MordhauEvent):
+        if log.isEnabledFor(logging.INFO):
+            # The server is only named when there are several to tell apart
+            server = f"[{event.server}] " if len(Base.servers) > 1 else ""
+            log.info(f"{server}\"{event.name}\": \"{event.content}\"")
 
 __all__ = [
     "LogEvents"
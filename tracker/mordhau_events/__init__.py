@@ -1,8 +1,16 @@
+import re
+import time
+from dataclasses import dataclass
+
 from avents import EventListener
 from avents import listen
 from avents import Event
 from avents import BaseEventType
 
+from tracker import Base
+from tracker.metrics import Metrics
+from tracker.mordhau_events import records
+
 
 class MordhauListener(EventListener):
     ...
@@ -17,12 +25,56 @@ class MordhauType(BaseEventType):
     CHAT: str = "Chat:"
 
 
+@dataclass
+class MordhauEvent(Event):
+    """
+    An event carrying the typed record its content was parsed into, None if the content didn't match its format, and
+    the id of the server it came from
+    """
+    record: object = None
+    server: str = None
+
+
+# Each line is parsed into its record once at ingest, listeners read the record instead of re-parsing the content
+RECORD_PARSERS = {
+    str(MordhauType.LOGIN): records.parse_login,
+    str(MordhauType.PUNISHMENT): records.parse_punishment,
+    str(MordhauType.MATCH_STATE): records.parse_match_state,
+    str(MordhauType.SCORE_FEED): records.parse_scorefeed,
+    str(MordhauType.KILL_FEED): records.parse_killfeed,
+    str(MordhauType.CHAT): records.parse_chat,
+}
+
+# A single alternation of every `Xxx:` tag, compiled once so each line is classified in one scan
+MORDHAU_TAGS = re.compile("|".join(re.escape(str(mord_type)) for mord_type in MordhauType))
+
+
+events_received = Metrics.counter("tracker_events_total", "Mordhau events received, by server and type",
+                                  ("server", "type"))
+event_dispatch_time = Metrics.histogram("tracker_event_dispatch_seconds",
+                                        "Time taken for every listener to handle a Mordhau event, by type", ("type",))
+
+
+def classify(line: str) -> [tuple[str, str], None]:
+    """
+    Returns the MordhauType tag of the line and the content that follows it, or None if the line has no known tag.
+    The first tag in the line wins, so a chat message that happens to contain another tag stays a chat message.
+    """
+    if not (match := MORDHAU_TAGS.search(line)):
+        return None
+    return match.group(), line[match.end():].strip()
+
+
 @listen("RCON")
 async def mordhau_event_parser(event: Event):
-    for mord_type in MordhauType:
-        mord_type = str(mord_type)
-        if mord_type in event.content:
-            split_content = event.content.split(mord_type)
-            for rcon_content in split_content:
-                if rcon_content:
-                    await MordhauListener.parse(Event(str(mord_type), rcon_content.strip()))
+    server = Base.server().id
+    if not (classified := classify(event.content)):
+        events_received.inc(server, "Unclassified")
+        return
+    mord_type, content = classified
+    label = mord_type[:-1]
+    events_received.inc(server, label)
+    if content:
+        received_at = time.perf_counter()
+        await MordhauListener.parse(MordhauEvent(mord_type, content, RECORD_PARSERS[mord_type](content), server))
+        event_dispatch_time.observe(time.perf_counter() - received_at, label)
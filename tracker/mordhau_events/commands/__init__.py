@@ -1,4 +1,3 @@
-import os
 import logging
 
 from dataclasses import dataclass
@@ -6,11 +5,19 @@ from dataclasses import dataclass
 from avents import BaseEventType
 from avents import Event
 
+from tracker.metrics import Metrics
 from tracker.mordhau_events import MordhauType
+from tracker.mordhau_events import MordhauEvent
 from tracker.mordhau_events import MordhauListener
+from tracker.mordhau_events.records import Chat
+from tracker.settings import MatchSettings
+from tracker.settings import Settings
+from tracker.settings import on_configure
 
 log = logging.getLogger(__name__)
 
+commands_received = Metrics.counter("tracker_commands_total", "Chat commands received, by command", ("command",))
+
 
 class CommandEventType(BaseEventType):
     REGISTER: str = "register"
@@ -23,6 +30,21 @@ class CommandEventType(BaseEventType):
     MATCH_HELP: str = "match help"
 
 
+# Commands keyed by their casefolded words, a chat message is resolved by looking up its longest leading word sequence
+COMMAND_LOOKUP: dict[tuple[str, ...], CommandEventType] = {
+    tuple(str(command_event).casefold().split(" ")): command_event for command_event in CommandEventType
+}
+MAX_COMMAND_WORDS = max(len(words) for words in COMMAND_LOOKUP)
+
+
+def resolve_command(words: list[str]) -> [CommandEventType, None]:
+    """Returns the command the words of a message (without its prefix) invoke, None if it isn't a known command"""
+    for word_count in range(min(len(words), MAX_COMMAND_WORDS), 0, -1):
+        if command_event := COMMAND_LOOKUP.get(tuple(word.casefold() for word in words[:word_count])):
+            return command_event
+    return None
+
+
 class CommandListener(MordhauListener):
     ...
 
@@ -31,41 +53,43 @@ class CommandListener(MordhauListener):
 class CommandEvent(Event):
     playfab_id: str
     player_name: str
+    server: str = None
 
 
 class ChatCommandHandler:
-    prefix = os.getenv("CHAT_PREFIX", default="-")
-    log.info(f"Chat prefix is set to \"{prefix}\"")
+    # Set from the settings by `configure` when the tracker starts
+    prefix = MatchSettings.chat_prefix
+
+    @classmethod
+    def configure(cls, settings: Settings):
+        cls.prefix = settings.match.chat_prefix
+        log.info(f"Chat prefix is set to \"{cls.prefix}\"")
 
     @staticmethod
     @MordhauListener.listen(MordhauType.CHAT)
-    async def base_chat_handler(event: Event):
-        split_event = event.content.split(",")
-        if len(split_event) < 3:
+    async def base_chat_handler(event: MordhauEvent):
+        chat: Chat = event.record
+        if not chat:
             return
 
-        playfab_id = split_event[0]
-        player_name = split_event[1]
-        message = ") ".join(split_event[2].split(") ")[1:]) + "," + ",".join(split_event[3:])
-        if message[0] != ChatCommandHandler.prefix:
+        message = chat.message
+        if not message.startswith(ChatCommandHandler.prefix):
             return
 
-        command_content = []
-        command_name = ""
-
-        for command_event in CommandEventType: # Ensure that the command passed is actually a KNOWN command
-            command_event = str(command_event)
-            if command_event in message.casefold():
-                command_name = command_event
-                command_message = message[1:]
-                command_message.replace(command_event, "")
-                command_content = command_message.split(" ")
+        command_content = message[len(ChatCommandHandler.prefix):].split(" ")
+        if not (command_event := resolve_command(command_content)):  # Ensure that the command is a KNOWN command
+            return
 
         command = CommandEvent(
-            command_name,
+            str(command_event),
             command_content,
-            playfab_id.strip(),
-            player_name.strip(),
+            chat.playfab_id,
+            chat.name.strip(),
+            event.server,
         )
         log.info(f"Command attempt made: {command}")
+        commands_received.inc(command.name)
         await CommandListener.parse(command)
+
+
+on_configure(ChatCommandHandler.configure)
@@ -1,10 +1,19 @@
+import asyncio
 import logging
 from dataclasses import dataclass
 
 from tracker import Base
+from tracker.cache import TTLCache
+from tracker.settings import APISettings
+from tracker.settings import PlayerSettings
+from tracker.settings import Settings
+from tracker.settings import TeamSettings
+from tracker.settings import on_configure
 
 from tracker.apirequest import APIRequest
 from tracker.apirequest import APIError
+from tracker.outbox import Outbox
+from tracker.outbox import UnresolvedReference
 
 from tracker.mordhau_events.commands import CommandListener
 from tracker.mordhau_events.commands import CommandEvent
@@ -26,35 +35,188 @@ class Player:
     assists: int
     deaths: int
 
+    # A player's API id never changes once they are registered, so the mapping is cached, and persisted across
+    # restarts once `configure` gives the cache its path
+    id_cache = TTLCache(ttl=PlayerSettings.cache_ttl, max_size=PlayerSettings.cache_size)
+    # Players are looked up or registered when they log in, so round ends find their ids in the id cache
+    prefetch_enabled = PlayerSettings.prefetch
+    prefetch_concurrency = PlayerSettings.prefetch_concurrency
+    # Playfab id -> the task looking them up, so a player is only looked up once however often they log in
+    prefetching = {}
+    _prefetch_limit = None
+
+    @classmethod
+    def configure(cls, settings: Settings):
+        cls.id_cache = TTLCache(ttl=settings.player.cache_ttl, max_size=settings.player.cache_size,
+                                path=settings.player.cache_path)
+        cls.prefetch_enabled = settings.player.prefetch
+        cls.prefetch_concurrency = settings.player.prefetch_concurrency
+
     async def get_api_id(self):
+        """Sets the player's API id, from the id cache if possible, otherwise from the API"""
+        if (player_id := Player.id_cache.get(self.playfab_id)) is not None:
+            self.player_id = player_id
+            return
+        await self._fetch_api_id()
+
+    async def _fetch_api_id(self):
         api_player = await APIRequest.get(f"/player/playfab-id?playfab_id={self.playfab_id}")
 
         if api_player.status != 200:
             # This registers a player with the API in the scenario we were unable to get them
             register_event = CommandEvent("register", None, self.playfab_id, self.name)
             await CommandListener.parse(register_event)
-        api_player = await APIRequest.get(f"/player/playfab-id?playfab_id={self.playfab_id}")
+            api_player = await APIRequest.get(f"/player/playfab-id?playfab_id={self.playfab_id}")
         if api_player.status != 200:
             # In the scenario we were unable to find them after registration we log the event and notify the match
-            await Base.connection(f"Say something has gone wrong, was unable to find player {self.name}, "
-                                  f"but they should already be registered!")
+            Player.id_cache.invalidate(self.playfab_id)
+            await Base.rcon_command(f"say Something has gone wrong, was unable to find player {self.name}, "
+                                    f"but they should already be registered!")
             log.error(f"Was unable to find player \"{self.name}\", playfab: \"{self.playfab_id}\" when they "
                       f"should've already been registered")
             return
         self.player_id = api_player.json["id"]
+        Player.id_cache.set(self.playfab_id, self.player_id)
+
+    @classmethod
+    def prefetch(cls, playfab_id: str, name: str):
+        """Looks up or registers a player in the background, unless their id is cached or already being looked up"""
+        if not cls.prefetch_enabled or playfab_id in cls.prefetching or playfab_id in cls.id_cache:
+            return
+        if cls._prefetch_limit is None:
+            cls._prefetch_limit = asyncio.Semaphore(max(cls.prefetch_concurrency, 1))
+        task = cls.prefetching[playfab_id] = asyncio.create_task(cls._prefetch(playfab_id, name))
+        task.add_done_callback(lambda _: cls.prefetching.pop(playfab_id, None))
+
+    @classmethod
+    async def _prefetch(cls, playfab_id: str, name: str):
+        try:
+            async with cls._prefetch_limit:
+                await cls(playfab_id, None, None, None, -1, name, 0, 0, 0, 0)._fetch_api_id()
+        except Exception:
+            log.exception(f"Unable to prefetch the API id of \"{name}\", playfab: \"{playfab_id}\"")
+        finally:
+            if len(cls.prefetching) <= 1:  # This is the last one, the cache is saved once they're all done
+                cls.id_cache.save()
+
+    @classmethod
+    async def stop_prefetching(cls):
+        prefetches = list(cls.prefetching.values())
+        for prefetch in prefetches:
+            prefetch.cancel()
+        await asyncio.gather(*prefetches, return_exceptions=True)
+        cls.id_cache.save()
+
+    @classmethod
+    async def resolve_api_ids(cls, players: list["Player"], limit: int = 8):
+        """
+        Sets the API id of every given player. Cached ids are used directly and the misses are looked up
+        concurrently, at most `limit` at a time and one lookup per playfab id, before the cache is saved to disk.
+        """
+        misses: dict[str, list[Player]] = {}
+        for player in players:
+            if (player_id := cls.id_cache.get(player.playfab_id)) is not None:
+                player.player_id = player_id
+            else:
+                misses.setdefault(player.playfab_id, []).append(player)
+
+        async def fetch(player: Player):
+            if (prefetch := cls.prefetching.get(player.playfab_id)) is not None:
+                await asyncio.shield(prefetch)  # They logged in moments ago, wait on that lookup rather than repeat it
+                if (player_id := cls.id_cache.get(player.playfab_id)) is not None:
+                    player.player_id = player_id
+                    return
+            await player._fetch_api_id()
+
+        # At most `limit` workers take the misses in turn, rather than a task per miss
+        pending = iter(misses.values())
+
+        async def worker():
+            for first, *_ in pending:
+                await fetch(first)
+
+        await asyncio.gather(*(worker() for _ in range(min(max(limit, 1), len(misses)))))
+        for first, *duplicates in misses.values():
+            for player in duplicates:
+                player.player_id = first.player_id
+
+        cls.id_cache.save()
+        log.debug(f"Resolved API ids for {len(players)} players, {len(misses)} were looked up, "
+                  f"id cache stats: {cls.id_cache.stats()}")
 
 
 class Team:
+    # Team ids by their casefolded name, so match setups against the same teams don't wait on the API
+    index = TTLCache(ttl=TeamSettings.cache_ttl, max_size=TeamSettings.cache_size)
+    # Every team is fetched from list_endpoint at startup and every refresh_interval seconds, 0 turns it off. The
+    # upstream API has no such endpoint, it's only used when one is configured
+    list_endpoint = TeamSettings.list_endpoint
+    refresh_interval = TeamSettings.refresh_interval
+
+    refresher: [asyncio.Task, None] = None
 
     def __init__(self, team_id, name):
         self.id = team_id
         self.name = name
 
-    @staticmethod
-    async def get_team_by_name(team_name):
+    @classmethod
+    def configure(cls, settings: Settings):
+        cls.index = TTLCache(ttl=settings.team.cache_ttl, max_size=settings.team.cache_size)
+        cls.list_endpoint = settings.team.list_endpoint
+        cls.refresh_interval = settings.team.refresh_interval
+
+    @classmethod
+    async def get_team_by_name(cls, team_name: str) -> APIRequest.Response:
+        """The API's response for the team, from the team index if it has been looked up before"""
+        if (team_id := cls.index.get(team_name.casefold())) is not None:
+            return APIRequest.Response({"id": team_id, "team_name": team_name}, 200)
         team_data = await APIRequest.get(f"/team/name?team_name={team_name}")
+        if team_data.status == 200:
+            cls.index.set(team_name.casefold(), team_data.json["id"])
         return team_data
 
+    @classmethod
+    async def prefetch(cls) -> bool:
+        """Fills the team index with every team in one request, returns False if the API doesn't list them"""
+        teams = await APIRequest.get(cls.list_endpoint)
+        if teams.status != 200 or not isinstance(teams.json, list):
+            log.info(f"Unable to list the teams from \"{cls.list_endpoint}\", status: {teams.status}. Teams are "
+                     f"looked up by name as they're needed.")
+            return False
+        skipped = 0
+        for team in teams.json:
+            if not isinstance(team, dict) or not isinstance(team.get("team_name"), str) or team.get("id") is None:
+                skipped += 1
+                continue
+            cls.index.set(team["team_name"].casefold(), team["id"])
+        if skipped:
+            log.warning(f"Skipped {skipped} teams listed by \"{cls.list_endpoint}\" without a team_name or id")
+        log.debug(f"Prefetched {len(teams.json) - skipped} teams, team index stats: {cls.index.stats()}")
+        return True
+
+    @classmethod
+    async def _refresh(cls):
+        """Prefetches the teams every refresh_interval seconds, a listing that fails is tried again on the next one"""
+        while True:
+            try:
+                await cls.prefetch()
+            except Exception:
+                log.exception(f"Unable to prefetch the teams from \"{cls.list_endpoint}\"")
+            await asyncio.sleep(cls.refresh_interval)
+
+    @classmethod
+    def start(cls):
+        """Prefetches the teams, and keeps them refreshed in the background"""
+        if cls.list_endpoint and cls.refresh_interval > 0 and not cls.refresher:
+            cls.refresher = asyncio.create_task(cls._refresh())
+
+    @classmethod
+    async def stop(cls):
+        if cls.refresher:
+            cls.refresher.cancel()
+            await asyncio.gather(cls.refresher, return_exceptions=True)
+            cls.refresher = None
+
 
 class Match:
 
@@ -89,22 +251,29 @@ class Set:
         self.id = None
 
     async def ainit(self):
-        new_set = await APIRequest.post(
+        """Queues the set's creation on the API, its id is a reference filled in once the outbox delivers it"""
+        key = Outbox.enqueue(
             "/set/create-set",
             data={
                 "map": self.map,
                 "match_id": self.match.id
             }
         )
-        if new_set.status != 200:
-            log.error(f"Unable to create a new set, status: \"{new_set.status}\", content: \"{new_set.json}\"")
-            raise APIError(new_set.status, new_set.json)
+        self.id = Outbox.ref(key, "extra", 0, "set_id")
 
-        self.api_data = new_set.json
-        self.id = self.api_data["extra"][0]["set_id"]
+    def saved(self) -> bool:
+        """Whether the API created the set, so its id is known"""
+        try:
+            Outbox.resolve(self.id)
+        except UnresolvedReference:
+            return False
+        return True
 
 
 class Round:
+    # "combined" queues each round with its players as one write, consecutive rounds are delivered in batches. Rounds
+    # that end before the API created their set are submitted separately
+    submission = APISettings.round_submission
 
     def __init__(self, set: Set):
         self.set = set
@@ -113,8 +282,13 @@ class Round:
         self.api_data = None
         self.id = None
 
+    @classmethod
+    def configure(cls, settings: Settings):
+        cls.submission = settings.api.round_submission
+
     async def create(self, team1_win: bool, team2_win: bool):
-        new_round = await APIRequest.post(
+        """Queues the round's creation on the API, its id is a reference filled in once the outbox delivers it"""
+        key = Outbox.enqueue(
             f"/round/create-round",
             data={
                 "set_id": self.set.id,
@@ -122,8 +296,29 @@ class Round:
                 "team2_win": team2_win
             }
         )
-        if new_round.status != 200:
-            log.error(f"Unable to create a new round, status: \"{new_round.status}\", content: \"{new_round.json}\"")
-            raise APIError(new_round.status, new_round.json)
-        self.api_data = new_round.json
-        self.id = self.api_data["extra"][0]["round_id"]
+        self.id = Outbox.ref(key, "extra", 0, "round_id")
+
+    def submit(self, team1_win: bool, team2_win: bool, players: list[Player], on_done=None):
+        """
+        Queues the round's creation together with its players, who are created for it so they have no round id. The
+        set must be saved, see `Set.saved`
+        """
+        Outbox.enqueue(
+            "/round/create-round-with-players",
+            data={
+                "set_id": Outbox.resolve(self.set.id),
+                "team1_win": team1_win,
+                "team2_win": team2_win,
+                "round_players": [
+                    {field: value for field, value in vars(player).items() if field != "round_id"}
+                    for player in players
+                ]
+            },
+            on_done=on_done
+        )
+
+
+Outbox.batch("/round/create-round-with-players", "/round/create-rounds", "rounds")
+on_configure(Player.configure)
+on_configure(Team.configure)
+on_configure(Round.configure)
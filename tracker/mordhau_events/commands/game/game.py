@@ -1,52 +1,96 @@
-import copy
 import logging
-import os
 import asyncio
-import re
+import time
 
 from tracker.mordhau_events import MordhauType
+from tracker.mordhau_events import MordhauEvent
+from tracker.mordhau_events.records import Killfeed
+from tracker.mordhau_events.records import Login
+from tracker.mordhau_events.records import Scorefeed
 
 from tracker.mordhau_events import MordhauListener
+from tracker.server import Server
 
 from tracker.mordhau_events.commands import CommandEventType
 from tracker.mordhau_events.commands import CommandListener
 from tracker.mordhau_events.commands import CommandEvent
 
+from tracker import Base
 from tracker import rcon_command
-from tracker.apirequest import APIRequest
+from tracker.metrics import Metrics
+from tracker.outbox import Outbox
+from tracker.settings import MatchSettings
+from tracker.settings import Settings
+from tracker.settings import on_configure
 
 from tracker.mordhau_events.commands.game import Match
 from tracker.mordhau_events.commands.game import Set
 from tracker.mordhau_events.commands.game import Round
 from tracker.mordhau_events.commands.game import Player
 from tracker.mordhau_events.commands.game import Team
+from tracker.mordhau_events.commands.game.stats import LiveStats
+from tracker.mordhau_events.commands.game.stats import ScoreboardRow
+from tracker.mordhau_events.commands.game.stats import SetSnapshot
+from tracker.mordhau_events.commands.game.stats import parse_scoreboard
+from tracker.mordhau_events.server_state import ServerState
 
 log = logging.getLogger(__name__)
 
+round_end_time = Metrics.histogram("tracker_round_end_seconds", "Time taken to process a round end, by stage",
+                                   ("stage",))
+round_end_sources = Metrics.counter("tracker_round_end_stats_total",
+                                    "Round ends processed, by where the player stats came from", ("source",))
+
 
 class Game:
-    admins = os.getenv("MATCH_ADMINS", default=None)
-    if not admins:
-        log.warning(f"There are no admins (MATCH_ADMINS) set in the environment. It should be a comma delimited list "
-                    f"of playfab ids.")
-        admins = []
-    else:
-        admins = admins.split(",")
-
-    valid_maps = os.getenv("MATCH_VALID_MAPS", default=None)
-    if not valid_maps:
-        log.warning(f"There are no valid maps (MATCH_VALID_MAPS) set in the environment. It should be a comma "
-                    f"delimited list of Mordhau map names, e.g. skm_moshpit, ...")
-        valid_maps = []
-    else:
-        valid_maps = valid_maps.split(",")
-
-    match: [Match, None] = None
-    current_set: [Set, None] = None
-    current_round: [Round, None] = None
-    map_queue: list[str] = []
-    recording: bool = False
-    players: dict[str, Player] = {}
+    # Set from the settings by `configure` when the tracker starts
+    admins = list(MatchSettings.admins)
+    # Casefolded map name -> the name as configured, maps are matched case insensitively
+    valid_maps = {}
+    round_end_concurrency = MatchSettings.round_end_concurrency
+    # Their teams and assists are only as fresh as the last scoreboard read, so the live stats are opt in
+    live_stats = MatchSettings.live_stats
+    reconcile_interval = MatchSettings.reconcile_interval
+
+    # The game on each server, by server id
+    games: dict[str, "Game"] = {}
+
+    def __init__(self, server: Server):
+        self.server = server
+        self.match: [Match, None] = None
+        self.current_set: [Set, None] = None
+        self.current_round: [Round, None] = None
+        self.map_queue: list[str] = []
+        self.recording: bool = False
+        self.snapshot = SetSnapshot()  # Everyone's stats at the end of the last round of the set
+        self.stats = LiveStats()
+        self.reconciler: [asyncio.Task, None] = None
+        self.map_change: [asyncio.Task, None] = None
+
+    @classmethod
+    def configure(cls, settings: Settings):
+        cls.admins = list(settings.match.admins)
+        if not cls.admins:
+            log.warning(f"There are no admins (MATCH_ADMINS) set in the environment. It should be a comma delimited "
+                        f"list of playfab ids.")
+        cls.valid_maps = {map.casefold(): map for map in settings.match.valid_maps}
+        if not cls.valid_maps:
+            log.warning(f"There are no valid maps (MATCH_VALID_MAPS) set in the environment. It should be a comma "
+                        f"delimited list of Mordhau map names, e.g. skm_moshpit, ...")
+        cls.round_end_concurrency = settings.match.round_end_concurrency
+        cls.live_stats = settings.match.live_stats
+        cls.reconcile_interval = settings.match.reconcile_interval
+
+    @classmethod
+    def of(cls, server_id: [str, None]) -> "Game":
+        """The game on a server, the server being handled if no id is given"""
+        server = Base.servers[server_id] if server_id else Base.server()
+        if (game := cls.games.get(server.id)) is None:
+            game = cls.games[server.id] = cls(server)
+        return game
+
+    async def rcon_command(self, command: str) -> str:
+        return await self.server.rcon_command(command)
 
     @classmethod
     async def check_admin_perm(cls, playfab_id) -> bool:
@@ -81,13 +125,17 @@ class Game:
         for help_str in help_strs:
             await rcon_command(f"say {help_str}")
 
+    @classmethod
+    def valid_map(cls, map: str) -> [str, None]:
+        """The map as it's configured in MATCH_VALID_MAPS, or None if it isn't a valid map"""
+        return cls.valid_maps.get(map.strip().casefold())
+
     @staticmethod
     @CommandListener.listen(CommandEventType.MATCH_SETUP)
     async def _match_setup_hook(event: CommandEvent):
-        await Game.match_setup(event)
+        await Game.of(event.server).match_setup(event)
 
-    @classmethod
-    async def match_setup(cls, command: CommandEvent):
+    async def match_setup(self, command: CommandEvent):
         """
         Setups the match with relevant match data:
 
@@ -97,77 +145,76 @@ class Game:
         Where `20Racecar` is a team, `Big Cogs` is a team, and all that follows valid Mordhau maps defined in your
         .env by a comma delimited value
         """
-        if not await cls.check_admin_perm(command.playfab_id):
-            await rcon_command(f"say You are not permitted to run this command")
+        if not await Game.check_admin_perm(command.playfab_id):
+            await self.rcon_command(f"say You are not permitted to run this command")
             return
 
         example_message = f"say \nAn example would be:\n" \
                           f"- match start Vanquish, Racecar, skm_moshpit, skm_contraband, skm_antheum,..."
 
         if len(command.content) <= 2:  # if the len is less than or equal then no arguments have been supplied
-            await rcon_command(f"say \nThe parameter args for \"match start\" are:\n"
-                               f"    - team1 name\n"
-                               f"    - team2 name\n"
-                               f"    - *maps\n")
-            await rcon_command(example_message)
+            await self.rcon_command(f"say \nThe parameter args for \"match start\" are:\n"
+                                    f"    - team1 name\n"
+                                    f"    - team2 name\n"
+                                    f"    - *maps\n")
+            await self.rcon_command(example_message)
             return
 
         command_args = " ".join(command.content[2:])  # this removes the command and only takes in arguments
 
         if "," not in command_args:
-            await rcon_command(f"say Invalid usage!")
-            await rcon_command(example_message)
+            await self.rcon_command(f"say Invalid usage!")
+            await self.rcon_command(example_message)
             return
 
         split_args = [arg.strip() for arg in command_args.split(",")]
 
         if len(split_args) < 3:
-            await rcon_command(f"More args must be passed, only received: {', '.join(split_args)}")
-            await rcon_command(example_message)
+            await self.rcon_command(f"More args must be passed, only received: {', '.join(split_args)}")
+            await self.rcon_command(example_message)
             return
 
-        maps = split_args[2:]
-
-        for map in maps:
-            if map not in cls.valid_maps:
-                await rcon_command(f"The map {map} is not a valid map!")
+        maps = []
+        for map in split_args[2:]:
+            if (valid_map := self.valid_map(map)) is None:
+                await self.rcon_command(f"The map {map} is not a valid map!")
                 return
+            maps.append(valid_map)
 
-        cls.map_queue = maps
+        self.map_queue = maps
 
-        team1 = await Team.get_team_by_name(team_name=split_args[0])
+        team1, team2 = await asyncio.gather(Team.get_team_by_name(team_name=split_args[0]),
+                                            Team.get_team_by_name(team_name=split_args[1]))
 
         if team1.status == 404:
-            await rcon_command(f"say Could not find the team: {split_args[0]}")
+            await self.rcon_command(f"say Could not find the team: {split_args[0]}")
             return
 
         if team1.status != 200:
-            await rcon_command(f"say Unable to retrieve data from the API for {split_args[0]}")
+            await self.rcon_command(f"say Unable to retrieve data from the API for {split_args[0]}")
             return
 
-        team2 = await Team.get_team_by_name(team_name=split_args[1])
-
         if team2.status == 404:
-            await rcon_command(f"say Could not find the team: {split_args[1]}")
+            await self.rcon_command(f"say Could not find the team: {split_args[1]}")
             return
 
         if team2.status != 200:
-            await rcon_command(f"say Unable to retrive data from the API for {split_args[1]}")
+            await self.rcon_command(f"say Unable to retrive data from the API for {split_args[1]}")
             return
 
         team1 = Team(team1.json["id"], split_args[0])
         team2 = Team(team2.json["id"], split_args[1])
 
-        cls.match = Match(team1, team2)
-        await cls.match.ainit()
+        self.match = Match(team1, team2)
+        await self.match.ainit()
 
-        await rcon_command(f"say Setup the match with the following params:\n")
-        map_rotation_formatted = f"\n- ".join(cls.map_queue)
-        await rcon_command(f"say Params:\n"
-                           f"Red team: {team1.name}\n"
-                           f"Blue team: {team2.name}\n\n"
-                           f"Map rotation:\n"
-                           f"- {map_rotation_formatted}")
+        await self.rcon_command(f"say Setup the match with the following params:\n")
+        map_rotation_formatted = f"\n- ".join(self.map_queue)
+        await self.rcon_command(f"say Params:\n"
+                                f"Red team: {team1.name}\n"
+                                f"Blue team: {team2.name}\n\n"
+                                f"Map rotation:\n"
+                                f"- {map_rotation_formatted}")
 
     @staticmethod
     @CommandListener.listen(CommandEventType.MATCH_START)
@@ -176,10 +223,11 @@ class Game:
             await rcon_command(f"say You are not permitted to run this command")
             return
 
-        if Game.match is None:
+        game = Game.of(event.server)
+        if game.match is None:
             await rcon_command(f"say It appears that the match has not been setup. Please run `match setup`!")
             return
-        await Game.next_set()
+        await game.next_set()
 
     @staticmethod
     @CommandListener.listen(CommandEventType.MATCH_PAUSE)
@@ -190,8 +238,9 @@ class Game:
         if not await Game.check_admin_perm(event.playfab_id):
             await rcon_command(f"say You are not permitted to run this command")
             return
-        if Game.match:
-            Game.recording = False
+        game = Game.of(event.server)
+        if game.match:
+            game.recording = False
             await rcon_command(f"say Paused the match.")
         else:
             await rcon_command(f"say A match is not currently ongoing.")
@@ -200,13 +249,14 @@ class Game:
     @CommandListener.listen(CommandEventType.MATCH_RESUME)
     async def resume_match(event: CommandEvent):
         """
-        If the match is paused (Game.recording = False) then resume the match by listening to RCON output again.
+        If the match is paused (recording is False) then resume the match by listening to RCON output again.
         """
         if not await Game.check_admin_perm(event.playfab_id):
             await rcon_command(f"say You are not permitted to run this command")
             return
-        if Game.match:
-            Game.recording = True
+        game = Game.of(event.server)
+        if game.match:
+            game.recording = True
             await rcon_command(f"say Resumed the match.")
         else:
             await rcon_command(f"say A match is not currently ongoing.")
@@ -215,40 +265,63 @@ class Game:
     @CommandListener.listen(CommandEventType.MATCH_NEXT)
     async def match_next_command(event: CommandEvent):
         """
-        Change the map to the next level that is within the Game.map_queue list via the Game.next_set function
+        Change the map to the next level that is within the game's map_queue list via Game.next_set
         """
 
         if not await Game.check_admin_perm(event.playfab_id):
             await rcon_command(f"say You are not permitted to run this command")
             return
-        if not Game.match:
+        game = Game.of(event.server)
+        if not game.match:
             await rcon_command(f"say A match is not currently ongoing.")
             return
-        await Game.next_set()
+        await game.next_set()
 
-    @classmethod
-    async def next_set(cls):
+    async def next_set(self):
         """
-        Change the map to the next map if there is a map in the Game.map_queue, otherwise end the match.
+        Change the map to the next map if there is a map in the map_queue, otherwise end the match. The map is changed
+        in the background, see `change_map`.
         """
-        if len(cls.map_queue) > 0:
-            next_map = cls.map_queue.pop(0)
-            new_set = Set(cls.match, next_map)
+        if len(self.map_queue) > 0:
+            next_map = self.map_queue.pop(0)
+            new_set = Set(self.match, next_map)
             await new_set.ainit()
-            cls.current_set = new_set
+            self.current_set = new_set
             new_round = Round(new_set)
-            cls.current_round = new_round
-            cls.players = {}
-            await rcon_command(f"say API EVENT: Moving to next map {next_map}")
+            self.current_round = new_round
+            self.snapshot.reset()
+            self.recording = False  # Nothing is recorded for the new set until the server is on its map
+            self.stop_changing_map()
+            self.map_change = asyncio.create_task(self.change_map(next_map))
+        else:
+            await self.end_match()
+
+    async def change_map(self, next_map: str):
+        """
+        Announces the next map, changes to it and starts recording, then shows the teams once players have loaded in.
+        This runs in a task of its own, the waits would otherwise hold up every ordered event from the server.
+        """
+        try:
+            await self.rcon_command(f"say API EVENT: Moving to next map {next_map}")
             await asyncio.sleep(3)
-            await rcon_command(f"changelevel {next_map}")
-            cls.recording = True
+            ServerState.of(self.server.id).changing_level(next_map)
+            await self.rcon_command(f"changelevel {next_map}")
+            self.stats.reset()  # The scoreboard starts over on the new map
+            self.start_reconciling()
+            self.recording = True
             await asyncio.sleep(15)
-            await rcon_command(f"say Teams:\n"
-                               f"Red: {cls.match.team1.name}, score: {cls.match.team1_score}\n"
-                               f"Blue: {cls.match.team2.name}, score:  {cls.match.team2_score}")
-        else:
-            await cls.end_match()
+            await self.rcon_command(f"say Teams:\n"
+                                    f"Red: {self.match.team1.name}, score: {self.match.team1_score}\n"
+                                    f"Blue: {self.match.team2.name}, score:  {self.match.team2_score}")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception(f"Unable to change \"{self.server.id}\" to the map {next_map}")
+
+    def stop_changing_map(self):
+        if self.map_change:
+            self.map_change.cancel()
+            self.map_change = None
 
     @staticmethod
     @CommandListener.listen(CommandEventType.MATCH_END)
@@ -259,36 +332,113 @@ class Game:
         if not await Game.check_admin_perm(event.playfab_id):
             await rcon_command(f"say You are not permitted to run this command")
             return
-        await Game.end_match()
+        await Game.of(event.server).end_match()
 
-    @classmethod
-    async def end_match(cls):
+    async def end_match(self):
         """
         End the match and calculate the match's ELO result on the API
         """
-        if cls.match:
-            response = await APIRequest.post(f"/match/calculate-match-elo?match_id={cls.match.id}")
-            if response.status != 200:
-                await rcon_command(f"say Could not calculate elo, response status: {response.status}. Keeping match "
-                                   f"alive and pausing it.")
-                log.error(f"Could not calculate elo, response status: {response.status}")
-                cls.recording = False
-                return
-            cls.match = None
-            cls.map_queue = []
-            cls.current_set = None
-            cls.current_round = None
-            cls.recording = False
-            await rcon_command(f"say Match ended")
+        if self.match:
+            match_id = self.match.id
+
+            async def calculated(delivered: bool):
+                if not delivered:
+                    log.error(f"Could not calculate the ELO of match {match_id}")
+                    await self.rcon_command(f"say Could not calculate the ELO of the last match, please contact an "
+                                            f"admin!")
+
+            Outbox.enqueue(f"/match/calculate-match-elo?match_id={match_id}", on_done=calculated)
+            self.match = None
+            self.map_queue = []
+            self.current_set = None
+            self.current_round = None
+            self.recording = False
+            self.stop_reconciling()
+            self.stop_changing_map()
+            await self.rcon_command(f"say Match ended")
             return
 
+    async def scoreboard(self) -> list[ScoreboardRow]:
+        """Reads the scoreboard, and reconciles the live stats with it"""
+        counted = self.stats.counted()
+        rows = parse_scoreboard(await self.rcon_command("scoreboard"))
+        if self.live_stats:
+            self.stats.reconcile(rows, counted)
+        return rows
+
+    def start_reconciling(self):
+        self.stop_reconciling()
+        if self.live_stats and self.reconcile_interval > 0:
+            self.reconciler = asyncio.create_task(self._reconcile())
+
+    def stop_reconciling(self):
+        if self.reconciler:
+            self.reconciler.cancel()
+            self.reconciler = None
+
+    async def _reconcile(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            if not self.recording:
+                continue
+            try:
+                await self.scoreboard()
+            except Exception:
+                log.exception(f"Unable to reconcile the live stats of \"{self.server.id}\" with its scoreboard")
+
+    async def round_players(self) -> list[Player]:
+        """
+        Returns a Player for everyone on a team, with their stats for the round that ended and their API ids resolved.
+        The live stats are used once every player's team is known, otherwise the scoreboard is read. The stats for the
+        set so far are kept as the snapshot the next round's are worked out from. At most
+        Game.round_end_concurrency players are looked up or registered with the API at once.
+        """
+        if self.live_stats and self.stats.ready():
+            source, rows = "live", self.stats.rows()
+        else:
+            source, rows = "scoreboard", await self.scoreboard()  # Finds the new scoreboard of players
+        round_end_sources.inc(source)
+        log.debug(f"Round end processing of the following players from the {source} stats: {rows}")
+        rows = [row for row in rows if row.team >= 0]  # If their team number is less than 0 then they are a spectator
+
+        # Only capture how many kills, deaths, etc. they got THIS round, rather than all of their SET data cumulatively
+        round_id, team1_id, team2_id = self.current_round.id, self.match.team1.id, self.match.team2.id
+        players = [
+            Player(row.playfab_id, None, team1_id if row.team == 0 else team2_id, round_id, row.team, row.name, score,
+                   kills, assists, deaths)
+            for row, (score, kills, assists, deaths) in zip(rows, self.snapshot.advance(rows))
+        ]
+
+        # Find their API ids, cached or in bulk, and if not register them
+        await Player.resolve_api_ids(players, limit=self.round_end_concurrency)
+        return players
+
+    @staticmethod
+    @MordhauListener.listen(MordhauType.KILL_FEED)
+    async def _killfeed_hook(event: MordhauEvent):
+        kill: Killfeed = event.record
+        if kill:
+            Game.of(event.server).stats.record_kill(kill)
+
+    @staticmethod
+    @MordhauListener.listen(MordhauType.LOGIN)
+    async def _login_hook(event: MordhauEvent):
+        login: Login = event.record
+        if login:
+            Game.of(event.server).stats.record_login(login)
+            if login.logged_in:
+                Player.prefetch(login.playfab_id, login.name)
+
     @staticmethod
     @MordhauListener.listen(MordhauType.SCORE_FEED)
-    async def _round_end_hook(event: CommandEvent):
-        await Game.process_round_end(event)
+    async def _round_end_hook(event: MordhauEvent):
+        score: Scorefeed = event.record
+        if score and score.playfab_id:  # A player's score changed, not a team's
+            Game.of(event.server).stats.record_score(score)
+            return
+        await Game.of(event.server).process_round_end(event)
 
-    @classmethod
-    async def process_round_end(cls, event: CommandEvent):
+    async def process_round_end(self, event: MordhauEvent):
         """
         Process a round end event from RCON, specifically looking for a team score increase. The full event looks like:
 
@@ -296,94 +446,69 @@ class Game:
         Event(name='Scorefeed:', content="2021.05.01-02.25.29: Team 0's is now 7.0 points from 6.0 points")
         ```
 
-        where we are parsing the content after the timestamp colon.
+        which arrives already parsed into a Scorefeed record.
 
         This is done to gather new scores for each player after a round has concluded.
         """
-        if not cls.recording:
-            return
-        search = re.findall(".\d+", event.content.split(":")[-1].strip())
-        try:
-            team_num = int(search[0].strip())
-            if team_num < 0:
-                return
-            team_initial_score = int(search[1].strip())
-            team_new_score = int(search[3].strip())
-        except IndexError:
+        received_at = time.perf_counter()
+        if not self.recording:
             return
-        except ValueError:
+        score: Scorefeed = event.record
+        if not score or score.team is None or score.team < 0:
             return
-        if team_initial_score == team_new_score:  # Ensure that the score increased, otherwise a round didn't end
-            log.debug(f"Ignored round end, scores were the same, initial score: \"{team_initial_score}\","
-                      f" new score: \"{team_new_score}\"")
+        team_num = score.team
+        if score.old_score == score.new_score:  # Ensure that the score increased, otherwise a round didn't end
+            log.debug(f"Ignored round end, scores were the same, initial score: \"{score.old_score}\","
+                      f" new score: \"{score.new_score}\"")
             return
-        current_map = (await rcon_command("info")).casefold().strip().split("map: ")[-1]
-        if current_map.replace(" ", "_") not in cls.current_set.map.strip().casefold():
-            await rcon_command(f"say Attempted to gather data for the last round, but it was not on the correct map. "
-                               f"The expected map that data is being gathered for is {cls.current_set.map}!")
+        server_state = ServerState.of(self.server.id)
+        if (on_map := server_state.on_map(self.current_set.map)) is None:  # The map changed, and not by the tracker
+            await server_state.refresh()
+            on_map = server_state.on_map(self.current_set.map)
+        if not on_map:
+            await self.rcon_command(f"say Attempted to gather data for the last round, but it was not on the correct "
+                                    f"map. The expected map that data is being gathered for is {self.current_set.map}!")
             return
-        log.info(f"Round End processing for data: {event}, parsed into {[_.strip() for _ in search]}")
+        log.info(f"Round End processing for data: {event}")
         if team_num == 0:  # Figure out which team one and make the correct associated round winner on the API
-            cls.match.team1_score += 1
-            await cls.current_round.create(True, False)
+            self.match.team1_score += 1
         elif team_num == 1:
-            cls.match.team2_score += 1
-            await cls.current_round.create(False, True)
+            self.match.team2_score += 1
         else:
             return
 
-        scoreboard = (await rcon_command("scoreboard")).split("\n")  # Finds the new scoreboard of players
-        players = []
-        log.debug(f"Round end processing of the following players: {[player.strip() for player in scoreboard]}")
-        for scoreboard_player in scoreboard:  # Begin parsing down these players so we can get their scores
-            if not scoreboard_player.strip():
-                continue
-            player_split = scoreboard_player.split(", ")
-            team_num = int(player_split[2])
-
-            if team_num < 0:  # If their team number is less than 0 then they are a spectator
-                continue
-
-            playfab = player_split[0]
-            name = player_split[1]
-            score = int(player_split[4])
-            kills = int(player_split[5])
-            deaths = int(player_split[6])
-            assists = int(player_split[7])
-
-            if team_num == 0:
-                team_id = cls.match.team1.id
-            else:
-                team_id = cls.match.team2.id
-
-            player = Player(playfab, None, team_id, cls.current_round.id, team_num, name, score, kills, assists, deaths)
-            await player.get_api_id()  # Find their API id and if not register them
-            registered_player = cls.players.pop(player.playfab_id, None)
-            if not registered_player:
-                cls.players[player.playfab_id] = player
-            else:
-                log.debug(f"Found {player.name} in registered players, registered data: {str(registered_player)}, "
-                          f"new data: {str(player)}")
-                cls.players[player.playfab_id] = copy.deepcopy(
-                    player
-                )  # Copy the new scoreboard data before making modifications
-
-                # Modifying data, this is to ensure we only capture how many kills, deaths, etc. they got
-                # THIS round. If we don't make a modification then we capture all of their SET data cumulatively
-                player.kills -= registered_player.kills
-                player.score -= registered_player.score
-                player.assists -= registered_player.assists
-                player.deaths -= registered_player.deaths
-            players.append(player)
-
-        api_round_players = {
-            "round_players": [vars(player) for player in players]}  # Generates a dict for JSON parsing
-        response = await APIRequest.post("/round/create-round-players", data=api_round_players)  # Save the data
-
-        if response.status == 200:
-            await rcon_command(f"say Saved data for the last round")
-            cls.current_round = Round(cls.current_set)
+        async def saved(delivered: bool):
+            """Confirms the round once the API accepted its last write, rather than when it was queued"""
+            if not delivered:
+                await self.rcon_command(f"say Unable to save data for the last round, please contact an admin!")
+                return
+            round_end_time.observe(time.perf_counter() - received_at, "saved")
+            await self.rcon_command(f"say Saved data for the last round")
+
+        validated_at = time.perf_counter()
+        if Round.submission == "combined" and self.current_set.saved():
+            players = await self.round_players()
+            resolved_at = time.perf_counter()
+            self.current_round.submit(team_num == 0, team_num == 1, players, on_done=saved)
         else:
-            await rcon_command(f"Unable to save data for the last round, status code: {response.status}")
-            log.error(f"Unable to save data for a ended tracked round, data sent: \"{api_round_players}\", "
-                      f"received response: \"{response.status}\", \"{response.json}\"")
+            await self.current_round.create(team_num == 0, team_num == 1)
+            players = await self.round_players()
+            resolved_at = time.perf_counter()
+
+            api_round_players = {
+                "round_players": [vars(player) for player in players]}  # Generates a dict for JSON parsing
+            # Save the data, delivered in order
+            Outbox.enqueue("/round/create-round-players", data=api_round_players, on_done=saved)
+
+        queued_at = time.perf_counter()
+        for stage, seconds in (("validation", validated_at - received_at), ("players", resolved_at - validated_at),
+                               ("queue", queued_at - resolved_at), ("total", queued_at - received_at)):
+            round_end_time.observe(seconds, stage)
+        log.info(f"Round end queued {len(players)} players in {(queued_at - received_at) * 1000:.1f}ms "
+                 f"(validation: {(validated_at - received_at) * 1000:.1f}ms, "
+                 f"players: {(resolved_at - validated_at) * 1000:.1f}ms, "
+                 f"queue: {(queued_at - resolved_at) * 1000:.1f}ms)")
+        self.current_round = Round(self.current_set)
+
+
+on_configure(Game.configure)
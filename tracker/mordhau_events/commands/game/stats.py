@@ -0,0 +1,222 @@
+"""
+Live player stats for the set being played, aggregated from the event stream as it arrives.
+
+Every player seen on the server is given a slot, and each stat is an array indexed by slot, so recording a kill is a
+dictionary lookup and two array increments. Kills, deaths and kills per weapon come from the Killfeed and scores from
+the player Scorefeed. Teams and assists are not in the event stream, they are taken from the scoreboard, and a kill of a
+teammate (once both teams are known from it) is only counted as the victim's death.
+
+The scoreboard is read periodically to reconcile the live stats with the server's. Scores are absolute, they are taken
+from it like the assists. Kills and deaths are counted, and Killfeed events are still arriving while the scoreboard is
+read: a scoreboard value between the live count from before the read and the one after it agrees with the live stats.
+Any other difference can be an event still on its way, so it is only reported as drift, and corrected, when the same
+difference is still there on the next check.
+"""
+
+import logging
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+
+from tracker.metrics import Metrics
+from tracker.mordhau_events.records import Killfeed
+from tracker.mordhau_events.records import Login
+from tracker.mordhau_events.records import Scorefeed
+
+log = logging.getLogger(__name__)
+
+# The team of a player who hasn't been on a scoreboard yet
+UNKNOWN_TEAM = -128
+# The counted stats the scoreboard is checked against
+RECONCILED_STATS = ("kills", "deaths")
+
+stats_drift = Metrics.counter("tracker_stats_drift_total",
+                              "Live player stats corrected to match the scoreboard, by stat", ("stat",))
+
+
+@dataclass(frozen=True)
+class ScoreboardRow:
+    __slots__ = ("playfab_id", "name", "team", "score", "kills", "deaths", "assists")
+    playfab_id: str
+    name: str
+    team: int
+    score: int
+    kills: int
+    deaths: int
+    assists: int
+
+
+def parse_scoreboard(scoreboard: str) -> list[ScoreboardRow]:
+    """Parses a `scoreboard` response, a line per player: `playfab, name, team, _, score, kills, deaths, assists`"""
+    rows = []
+    for line in scoreboard.split("\n"):
+        if not line.strip():
+            continue
+        fields = line.split(", ")
+        rows.append(ScoreboardRow(fields[0], fields[1], int(fields[2]), int(fields[4]), int(fields[5]),
+                                  int(fields[6]), int(fields[7])))
+    return rows
+
+
+class LiveStats:
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Clears every player, the scoreboard starts over when the map changes"""
+        self.slots: dict[str, int] = {}
+        self.names: list[str] = []
+        self.teams = array("b")
+        self.present = array("b")
+        self.kills = array("i")
+        self.deaths = array("i")
+        self.assists = array("i")
+        self.score = array("i")
+        self.weapon_kills: dict[str, array] = {}
+        self._drift: dict[tuple[int, str], int] = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def slot(self, playfab_id: str, name: str = None) -> int:
+        if (slot := self.slots.get(playfab_id)) is not None:
+            if name:
+                self.names[slot] = name
+            return slot
+        slot = self.slots[playfab_id] = len(self.names)
+        self.names.append(name or playfab_id)
+        self.teams.append(UNKNOWN_TEAM)
+        self.present.append(1)
+        for values in (self.kills, self.deaths, self.assists, self.score, *self.weapon_kills.values()):
+            values.append(0)
+        return slot
+
+    def record_kill(self, kill: Killfeed):
+        self.deaths[self.slot(kill.victim_id, kill.victim_name)] += 1
+        if not kill.killer_id or kill.killer_id == kill.victim_id:  # Killed by the world, or themselves
+            return
+        killer = self.slot(kill.killer_id, kill.killer_name)
+        if self.teams[killer] != UNKNOWN_TEAM and self.teams[killer] == self.teams[self.slots[kill.victim_id]]:
+            return  # A teamkill isn't a kill
+        self.kills[killer] += 1
+        if kill.weapon:
+            if (weapon_kills := self.weapon_kills.get(kill.weapon)) is None:
+                weapon_kills = self.weapon_kills[kill.weapon] = array("i", bytes(len(self.names) * 4))
+            weapon_kills[killer] += 1
+
+    def record_score(self, score: Scorefeed):
+        self.score[self.slot(score.playfab_id, score.name)] = score.new_score
+
+    def record_login(self, login: Login):
+        slot = self.slot(login.playfab_id, login.name)
+        self.present[slot] = login.logged_in
+        if login.logged_in:  # Their team is only known once they're on a scoreboard
+            self.teams[slot] = UNKNOWN_TEAM
+
+    def weapons(self, playfab_id: str) -> dict[str, int]:
+        if (slot := self.slots.get(playfab_id)) is None:
+            return {}
+        return {weapon: kills[slot] for weapon, kills in self.weapon_kills.items() if kills[slot]}
+
+    def ready(self) -> bool:
+        """True if every player on the server is known, and has been on a scoreboard to find their team"""
+        return any(self.present) and all(
+            team != UNKNOWN_TEAM for team, present in zip(self.teams, self.present) if present
+        )
+
+    def rows(self) -> list[ScoreboardRow]:
+        """The live stats of every player on the server, in the scoreboard's shape"""
+        return [
+            ScoreboardRow(playfab_id, self.names[slot], self.teams[slot], self.score[slot], self.kills[slot],
+                          self.deaths[slot], self.assists[slot])
+            for playfab_id, slot in self.slots.items() if self.present[slot]
+        ]
+
+    def counted(self) -> dict[str, array]:
+        """A copy of the counted stats, taken before reading a scoreboard to reconcile with"""
+        return {stat: array("i", getattr(self, stat)) for stat in RECONCILED_STATS}
+
+    def reconcile(self, rows: list[ScoreboardRow], counted: dict[str, array] = None) -> Counter:
+        """
+        Takes the teams, scores, assists and who is on the server from a scoreboard, and compares the kills and deaths
+        with it, allowing for the events counted since `counted` was taken. A difference seen on two checks in a row
+        is corrected, the corrections are returned by stat.
+        """
+        corrected = Counter()
+        drift = {}
+        on_scoreboard = set()
+        for row in rows:
+            slot = self.slot(row.playfab_id, row.name)
+            on_scoreboard.add(slot)
+            self.teams[slot] = row.team
+            self.present[slot] = 1
+            self.score[slot] = row.score
+            self.assists[slot] = row.assists
+            for stat in RECONCILED_STATS:
+                values = getattr(self, stat)
+                before = counted[stat][slot] if counted and slot < len(counted[stat]) else values[slot]
+                if before <= getattr(row, stat) <= values[slot]:
+                    continue
+                difference = getattr(row, stat) - values[slot]
+                if self._drift.get((slot, stat)) != difference:
+                    drift[(slot, stat)] = difference
+                    continue
+                log.warning(f"The live {stat} of {row.name} ({row.playfab_id}) drifted from the scoreboard, "
+                            f"live: {values[slot]}, scoreboard: {getattr(row, stat)}")
+                values[slot] += difference
+                corrected[stat] += 1
+                stats_drift.inc(stat)
+        for slot in range(len(self.names)):
+            if slot not in on_scoreboard:
+                self.present[slot] = 0
+        self._drift = drift
+        return corrected
+
+
+class SetSnapshot:
+    """
+    The cumulative stats of every player at the end of the set's last round, by slot, which are subtracted from the
+    next round's to find what each player did in that round.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.slots: dict[str, int] = {}
+        self.score = array("i")
+        self.kills = array("i")
+        self.assists = array("i")
+        self.deaths = array("i")
+
+    def __len__(self):
+        return len(self.slots)
+
+    def advance(self, rows: list[ScoreboardRow]) -> list[tuple[int, int, int, int]]:
+        """
+        Returns the `(score, kills, assists, deaths)` each row's player got since the last round, and keeps the rows as
+        the snapshot for the next. A player who joined since has nothing to subtract, and one whose kills, assists or
+        deaths went down has rejoined the server and started over, all of their stats are from this round.
+        """
+        slots, score, kills, assists, deaths = self.slots, self.score, self.kills, self.assists, self.deaths
+        deltas = []
+        for row in rows:
+            if (slot := slots.get(row.playfab_id)) is None:
+                slot = slots[row.playfab_id] = len(score)
+                for values in (score, kills, assists, deaths):
+                    values.append(0)
+            if row.kills < kills[slot] or row.assists < assists[slot] or row.deaths < deaths[slot]:
+                score[slot] = kills[slot] = assists[slot] = deaths[slot] = 0
+            deltas.append((row.score - score[slot], row.kills - kills[slot], row.assists - assists[slot],
+                           row.deaths - deaths[slot]))
+            score[slot], kills[slot], assists[slot], deaths[slot] = row.score, row.kills, row.assists, row.deaths
+        return deltas
+
+
+__all__ = [
+    "LiveStats",
+    "SetSnapshot",
+    "ScoreboardRow",
+    "parse_scoreboard"
+]
@@ -6,6 +6,7 @@ from . import CommandEvent
 
 from tracker import rcon_command
 from tracker.apirequest import APIRequest
+from tracker.mordhau_events.commands.game import Player
 
 log = logging.getLogger(__name__)
 
@@ -27,6 +28,7 @@ class Registration:
             await rcon_command(f"say Registered {command.player_name} with id "
                                f"{response.json['extra'][0]['player_id']}")
         else:
+            Player.id_cache.invalidate(command.playfab_id)
             await rcon_command(f"say Unable to register {command.player_name}! Response status: {response.status}. "
                                f"The API may be down.")
             log.error(f"Unable to register: {registration_dict}, response status: {response.status}")
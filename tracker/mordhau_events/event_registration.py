@@ -1,9 +1,11 @@
 from tracker.mordhau_events.Logging import LogEvents
 from tracker.mordhau_events.commands.register import Registration
 from tracker.mordhau_events.commands.game.game import Game
+from tracker.mordhau_events.server_state import ServerState
 
 
 class RegisteredEvents:
     log_events = LogEvents
     registration = Registration
-    mfc_game = Game
\ No newline at end of file
+    mfc_game = Game
+    server_state = ServerState
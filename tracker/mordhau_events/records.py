@@ -0,0 +1,141 @@
+"""
+Typed records for the Mordhau RCON events, each line is parsed once at ingest and the record is handed to every
+listener instead of them all re-parsing the raw content.
+
+The records are frozen and slotted to keep them small, each parser returns None when a line does not match the
+format it expects, which leaves listeners with the raw `Event.content` only.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import datetime
+
+TIMESTAMP = re.compile(r"(\d{4})\.(\d{2})\.(\d{2})-(\d{2})\.(\d{2})\.(\d{2})")
+KILLFEED = re.compile(
+    r"(?P<timestamp>\S+): (?P<killer_id>\w*) \((?P<killer_name>.*?)\) killed (?P<victim_id>\w*) "
+    r"\((?P<victim_name>.*?)\)(?: with (?P<weapon>.+))?$"
+)
+SCOREFEED = re.compile(
+    r"(?P<timestamp>\S+): (?P<subject>.+?)'s (?:score )?is now (?P<new_score>-?[\d.]+) points? "
+    r"from (?P<old_score>-?[\d.]+) points?$"
+)
+SCOREFEED_TEAM = re.compile(r"Team (-?\d+)$")
+SCOREFEED_PLAYER = re.compile(r"(?P<name>.*) \((?P<playfab_id>\w+)\)$")
+LOGIN = re.compile(r"(?P<timestamp>\S+): (?P<name>.*) \((?P<playfab_id>\w+)\) logged (?P<direction>in|out)$")
+CHAT = re.compile(r"(?P<playfab_id>\w+), (?P<name>.*?), \((?P<channel>\d+)\)(?: (?P<message>.*))?$", re.DOTALL)
+TIMESTAMPED = re.compile(r"(?P<timestamp>\d{4}\.\d{2}\.\d{2}-\d{2}\.\d{2}\.\d{2}): (?P<text>.*)$", re.DOTALL)
+
+
+def parse_timestamp(timestamp: str) -> [datetime, None]:
+    """Parses a Mordhau timestamp such as 2021.05.01-02.25.29"""
+    if not (match := TIMESTAMP.fullmatch(timestamp)):
+        return None
+    return datetime(*map(int, match.groups()))
+
+
+@dataclass(frozen=True)
+class Killfeed:
+    __slots__ = ("timestamp", "killer_id", "killer_name", "victim_id", "victim_name", "weapon")
+    timestamp: [datetime, None]
+    killer_id: str
+    killer_name: str
+    victim_id: str
+    victim_name: str
+    weapon: [str, None]
+
+
+@dataclass(frozen=True)
+class Scorefeed:
+    """A score change, either for a team (`team` is set) or for a player (`playfab_id` is set)"""
+    __slots__ = ("timestamp", "team", "playfab_id", "name", "old_score", "new_score")
+    timestamp: [datetime, None]
+    team: [int, None]
+    playfab_id: [str, None]
+    name: [str, None]
+    old_score: int
+    new_score: int
+
+
+@dataclass(frozen=True)
+class Login:
+    __slots__ = ("timestamp", "playfab_id", "name", "logged_in")
+    timestamp: [datetime, None]
+    playfab_id: str
+    name: str
+    logged_in: bool
+
+
+@dataclass(frozen=True)
+class Chat:
+    __slots__ = ("playfab_id", "name", "channel", "message")
+    playfab_id: str
+    name: str
+    channel: int
+    message: str
+
+
+@dataclass(frozen=True)
+class MatchState:
+    __slots__ = ("timestamp", "state")
+    timestamp: [datetime, None]
+    state: str
+
+
+@dataclass(frozen=True)
+class Punishment:
+    __slots__ = ("timestamp", "text")
+    timestamp: [datetime, None]
+    text: str
+
+
+def parse_killfeed(content: str) -> [Killfeed, None]:
+    """Parses `2021.05.01-02.25.29: 5E92E0B55E90869C (Killer) killed 8A7C2E3B1F0D4C5A (Victim)`"""
+    if not (match := KILLFEED.match(content)):
+        return None
+    return Killfeed(parse_timestamp(match["timestamp"]), match["killer_id"], match["killer_name"],
+                    match["victim_id"], match["victim_name"], match["weapon"])
+
+
+def parse_scorefeed(content: str) -> [Scorefeed, None]:
+    """Parses `2021.05.01-02.25.29: Team 0's is now 7.0 points from 6.0 points`"""
+    if not (match := SCOREFEED.match(content)):
+        return None
+    team = playfab_id = name = None
+    if team_match := SCOREFEED_TEAM.match(match["subject"]):
+        team = int(team_match.group(1))
+    elif player_match := SCOREFEED_PLAYER.match(match["subject"]):
+        playfab_id, name = player_match["playfab_id"], player_match["name"]
+    else:
+        name = match["subject"]
+    try:
+        old_score, new_score = int(float(match["old_score"])), int(float(match["new_score"]))
+    except ValueError:
+        return None
+    return Scorefeed(parse_timestamp(match["timestamp"]), team, playfab_id, name, old_score, new_score)
+
+
+def parse_login(content: str) -> [Login, None]:
+    """Parses `2021.05.01-02.25.29: Sbinalla (5E92E0B55E90869C) logged in`"""
+    if not (match := LOGIN.match(content)):
+        return None
+    return Login(parse_timestamp(match["timestamp"]), match["playfab_id"], match["name"], match["direction"] == "in")
+
+
+def parse_chat(content: str) -> [Chat, None]:
+    """Parses `5E92E0B55E90869C, Sbinalla, (0) some message`"""
+    if not (match := CHAT.match(content)):
+        return None
+    return Chat(match["playfab_id"], match["name"], int(match["channel"]), match["message"] or "")
+
+
+def parse_match_state(content: str) -> [MatchState, None]:
+    """Parses `2021.05.01-02.25.29: In progress`"""
+    if not (match := TIMESTAMPED.match(content)):
+        return None
+    return MatchState(parse_timestamp(match["timestamp"]), match["text"].strip())
+
+
+def parse_punishment(content: str) -> [Punishment, None]:
+    if match := TIMESTAMPED.match(content):
+        return Punishment(parse_timestamp(match["timestamp"]), match["text"].strip())
+    return Punishment(None, content)
@@ -0,0 +1,163 @@
+"""
+What is known about each server's state, kept up to date from the event stream so handlers don't have to ask for it.
+
+    - The map is the one the tracker changed the level to, MatchState events don't name it. A map change the tracker
+      didn't make leaves it unknown until the server's `info` is next read
+    - The match phase is the last MatchState, such as "Waiting to start" or "In progress"
+    - The players on the server follow the Login events
+
+`info` is read when the tracker starts and every `SERVER_STATE_RECONCILE_INTERVAL` seconds, a map that differs from
+the one being tracked is logged as drift and corrected.
+"""
+
+import asyncio
+import logging
+import time
+
+from tracker import Base
+from tracker.metrics import Metrics
+from tracker.server import Server
+from tracker.settings import MatchSettings
+from tracker.settings import Settings
+from tracker.settings import on_configure
+from tracker.mordhau_events import MordhauEvent
+from tracker.mordhau_events import MordhauListener
+from tracker.mordhau_events import MordhauType
+from tracker.mordhau_events.records import Login
+from tracker.mordhau_events.records import MatchState
+
+log = logging.getLogger(__name__)
+
+LEAVING_MAP = "Leaving map"
+# Seconds a level change is waited on before the info is trusted over it again
+LEVEL_CHANGE_TIMEOUT = 60
+
+state_drift = Metrics.counter("tracker_server_state_drift_total",
+                              "Tracked server maps corrected after reading the server's info, by server", ("server",))
+
+
+def parse_info_map(info: str) -> [str, None]:
+    """The map in an `info` response, from its `Map: skm_moshpit` line"""
+    for line in info.split("\n"):
+        name, _, value = line.partition(":")
+        if name.strip().casefold() == "map":
+            return value.strip()
+    return None
+
+
+def same_map(current_map: str, expected_map: str) -> bool:
+    return current_map.casefold().strip().replace(" ", "_") in expected_map.strip().casefold()
+
+
+class ServerState:
+    # Set from the settings by `configure` when the tracker starts
+    reconcile_interval = MatchSettings.server_state_interval
+
+    # The state of each server, by server id
+    states: dict[str, "ServerState"] = {}
+
+    def __init__(self, server: Server):
+        self.server = server
+        self.map: [str, None] = None
+        self.phase: [str, None] = None
+        self.players: dict[str, str] = {}  # Playfab id -> name
+        # The map the tracker changed the level to, kept when the server leaves the old one
+        self.changing_to: [str, None] = None
+        self.changing_at: float = 0
+        self.reconciler: [asyncio.Task, None] = None
+
+    @classmethod
+    def configure(cls, settings: Settings):
+        cls.reconcile_interval = settings.match.server_state_interval
+
+    @classmethod
+    def of(cls, server_id: [str, None]) -> "ServerState":
+        """The state of a server, the server being handled if no id is given"""
+        server = Base.servers[server_id] if server_id else Base.server()
+        if (state := cls.states.get(server.id)) is None:
+            state = cls.states[server.id] = cls(server)
+        return state
+
+    def changing_level(self, map: str):
+        """Records a `changelevel` the tracker made, before it is issued"""
+        self.map = self.changing_to = map
+        self.changing_at = time.monotonic()
+
+    def on_map(self, expected_map: str) -> [bool, None]:
+        """Whether the server is on the expected map, None if its map isn't known"""
+        if self.map is None:
+            return None
+        return same_map(self.map, expected_map)
+
+    async def refresh(self) -> [str, None]:
+        """Reads the server's map from its `info`, correcting the tracked one"""
+        current_map = parse_info_map(await self.server.rcon_command("info"))
+        if self.changing_to and time.monotonic() - self.changing_at < LEVEL_CHANGE_TIMEOUT:
+            return current_map  # The server may not have left the old map yet
+        if self.map is not None and current_map is not None and not same_map(current_map, self.map):
+            log.warning(f"The tracked map of \"{self.server.id}\" drifted from its info, tracked: {self.map}, "
+                        f"info: {current_map}")
+            state_drift.inc(self.server.id)
+        self.map = current_map
+        return current_map
+
+    async def _reconcile(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                log.exception(f"Unable to read the info of \"{self.server.id}\" to check its state")
+            await asyncio.sleep(self.reconcile_interval)
+
+    @classmethod
+    def start(cls):
+        """Reads the info of every server, and every reconcile_interval seconds after"""
+        if cls.reconcile_interval <= 0:
+            return
+        for server_id in Base.servers:
+            state = cls.of(server_id)
+            if not state.reconciler:
+                state.reconciler = asyncio.create_task(state._reconcile())
+
+    @classmethod
+    async def stop(cls):
+        reconcilers = [state.reconciler for state in cls.states.values() if state.reconciler]
+        for reconciler in reconcilers:
+            reconciler.cancel()
+        await asyncio.gather(*reconcilers, return_exceptions=True)
+        for state in cls.states.values():
+            state.reconciler = None
+
+    @staticmethod
+    @MordhauListener.listen(MordhauType.MATCH_STATE)
+    async def _match_state_hook(event: MordhauEvent):
+        match_state: MatchState = event.record
+        if not match_state:
+            return
+        state = ServerState.of(event.server)
+        state.phase = match_state.state
+        if match_state.state == LEAVING_MAP:
+            # A level change the tracker didn't make leaves the map unknown, until the info is read again
+            state.map, state.changing_to = state.changing_to, None
+
+    @staticmethod
+    @MordhauListener.listen(MordhauType.LOGIN)
+    async def _login_hook(event: MordhauEvent):
+        login: Login = event.record
+        if not login:
+            return
+        players = ServerState.of(event.server).players
+        if login.logged_in:
+            players[login.playfab_id] = login.name
+        else:
+            players.pop(login.playfab_id, None)
+
+
+Metrics.gauge("tracker_server_players", "Players on each server, from the Login events",
+              lambda: {(server_id,): len(state.players) for server_id, state in ServerState.states.items()},
+              ("server",))
+on_configure(ServerState.configure)
+
+__all__ = [
+    "ServerState"
+]
@@ -0,0 +1,322 @@
+"""
+A durable outbox for the API writes that record match data.
+
+Writes are committed to a local SQLite queue and a background worker delivers them to the API in the order they were
+queued, retrying with an exponential backoff while the API is down, times out, is rate limiting or has a server error.
+Pending writes survive restarts and are replayed when the worker next starts, so the RCON listener never waits on the
+API and no round data is lost. A write the API rejects is marked failed straight away, and one the API kept failing
+after `max_attempts` answers is dead-lettered, so neither holds up the writes queued after it. Both are kept in the
+database to be inspected.
+
+Consecutive writes to an endpoint registered with `batch` are delivered together in one request, so a backlog (after
+the API was down, or from a replay) is caught up on in a fraction of the requests.
+
+Later writes often need an id the API only returns for an earlier write (a round needs its set's id), those are
+passed as references that the worker fills in from the earlier write's response just before sending:
+
+    >>> set_key = Outbox.enqueue("/set/create-set", {"map": "skm_moshpit", "match_id": 1})
+    >>> Outbox.enqueue("/round/create-round", {"set_id": Outbox.ref(set_key, "extra", 0, "set_id"), ...})
+
+A write can also be given a coroutine function, called with whether it was delivered once the API accepts it or it is
+given up on. It only lasts the run it was queued in, a write replayed after a restart is delivered without it.
+"""
+
+import asyncio
+import itertools
+import logging
+import random
+import sqlite3
+import time
+import uuid
+from typing import Awaitable
+from typing import Callable
+
+from tracker.apirequest import APIRequest
+from tracker.jsoncodec import JSONCodec
+from tracker.metrics import Metrics
+from tracker.settings import OutboxSettings
+from tracker.settings import Settings
+from tracker.settings import on_configure
+
+log = logging.getLogger(__name__)
+
+REFERENCE_KEY = "$outbox"
+
+deliveries = Metrics.counter("tracker_outbox_deliveries_total", "Outbox delivery attempts, by outcome", ("outcome",))
+delivery_time = Metrics.histogram("tracker_outbox_delivery_seconds",
+                                  "Time from queueing a write until the API accepted it, by endpoint", ("endpoint",))
+
+
+class UnresolvedReference(Exception):
+    """Raised when a write references another write that was never delivered"""
+
+
+class Outbox:
+    # Set from the settings by `configure` when the tracker starts, see `OutboxSettings`
+    path = OutboxSettings.path
+    base_backoff = OutboxSettings.backoff
+    max_backoff = OutboxSettings.max_backoff
+    retention = OutboxSettings.retention
+    batch_size = OutboxSettings.batch_size
+    max_attempts = OutboxSettings.max_attempts
+
+    # Batched endpoint -> (the endpoint taking a batch of its writes, the field the batch is passed in)
+    batches: dict[str, tuple[str, str]] = {}
+    # Key -> called with whether the write was delivered, once it is delivered or given up on
+    callbacks: dict[str, Callable[[bool], Awaitable]] = {}
+    notifying: set[asyncio.Task] = set()
+
+    connection: [sqlite3.Connection, None] = None
+    worker: [asyncio.Task, None] = None
+    _wakeup: [asyncio.Event, None] = None
+
+    @classmethod
+    def configure(cls, settings: Settings):
+        cls.path = settings.outbox.path
+        cls.base_backoff = settings.outbox.backoff
+        cls.max_backoff = settings.outbox.max_backoff
+        cls.retention = settings.outbox.retention
+        cls.batch_size = settings.outbox.batch_size
+        cls.max_attempts = settings.outbox.max_attempts
+
+    @classmethod
+    def open(cls):
+        if cls.connection:
+            return
+        cls.connection = sqlite3.connect(cls.path, isolation_level=None)
+        cls.connection.execute("PRAGMA journal_mode=WAL")
+        cls.connection.execute("PRAGMA synchronous=NORMAL")
+        cls.connection.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "   seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            "   key TEXT UNIQUE NOT NULL,"
+            "   endpoint TEXT NOT NULL,"
+            "   data TEXT,"
+            "   state TEXT NOT NULL DEFAULT 'pending',"
+            "   attempts INTEGER NOT NULL DEFAULT 0,"
+            "   queued_at REAL NOT NULL,"
+            "   delivered_at REAL,"
+            "   status INTEGER,"
+            "   result TEXT"
+            ")"
+        )
+        cls.connection.execute("CREATE INDEX IF NOT EXISTS outbox_state ON outbox (state, seq)")
+        cls.connection.execute("DELETE FROM outbox WHERE state != 'pending' AND queued_at < ?",
+                               (time.time() - cls.retention,))
+
+    @staticmethod
+    def ref(key: str, *path) -> dict:
+        """A placeholder for a value in the response of the write queued under `key`"""
+        return {REFERENCE_KEY: key, "path": list(path)}
+
+    @classmethod
+    def enqueue(cls, endpoint: str, data: dict = None, key: str = None,
+                on_done: Callable[[bool], Awaitable] = None) -> str:
+        """
+        Durably queues a POST to `endpoint` and returns its idempotency key. `on_done` is awaited with whether it was
+        delivered, once it is delivered or given up on.
+        """
+        cls.open()
+        key = key or str(uuid.uuid4())
+        cls.connection.execute(
+            "INSERT INTO outbox (key, endpoint, data, queued_at) VALUES (?, ?, ?, ?)",
+            (key, endpoint, JSONCodec.dumps(data).decode(), time.time())
+        )
+        if on_done:
+            cls.callbacks[key] = on_done
+        log.debug(f"Queued a write to \"{endpoint}\" with key \"{key}\"")
+        if cls._wakeup:
+            cls._wakeup.set()
+        return key
+
+    @classmethod
+    def pending(cls) -> int:
+        cls.open()
+        return cls.connection.execute("SELECT COUNT(*) FROM outbox WHERE state = 'pending'").fetchone()[0]
+
+    @classmethod
+    def resolve(cls, value):
+        """
+        Fills in the references in `value` now, raising UnresolvedReference if a write it references wasn't delivered
+        yet (or failed)
+        """
+        cls.open()
+        try:
+            return cls._resolve(value)
+        except (KeyError, IndexError, TypeError) as error:
+            raise UnresolvedReference(f"The response of a referenced write had no {error!r}")
+
+    @classmethod
+    def _resolve(cls, value):
+        if isinstance(value, list):
+            return [cls._resolve(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        if REFERENCE_KEY not in value:
+            return {name: cls._resolve(item) for name, item in value.items()}
+
+        row = cls.connection.execute(
+            "SELECT state, result FROM outbox WHERE key = ?", (value[REFERENCE_KEY],)
+        ).fetchone()
+        if not row or row[0] != "delivered":
+            raise UnresolvedReference(f"The write \"{value[REFERENCE_KEY]}\" was not delivered")
+        resolved = JSONCodec.loads(row[1])
+        for step in value["path"]:
+            resolved = resolved[step]
+        return resolved
+
+    @classmethod
+    def batch(cls, endpoint: str, batch_endpoint: str, field: str):
+        """
+        Lets consecutive pending writes to `endpoint` be delivered together, as the list in `field` of one write to
+        `batch_endpoint`
+        """
+        cls.batches[endpoint] = (batch_endpoint, field)
+
+    @classmethod
+    def _next(cls) -> list[tuple]:
+        """The next pending write, and the ones after it it can be batched with"""
+        entries = cls.connection.execute(
+            "SELECT seq, key, endpoint, data, attempts, queued_at FROM outbox WHERE state = 'pending' "
+            "ORDER BY seq LIMIT ?", (max(cls.batch_size, 1),)
+        ).fetchall()
+        if not entries or entries[0][2] not in cls.batches:
+            return entries[:1]
+        return list(itertools.takewhile(lambda entry: entry[2] == entries[0][2], entries))
+
+    @classmethod
+    def _done(cls, entries: list[tuple], delivered: bool):
+        """Calls back the writes' callbacks, in tasks of their own so they never hold up the deliveries after them"""
+        for entry in entries:
+            if (callback := cls.callbacks.pop(entry[1], None)) is not None:
+                task = asyncio.create_task(cls._call(callback, delivered, entry))
+                cls.notifying.add(task)
+                task.add_done_callback(cls.notifying.discard)
+
+    @staticmethod
+    async def _call(callback: Callable[[bool], Awaitable], delivered: bool, entry: tuple):
+        try:
+            await callback(delivered)
+        except Exception:
+            log.exception(f"The callback of the write to \"{entry[2]}\" with key \"{entry[1]}\" failed")
+
+    @staticmethod
+    def _retryable(status: int) -> bool:
+        """Whether a write that failed with `status` could still succeed, rather than being wrong as sent"""
+        return status in (APIRequest.CONNECTION_FAILED, 408, 429) or status >= 500
+
+    @classmethod
+    async def _deliver(cls, entries: list[tuple]) -> bool:
+        """Attempts to deliver the writes, one or a batch, returns False if they should be retried later"""
+        _, key, endpoint, _, attempts, queued_at = entries[0]
+        bodies = []
+        for entry in entries:
+            try:
+                bodies.append(cls._resolve(JSONCodec.loads(entry[3])))
+            except (UnresolvedReference, KeyError, IndexError, TypeError) as error:
+                if len(entries) > 1:  # Deliver the writes before it, or it alone, so only it is dropped
+                    return await cls._deliver(entries[:max(len(bodies), 1)])
+                log.error(f"Dropping the write to \"{endpoint}\" with key \"{key}\", it depends on a failed write: "
+                          f"{error!r}")
+                cls.connection.execute("UPDATE outbox SET state = 'failed' WHERE seq = ?", (entry[0],))
+                cls._done([entry], False)
+                return True
+
+        if len(entries) == 1:
+            body = bodies[0]
+            description = f"the write to \"{endpoint}\" with key \"{key}\""
+        else:
+            # The batch gets a key of its own, the same for a retry of the same writes
+            key = str(uuid.uuid5(uuid.NAMESPACE_OID, ",".join(entry[1] for entry in entries)))
+            endpoint, field = cls.batches[endpoint]
+            body = {field: bodies}
+            description = f"the batch of {len(entries)} writes to \"{endpoint}\" with key \"{key}\""
+        seqs = [(entry[0],) for entry in entries]
+
+        response = await APIRequest.post(endpoint, data=body, headers={"Idempotency-Key": key})
+        if 200 <= response.status < 300:
+            cls.connection.executemany(
+                "UPDATE outbox SET state = 'delivered', delivered_at = ?, status = ?, result = ? WHERE seq = ?",
+                [(time.time(), response.status, JSONCodec.dumps(response.json).decode(), *seq) for seq in seqs]
+            )
+            deliveries.inc("delivered", amount=len(entries))
+            delivered_at = time.time()
+            for entry in entries:
+                delivery_time.observe(delivered_at - entry[5], endpoint.split("?", 1)[0])
+            log.debug(f"Delivered {description} {delivered_at - queued_at:.2f} seconds after it was queued")
+            cls._done(entries, True)
+            return True
+
+        if response.status != APIRequest.CONNECTION_FAILED:
+            attempts += 1
+        cls.connection.executemany("UPDATE outbox SET attempts = ?, status = ? WHERE seq = ?",
+                                   [(attempts, response.status, *seq) for seq in seqs])
+        if cls._retryable(response.status) and not 0 < cls.max_attempts <= attempts:
+            deliveries.inc("retried", amount=len(entries))
+            log.warning(f"Unable to deliver {description}, status: {response.status}, attempt {attempts}. Retrying.")
+            return False
+
+        if cls._retryable(response.status):
+            deliveries.inc("dead_lettered", amount=len(entries))
+            log.error(f"Gave up on {description} after {attempts} attempts, status: \"{response.status}\", content: "
+                      f"\"{response.json}\", data: \"{body}\"")
+            cls.connection.executemany("UPDATE outbox SET state = 'dead' WHERE seq = ?", seqs)
+        else:
+            deliveries.inc("rejected", amount=len(entries))
+            log.error(f"The API rejected {description}, status: \"{response.status}\", content: \"{response.json}\", "
+                      f"data: \"{body}\"")
+            cls.connection.executemany("UPDATE outbox SET state = 'failed' WHERE seq = ?", seqs)
+        cls._done(entries, False)
+        return True
+
+    @classmethod
+    async def _drain(cls):
+        failures = 0  # In a row, the backoff keeps growing through an outage though those aren't counted as attempts
+        while True:
+            cls._wakeup.clear()
+            if not (entries := cls._next()):
+                await cls._wakeup.wait()
+                continue
+            try:
+                delivered = await cls._deliver(entries)
+            except Exception:
+                log.exception(f"Unexpected error delivering the write to \"{entries[0][2]}\" with key "
+                              f"\"{entries[0][1]}\"")
+                delivered = False
+            if delivered:
+                failures = 0
+            else:
+                failures += 1
+                await asyncio.sleep(random.uniform(0.5, 1) * min(cls.max_backoff, cls.base_backoff * 2 ** failures))
+
+    @classmethod
+    def start(cls):
+        """Starts delivering queued writes, including any left pending by a previous run"""
+        cls.open()
+        if cls.worker and not cls.worker.done():
+            return
+        if pending := cls.pending():
+            log.info(f"Replaying {pending} pending API writes from \"{cls.path}\"")
+        cls._wakeup = asyncio.Event()
+        cls.worker = asyncio.create_task(cls._drain())
+
+    @classmethod
+    async def stop(cls):
+        if cls.worker:
+            cls.worker.cancel()
+            try:
+                await cls.worker
+            except asyncio.CancelledError:
+                pass
+            cls.worker = None
+        cls._wakeup = None
+        if cls.connection:
+            if pending := cls.pending():
+                log.info(f"{pending} API writes are still pending, they will be delivered on the next start")
+            cls.connection.close()
+            cls.connection = None
+
+
+Metrics.gauge("tracker_outbox_pending", "API writes waiting to be delivered",
+              lambda: Outbox.pending() if Outbox.connection else 0)
+on_configure(Outbox.configure)
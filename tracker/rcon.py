@@ -0,0 +1,333 @@
+"""
+A native asyncio Source RCON client.
+
+Connections stay open and authenticated between commands, requests are multiplexed by their packet id so several
+commands can be in flight on one socket, and a small pool of connections spreads concurrent commands out.
+
+The server splits a long response, such as the `scoreboard` of a full server, over several packets. Each command is
+followed by an empty SERVERDATA_RESPONSE_VALUE packet, which the server echoes once it has sent the whole response, and
+the bodies that arrive in between are joined into the one response.
+
+    >>> pool = RconPool("127.0.0.1", 7778, "password", size=2)
+    >>> await pool.execute("info")
+
+A dedicated client can also follow the `listen allon` broadcast stream without blocking the event loop:
+
+    >>> async for body in RconClient("127.0.0.1", 7778, "password").listen():
+    >>>     for message in split_messages(body):
+    >>>         print(message)
+"""
+
+import asyncio
+import collections
+import itertools
+import logging
+import struct
+
+log = logging.getLogger(__name__)
+
+# Packet types
+SERVERDATA_AUTH = 3
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_RESPONSE_VALUE = 0
+
+HEADER = struct.Struct("<3i")
+MAX_PACKET_SIZE = 4096
+MAX_RESPONSE_SIZE = 1 << 20
+READ_SIZE = 65536
+
+# The control characters, other than tabs and newlines, removed from messages with a single bytes.translate call before
+# they are decoded. UTF-8 never uses these bytes inside a multi-byte character, so player names decode intact
+CONTROL_CHARACTERS = bytes(byte for byte in range(32) if byte not in (9, 10)) + b"\x7f"
+# Commands that only read the server's state, so running one twice does no harm
+REPEATABLE_COMMANDS = ("scoreboard", "info", "playerlist")
+
+
+class RconError(Exception):
+    """Generic RCON error"""
+
+
+class RconAuthError(RconError):
+    """Raised when the server rejects the RCON password"""
+
+
+class RconNotSent(ConnectionError):
+    """Raised when a command fails before any of it was written to the connection, so the server never ran it"""
+
+
+def pack_packet(pkt_id: int, pkt_type: int, body: str) -> bytes:
+    """Returns the wire format of a single RCON packet"""
+    encoded = body.encode("utf-8")
+    if len(encoded) + 10 > MAX_PACKET_SIZE:
+        raise RconError(f"RCON packet exceeds {MAX_PACKET_SIZE} bytes")
+    return HEADER.pack(len(encoded) + 10, pkt_id, pkt_type) + encoded + b"\x00\x00"
+
+
+def repeatable(command: str) -> bool:
+    return command.split(" ", 1)[0].strip().casefold() in REPEATABLE_COMMANDS
+
+
+def format_body(body: bytes) -> str:
+    """Decodes a packet body, dropping the NUL terminators"""
+    return body.rstrip(b"\x00").decode("utf-8", errors="ignore")
+
+
+def split_messages(body: bytes) -> list[str]:
+    """
+    Splits a packet body into its messages. The server terminates each message with a NUL, which occasionally leaves
+    two messages joined into one packet. Control characters are dropped and the messages decoded as UTF-8, with any
+    invalid bytes replaced.
+    """
+    return [message for part in body.split(b"\x00")
+            if (message := part.translate(None, CONTROL_CHARACTERS).decode("utf-8", errors="replace"))]
+
+
+class RconFrameDecoder:
+    """
+    Incrementally decodes RCON packets out of a stream of bytes.
+
+    Received data is appended to one reusable buffer and each packet's body is copied out of it once, its header is read
+    in place. Partial packets stay buffered until the rest of their bytes arrive and several packets in one read are all
+    returned.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def feed(self, data: bytes) -> list[tuple[int, int, bytes]]:
+        """Adds data to the buffer and returns every complete (id, type, body) packet it now holds"""
+        self._buffer += data
+        packets = []
+        offset = 0
+        end = len(self._buffer)
+        with memoryview(self._buffer) as view:
+            while end - offset >= HEADER.size:
+                size, pkt_id, pkt_type = HEADER.unpack_from(view, offset)
+                if size < 10 or size > MAX_RESPONSE_SIZE:
+                    raise RconError(f"Received a malformed RCON packet with a size of {size}")
+                if end - offset - 4 < size:
+                    break
+                packets.append((pkt_id, pkt_type, bytes(view[offset + HEADER.size:offset + 4 + size])))
+                offset += 4 + size
+        if offset:
+            del self._buffer[:offset]
+        return packets
+
+
+class RconClient:
+    """
+    A single long lived, authenticated RCON connection.
+
+    Every command is sent with a unique packet id and awaits the response carrying that id, a background task reads
+    the socket and resolves the matching future. This allows commands to be pipelined over the one connection.
+    """
+
+    def __init__(self, host: str, port: int, password: str, timeout: float = 10, multi_packet: bool = True):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        # Whether responses are read until the end of response packet is echoed, or are always a single packet
+        self.multi_packet = multi_packet
+        self._reader: [asyncio.StreamReader, None] = None
+        self._writer: [asyncio.StreamWriter, None] = None
+        self._read_task: [asyncio.Task, None] = None
+        self._pending: dict[int, asyncio.Future] = {}
+        self._bodies: dict[int, list[bytes]] = {}  # The response packets of each command received so far
+        self._sentinels: dict[int, int] = {}  # The id of each end of response packet, to the id of its command
+        # Some servers answer the end of response packet twice, the second answer is discarded
+        self._answered: collections.deque[int] = collections.deque(maxlen=16)
+        self._packets: collections.deque[tuple[int, int, bytes]] = collections.deque()
+        self._decoder = RconFrameDecoder()
+        self._broadcasts: [asyncio.Queue, None] = None
+        self._ids = itertools.count(1)
+        self._connect_lock = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _next_id(self) -> int:
+        pkt_id = next(self._ids)
+        if pkt_id >= 2 ** 31 - 1:
+            self._ids = itertools.count(1)
+            pkt_id = next(self._ids)
+        return pkt_id
+
+    async def _read_packet(self) -> tuple[int, int, bytes]:
+        while not self._packets:
+            data = await self._reader.read(READ_SIZE)
+            if not data:
+                raise asyncio.IncompleteReadError(bytes(), None)
+            self._packets.extend(self._decoder.feed(data))
+        return self._packets.popleft()
+
+    async def connect(self):
+        async with self._connect_lock:
+            if self.connected:
+                return
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout
+            )
+            self._decoder = RconFrameDecoder()
+            self._packets.clear()
+            auth_id = self._next_id()
+            self._writer.write(pack_packet(auth_id, SERVERDATA_AUTH, self.password))
+            await self._writer.drain()
+
+            # Some servers send an empty SERVERDATA_RESPONSE_VALUE ahead of the SERVERDATA_AUTH_RESPONSE
+            while True:
+                pkt_id, pkt_type, _ = await asyncio.wait_for(self._read_packet(), self.timeout)
+                if pkt_type == SERVERDATA_AUTH_RESPONSE:
+                    break
+            if pkt_id == -1:
+                await self.close()
+                raise RconAuthError(f"The RCON password for \"{self.host}:{self.port}\" was rejected")
+
+            self._read_task = asyncio.create_task(self._read_loop())
+            log.debug(f"Opened RCON connection to \"{self.host}:{self.port}\"")
+
+    async def _read_loop(self):
+        broadcasts = self._broadcasts
+        try:
+            while True:
+                pkt_id, pkt_type, body = await self._read_packet()
+                if (command_id := self._sentinels.pop(pkt_id, None)) is not None:
+                    self._answered.append(pkt_id)
+                    future = self._pending.pop(command_id, None)
+                    if future and not future.done():
+                        future.set_result(b"".join(self._bodies.pop(command_id, ())))
+                    continue
+                if pkt_id in self._answered:
+                    continue
+                if (bodies := self._bodies.get(pkt_id)) is not None:
+                    bodies.append(body.rstrip(b"\x00"))
+                    continue
+                future = self._pending.pop(pkt_id, None)
+                if future and not future.done():
+                    future.set_result(body)
+                elif broadcasts is not None:
+                    broadcasts.put_nowait(body)
+                else:
+                    log.debug(f"Discarded unsolicited RCON packet with id {pkt_id}: {body}")
+        except (asyncio.IncompleteReadError, ConnectionError, OSError, RconError) as error:
+            log.warning(f"RCON connection to \"{self.host}:{self.port}\" was lost: {error!r}")
+        finally:
+            self._fail_pending(ConnectionError(f"RCON connection to \"{self.host}:{self.port}\" closed"))
+            if self._writer:
+                self._writer.close()
+            if broadcasts is not None:
+                broadcasts.put_nowait(None)  # Wakes the listen generator so it can reconnect
+
+    def _fail_pending(self, error: Exception):
+        pending, self._pending = self._pending, {}
+        self._bodies.clear()
+        self._sentinels.clear()
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def execute(self, command: str, multi_packet: bool = None) -> str:
+        """Sends a command and returns the server's response body"""
+        if not self.connected:
+            try:
+                await self.connect()
+            except (ConnectionError, OSError, asyncio.IncompleteReadError) as error:
+                raise RconNotSent(f"Unable to connect to \"{self.host}:{self.port}\": {error!r}") from error
+        pkt_id = self._next_id()
+        future = asyncio.get_running_loop().create_future()
+        self._pending[pkt_id] = future
+        data = pack_packet(pkt_id, SERVERDATA_EXECCOMMAND, command)
+        sentinel_id = None
+        if self.multi_packet if multi_packet is None else multi_packet:
+            sentinel_id = self._next_id()
+            self._bodies[pkt_id] = []
+            self._sentinels[sentinel_id] = pkt_id
+            data += pack_packet(sentinel_id, SERVERDATA_RESPONSE_VALUE, "")
+        try:
+            self._writer.write(data)
+            await self._writer.drain()
+            return format_body(await asyncio.wait_for(future, self.timeout))
+        finally:
+            self._pending.pop(pkt_id, None)
+            self._bodies.pop(pkt_id, None)
+            self._sentinels.pop(sentinel_id, None)
+
+    async def listen(self, command: str = "listen allon", retry_delay: float = 5):
+        """
+        Yields the body of every packet the server broadcasts after `command` is issued. A dropped connection is
+        reopened and the command reissued, so the stream only ends when the generator is closed.
+        """
+        try:
+            while True:
+                # Each connection's read task delivers into the queue that existed when it was started
+                await self.close()
+                self._broadcasts = asyncio.Queue()
+                try:
+                    # Answered with one packet, broadcasts may follow it before an end of response packet would
+                    await self.execute(command, multi_packet=False)
+                except (ConnectionError, OSError, asyncio.TimeoutError) as error:
+                    log.warning(f"Unable to start the RCON stream on \"{self.host}:{self.port}\", retrying in "
+                                f"{retry_delay} seconds: {error!r}")
+                    await asyncio.sleep(retry_delay)
+                    continue
+                while (body := await self._broadcasts.get()) is not None:
+                    yield body
+                log.info(f"Reconnecting the RCON stream to \"{self.host}:{self.port}\"")
+        finally:
+            self._broadcasts = None
+            await self.close()
+
+    async def close(self):
+        if self._read_task:
+            self._read_task.cancel()
+            self._read_task = None
+        if self._writer:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self._writer = None
+        self._reader = None
+        self._fail_pending(ConnectionError("RCON connection closed"))
+
+
+class RconPool:
+    """
+    A small pool of RconClients, commands go to the connection with the fewest in flight requests. Connections are
+    opened lazily. A command that fails due to a dropped connection is retried once on a fresh connection, if it was
+    never sent or only reads the server's state. Others may have run before the connection dropped, and aren't repeated.
+    """
+
+    def __init__(self, host: str, port: int, password: str, size: int = 2, timeout: float = 10,
+                 multi_packet: bool = True):
+        self.clients = [RconClient(host, port, password, timeout=timeout, multi_packet=multi_packet)
+                        for _ in range(max(size, 1))]
+
+    def _least_busy(self) -> RconClient:
+        return min(self.clients, key=lambda client: (not client.connected, client.pending))
+
+    async def execute(self, command: str) -> str:
+        client = self._least_busy()
+        try:
+            return await client.execute(command)
+        except (ConnectionError, OSError, asyncio.IncompleteReadError) as error:
+            await client.close()
+            if not isinstance(error, RconNotSent) and not repeatable(command):
+                log.warning(f"The RCON command \"{command.strip()}\" failed and may have already run, it isn't "
+                            f"retried: {error!r}")
+                raise
+            log.info(f"Reconnecting to RCON after a failed command \"{command.strip()}\": {error!r}")
+            return await client.execute(command)
+
+    async def close(self):
+        await asyncio.gather(*(client.close() for client in self.clients))
@@ -0,0 +1,152 @@
+"""
+Streams recorded RCON traffic back into the tracker.
+
+A recording is either a binary capture (see `tracker.capture`) or the `raw_rcon.log` written by the `raw_rcon`
+logger, one packet body repr per line, along with the files it was rotated into (`raw_rcon.log.1` through
+`raw_rcon.log.5`) which may also be gzip compressed. Files are read lazily, so memory use stays flat however large the
+recording is.
+
+Packets are replayed either as fast as possible, for backfilling and benchmarking, or paced to reproduce the original
+timing, by the receive times in a capture or the Mordhau timestamps inside the packets of a log. A replay can also
+start part way through a recording, a capture seeks straight to the right block while a log is scanned up to it.
+"""
+
+import ast
+import asyncio
+import gzip
+import logging
+import re
+import time
+from pathlib import Path
+from typing import AsyncIterator
+from typing import Iterator
+
+from tracker.capture import CaptureReader
+from tracker.capture import is_capture
+
+log = logging.getLogger(__name__)
+
+ROTATION_SUFFIX = re.compile(r"\.(\d+)(?:\.gz)?$")
+PACKET_TIMESTAMP = re.compile(rb"(\d{4})\.(\d{2})\.(\d{2})-(\d{2})\.(\d{2})\.(\d{2})")
+# How many packets are replayed between yields to the event loop when replaying as fast as possible
+YIELD_EVERY = 256
+
+
+def rotation_index(path: Path) -> int:
+    """The rotation number of a log file, raw_rcon.log is 0 and raw_rcon.log.3.gz is 3"""
+    if match := ROTATION_SUFFIX.search(path.name):
+        return int(match.group(1))
+    return 0
+
+
+def log_files(path: Path) -> list[Path]:
+    """
+    Returns the recording at `path` and every rotated file of it, oldest first. If `path` is itself a rotated or
+    compressed file, or a capture, only that file is returned.
+    """
+    if path.name.endswith(".gz") or rotation_index(path) or is_capture(path):
+        return [path]
+    rotated = [
+        rotated_path for rotated_path in path.parent.glob(path.name + ".*")
+        if ROTATION_SUFFIX.search(rotated_path.name)
+    ]
+    files = sorted(rotated, key=rotation_index, reverse=True)
+    if path.exists():
+        files.append(path)
+    return files
+
+
+def open_log(path: Path):
+    if path.name.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def read_packets(paths: list[Path], start: float = None) -> Iterator[tuple[[float, None], bytes]]:
+    """
+    Lazily yields the receive time and body of every recorded packet in the given files, in order. Logs don't record
+    receive times, their packets are yielded with None. Captures begin at the block holding `start` if it is given.
+    """
+    for path in paths:
+        if is_capture(path):
+            log.info(f"Replaying the RCON capture \"{path}\"")
+            yield from CaptureReader(path).packets(start)
+            continue
+        log.info(f"Replaying the RCON log \"{path}\"")
+        with open_log(path) as f:
+            for line in f:
+                if not (line := line.strip()):
+                    continue
+                # Each line is the repr of the packet body, e.g. b'Chat: ...\x00\x00'
+                try:
+                    yield None, ast.literal_eval(line)
+                except (ValueError, SyntaxError):
+                    yield None, line.encode()
+
+
+def packet_time(body: bytes) -> [float, None]:
+    """The Mordhau timestamp within a packet as seconds since the epoch, None if it doesn't carry one"""
+    if not (match := PACKET_TIMESTAMP.search(body)):
+        return None
+    return time.mktime((*map(int, match.groups()), 0, 0, -1))
+
+
+def recording_start(paths: list[Path]) -> [float, None]:
+    for recorded_at, body in read_packets(paths):
+        if (recorded_at := packet_time(body) if recorded_at is None else recorded_at) is not None:
+            return recorded_at
+    return None
+
+
+def valid_start(start: str) -> bool:
+    """Whether `start` is a start `start_time` can parse, checked before anything is replayed"""
+    if packet_time(start.encode()) is not None:
+        return True
+    try:
+        float(start[1:] if start.startswith("+") else start)
+    except ValueError:
+        return False
+    return True
+
+
+def start_time(start: str, paths: list[Path]) -> [float, None]:
+    """
+    Parses where a replay starts, either a Mordhau timestamp (2021.05.01-02.25.29), seconds since the epoch, or
+    `+<seconds>` into the recording
+    """
+    if start.startswith("+"):
+        if (first := recording_start(paths)) is None:
+            return None
+        return first + float(start[1:])
+    if recorded_at := packet_time(start.encode()):
+        return recorded_at
+    return float(start)
+
+
+async def replay(paths: list[Path], paced: bool = False, speed: float = 1, start: str = None) -> AsyncIterator[bytes]:
+    """
+    Yields the recorded packets in the given files. When paced, each packet is held back until as much time has
+    passed since the first packet as passed between them originally, divided by `speed`. When `start` is given (see
+    `start_time`) packets recorded before it are skipped.
+    """
+    skip_until = start_time(start, paths) if start else None
+    started_at = time.monotonic()
+    first_packet_time = None
+    for count, (recorded_at, body) in enumerate(read_packets(paths, skip_until)):
+        if recorded_at is None and (paced or skip_until is not None):
+            recorded_at = packet_time(body)
+        if skip_until is not None:
+            # Untimed packets, such as chat, are skipped until the first timed packet at or after the start
+            if recorded_at is None or recorded_at < skip_until:
+                continue
+            log.info(f"Replay starting from {time.strftime('%Y.%m.%d-%H.%M.%S', time.localtime(recorded_at))}")
+            skip_until = None
+        if paced and recorded_at is not None:
+            if first_packet_time is None:
+                first_packet_time = recorded_at
+            delay = (recorded_at - first_packet_time) / speed - (time.monotonic() - started_at)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif count % YIELD_EVERY == 0:
+            await asyncio.sleep(0)
+        yield body
@@ -0,0 +1,210 @@
+"""
+Decides the order RCON commands are sent to a server in.
+
+Every command is queued in a priority class, and the highest class with a command waiting is sent first, at most
+`RCON_MAX_IN_FLIGHT` commands at once:
+
+    query       commands whose response the tracker needs, such as `scoreboard` and `info`
+    control     commands that change the server, such as `changelevel`
+    chat        `say` messages
+
+So a burst of chat never holds up the queries a round end depends on. Chat messages are queued and the caller carries
+on without waiting for them to be sent. They are sent at most `RCON_CHAT_RATE` a second, in bursts of up to
+`RCON_CHAT_BURST`, and messages queued within `RCON_CHAT_MERGE_WINDOW` seconds of each other are sent as one, up to the
+300 characters a message can hold. How long commands wait in the queue is recorded per class.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable
+from typing import Callable
+
+from tracker.metrics import Metrics
+from tracker.settings import SchedulerSettings
+from tracker.settings import Settings
+from tracker.settings import on_configure
+
+log = logging.getLogger(__name__)
+
+PRIORITIES = ("query", "control", "chat")
+QUERY, CONTROL, CHAT = range(len(PRIORITIES))
+QUERY_COMMANDS = ("scoreboard", "info", "playerlist")
+CHAT_COMMANDS = ("say",)
+# The most characters Mordhau shows of a chat message
+CHAT_MESSAGE_LIMIT = 300
+
+queue_wait_time = Metrics.histogram("tracker_rcon_queue_seconds",
+                                    "Time RCON commands waited to be sent, by server and priority class",
+                                    ("server", "priority"))
+chat_merged = Metrics.counter("tracker_rcon_chat_merged_total", "Chat messages sent as part of an earlier message",
+                              ("server",))
+
+
+def priority(command: str) -> int:
+    name = command.split(" ", 1)[0].strip().casefold()
+    if name in QUERY_COMMANDS:
+        return QUERY
+    if name in CHAT_COMMANDS:
+        return CHAT
+    return CONTROL
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+
+    def delay(self) -> float:
+        """Seconds until a token is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class RconScheduler:
+    # Set from the settings by `configure` when the tracker starts, before the servers' schedulers are created
+    max_in_flight = SchedulerSettings.max_in_flight
+    chat_rate = SchedulerSettings.chat_rate
+    chat_burst = SchedulerSettings.chat_burst
+    merge_window = SchedulerSettings.chat_merge_window
+
+    def __init__(self, server_id: str, execute: Callable[[str], Awaitable[str]]):
+        self.server_id = server_id
+        self.execute = execute
+        # (command, the future its response is set on or None for chat, when it was queued) in each priority class
+        self.queues: list[deque] = [deque() for _ in PRIORITIES]
+        self.bucket = TokenBucket(self.chat_rate, self.chat_burst) if self.chat_rate > 0 else None
+        self.sending: set[asyncio.Task] = set()
+        self.dispatcher: [asyncio.Task, None] = None
+        self._wakeup: [asyncio.Event, None] = None
+        # While closing, queued chat is sent without waiting on the rate limit or the merge window
+        self.closing = False
+
+    @classmethod
+    def configure(cls, settings: Settings):
+        cls.max_in_flight = settings.scheduler.max_in_flight
+        cls.chat_rate = settings.scheduler.chat_rate
+        cls.chat_burst = settings.scheduler.chat_burst
+        cls.merge_window = settings.scheduler.chat_merge_window
+
+    def depth(self, level: int) -> int:
+        return len(self.queues[level])
+
+    async def submit(self, command: str) -> str:
+        """Queues a command and returns its response, chat returns as soon as it's queued with an empty response"""
+        if not self.dispatcher:
+            self._wakeup = asyncio.Event()
+            self.dispatcher = asyncio.create_task(self._dispatch())
+        level = priority(command)
+        future = None if level == CHAT else asyncio.get_running_loop().create_future()
+        self.queues[level].append((command, future, time.perf_counter()))
+        self._wakeup.set()
+        return await future if future else ""
+
+    def _chat_delay(self) -> float:
+        """Seconds until the next chat message can be sent, waiting on the rate limit and for messages to merge"""
+        if self.closing:
+            return 0
+        waited = time.perf_counter() - self.queues[CHAT][0][2]
+        return max(self.bucket.delay() if self.bucket else 0, self.merge_window - waited)
+
+    def _take(self, level: int) -> [tuple[str, list], None]:
+        """
+        Takes the next command of a class and the queue entries it answers. Chat merges the messages after it that fit
+        and were each queued within the merge window of the one before, or all that fit while closing.
+        """
+        queue = self.queues[level]
+        while queue and queue[0][1] is not None and queue[0][1].done():  # The caller stopped waiting
+            queue.popleft()
+        if not queue:
+            return None
+        entries = [queue.popleft()]
+        if level != CHAT:
+            return entries[0][0], entries
+        message = entries[0][0].split(" ", 1)[-1]
+        while queue and (self.closing or queue[0][2] - entries[-1][2] <= self.merge_window) and \
+                len(message) + 1 + len(next_message := queue[0][0].split(" ", 1)[-1]) <= CHAT_MESSAGE_LIMIT:
+            message = f"{message}\n{next_message}"
+            entries.append(queue.popleft())
+        if len(entries) > 1:
+            chat_merged.inc(self.server_id, amount=len(entries) - 1)
+        if self.bucket and not self.closing:
+            self.bucket.take()
+        return f"say {message}", entries
+
+    async def _dispatch(self):
+        while True:
+            self._wakeup.clear()
+            level = next((level for level, queue in enumerate(self.queues) if queue), None)
+            if level is None or len(self.sending) >= self.max_in_flight:
+                await self._wakeup.wait()
+                continue
+            if level == CHAT and (delay := self._chat_delay()) > 0:
+                # Anything queued while chat waits is sent first
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            if taken := self._take(level):
+                task = asyncio.create_task(self._send(level, *taken))
+                self.sending.add(task)
+                task.add_done_callback(self.sending.discard)
+
+    async def _send(self, level: int, command: str, entries: list):
+        sent_at = time.perf_counter()
+        for _, _, queued_at in entries:
+            queue_wait_time.observe(sent_at - queued_at, self.server_id, PRIORITIES[level])
+        try:
+            response = await self.execute(command)
+        except Exception as error:
+            for _, future, _ in entries:
+                if future and not future.done():
+                    future.set_exception(error)
+            if level == CHAT:
+                log.warning(f"Unable to send the chat message \"{command}\" to \"{self.server_id}\": {error!r}")
+            return
+        finally:
+            self.sending.discard(asyncio.current_task())  # Before waking the dispatcher, which counts what's sending
+            self._wakeup.set()
+        for _, future, _ in entries:
+            if future and not future.done():
+                future.set_result(response)
+
+    async def close(self, timeout: float = 2):
+        """Sends what is still queued, chat without its rate limit, for up to `timeout` seconds and stops"""
+        if self.dispatcher:
+            self.closing = True
+            self._wakeup.set()
+            deadline = time.monotonic() + timeout
+            while (any(self.queues) or self.sending) and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+        tasks = [task for task in (self.dispatcher, *self.sending) if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.dispatcher = None
+        self.closing = False  # A command submitted after closing starts it again, rate limited as before
+        if dropped := self.depth(CHAT):
+            log.warning(f"Dropped {dropped} chat messages still queued for \"{self.server_id}\"")
+        for queue in self.queues:
+            for _, future, _ in queue:
+                if future and not future.done():
+                    future.set_exception(ConnectionError("The RCON scheduler was closed"))
+            queue.clear()
+
+
+on_configure(RconScheduler.configure)
+
+__all__ = [
+    "RconScheduler"
+]
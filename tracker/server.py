@@ -0,0 +1,79 @@
+"""
+The Mordhau servers the tracker follows.
+
+One process can track several servers: set `RCON_SERVERS` to a comma delimited list of server ids, and give each its
+own connection details in `RCON_<ID>_IP`, `RCON_<ID>_PORT` and `RCON_<ID>_PASSWORD`. A detail that isn't set for a
+server falls back to the shared `RCON_IP`, `RCON_PORT` or `RCON_PASSWORD`. Without `RCON_SERVERS` the one server in
+`RCON_IP` and `RCON_PORT` is followed under the id "default".
+
+Each server has its own connections and game state, the API client, caches, outbox and metrics are shared between
+them. The messages from a server are handled with it set as the `current_server`, so `rcon_command` answers the server
+an event came from without the listeners passing it around. Commands are sent in priority order by the server's
+`RconScheduler`.
+"""
+
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+
+from tracker.metrics import Metrics
+from tracker.rcon import RconClient
+from tracker.rcon import RconPool
+from tracker.scheduler import RconScheduler
+from tracker.settings import DEFAULT_SERVER
+
+log = logging.getLogger(__name__)
+
+# The server whose messages are being handled, set by the ingest workers for every message
+current_server: ContextVar["Server"] = ContextVar("current_server")
+
+rcon_command_time = Metrics.histogram("tracker_rcon_command_seconds", "Round trip time of RCON commands",
+                                      ("server", "command"))
+rcon_command_errors = Metrics.counter("tracker_rcon_command_errors_total", "RCON commands that failed",
+                                      ("server", "command"))
+
+
+class Server:
+
+    def __init__(self, server_id: str, ip: str, port: int, password: str, pool_size: int = 2, timeout: float = 10,
+                 multi_packet: bool = True):
+        self.id = server_id
+        self.ip = ip
+        self.port = port
+        self.password = password
+        # Commands are issued over their own persistent connections, the listener is reserved for the listen stream
+        self.rcon_pool = RconPool(ip, port, password, size=pool_size, timeout=timeout, multi_packet=multi_packet)
+        self.listener = RconClient(ip, port, password, timeout=timeout, multi_packet=multi_packet)
+        self.scheduler = RconScheduler(server_id, self._execute)
+
+    def __repr__(self):
+        return f"Server(\"{self.id}\", {self.ip}:{self.port})"
+
+    async def rcon_command(self, command: str) -> str:
+        """Issues a command through the scheduler, `say` returns once the message is queued"""
+        return await self.scheduler.submit(command)
+
+    async def _execute(self, command: str) -> str:
+        log.debug(f"Issued RCON command to \"{self.id}\": \"{command.strip()}\"")
+        name = command.split(" ", 1)[0].strip()
+        issued_at = time.perf_counter()
+        try:
+            data = await self.rcon_pool.execute(command)
+        except Exception:
+            rcon_command_errors.inc(self.id, name)
+            raise
+        finally:
+            rcon_command_time.observe(time.perf_counter() - issued_at, self.id, name)
+        log.debug(f"\"{self.id}\" responded to RCON command \"{command}\" with \"{data.strip()}\"")
+        return data
+
+    async def close(self):
+        await self.scheduler.close()
+        await asyncio.gather(self.rcon_pool.close(), self.listener.close())
+
+
+__all__ = [
+    "Server",
+    "current_server"
+]
@@ -0,0 +1,409 @@
+"""
+The tracker's settings, read from the environment and validated once when it starts.
+
+`load_environment` loads the `.env` file in the root directory, variables that are already exported take precedence
+over it. `Settings.from_environment` then reads every variable the tracker has, and raises a `ConfigError` listing
+each one that is missing or invalid rather than stopping at the first one. Importing the tracker reads and loads
+nothing, so tests and tools can import it with whatever environment they set up.
+
+Each class configured by the settings starts out with the defaults below, and registers a function with `on_configure`
+that takes its section of the settings once they're applied with `Settings.apply`. Classes imported after that (the
+event listeners are imported as the tracker starts) are configured as they register.
+"""
+
+import math
+import os
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import Callable
+from typing import Mapping
+from urllib import parse
+
+from tracker import root_path
+
+environment_path = root_path.parent / ".env"
+
+DEFAULT_SERVER = "default"
+JSON_CODECS = ("orjson", "ujson", "json")
+OVERFLOW_POLICIES = ("drop-new", "drop-old", "block")
+CAPTURE_FORMATS = ("text", "binary", "both")
+ROUND_SUBMISSIONS = ("separate", "combined")
+
+
+class ConfigError(Exception):
+
+    def __init__(self, problems: list[str]):
+        self.problems = problems
+        super().__init__("\n".join(problems))
+
+
+def load_environment(path: Path = environment_path) -> bool:
+    """Loads a .env file into the environment, without overriding exported variables. Returns whether it existed"""
+    if not path.exists():
+        return False
+    from dotenv import load_dotenv
+
+    load_dotenv(path)
+    return True
+
+
+@dataclass(frozen=True)
+class ServerSettings:
+    id: str
+    ip: str
+    port: int
+    password: str
+
+
+@dataclass(frozen=True)
+class APISettings:
+    connect_timeout: float = 5
+    read_timeout: float = 30
+    connection_limit: int = 100
+    connection_limit_per_host: int = 20
+    keepalive_timeout: float = 30
+    get_retries: int = 0
+    retry_backoff: float = 0.5
+    # Request bodies of at least compression_min_size bytes are sent gzip compressed, if the API accepts them
+    compression: bool = False
+    compression_min_size: int = 1024
+    compression_level: int = 6
+    # "auto" or one of JSON_CODECS
+    json: str = "auto"
+    # "combined" queues each round with its players as one write, consecutive rounds are delivered in batches
+    round_submission: str = "separate"
+
+
+@dataclass(frozen=True)
+class SchedulerSettings:
+    max_in_flight: int = 4
+    chat_rate: float = 2
+    chat_burst: float = 5
+    chat_merge_window: float = 0.05
+
+
+@dataclass(frozen=True)
+class CaptureSettings:
+    # "text" keeps only the raw_rcon log, "binary" only the capture and "both" records to both
+    format: str = "text"
+    path: Path = root_path.parent / "raw_rcon.rcap"
+    block_size: int = 256 * 1024
+    flush_interval: float = 5
+    compression_level: int = 6
+
+
+@dataclass(frozen=True)
+class OutboxSettings:
+    path: Path = root_path.parent / "outbox.sqlite3"
+    backoff: float = 1
+    max_backoff: float = 60
+    # Delivered, failed and dead writes are kept this long so later writes can still reference their responses
+    retention: float = 7 * 24 * 60 * 60
+    # The most pending writes delivered in one request, for the endpoints that take batches
+    batch_size: int = 20
+    # Failed answers from the API before a write is dead-lettered, 0 retries forever. The API being unreachable doesn't
+    # count, writes wait out an outage however long it is
+    max_attempts: int = 20
+
+
+@dataclass(frozen=True)
+class IngestSettings:
+    workers: int = 4
+    queue_size: int = 1000
+    shed_threshold: float = 0.5
+    # How long stopping waits for the queued messages to be handled
+    drain_timeout: float = 30
+    ordered_types: tuple[str, ...] = ("Scorefeed:", "MatchState:", "Chat:", "Killfeed:", "Login:")
+
+
+@dataclass(frozen=True)
+class MetricsSettings:
+    host: str = "127.0.0.1"
+    # Metrics are only served when a port is set
+    port: [int, None] = None
+    snapshot_path: [Path, None] = None
+    snapshot_interval: float = 60
+
+
+@dataclass(frozen=True)
+class LogQueueSettings:
+    enabled: bool = True
+    size: int = 10000
+    overflow: str = "drop-new"
+
+
+@dataclass(frozen=True)
+class MatchSettings:
+    admins: tuple[str, ...] = ()
+    valid_maps: tuple[str, ...] = ()
+    # How many players are looked up or registered with the API at once while processing a round end
+    round_end_concurrency: int = 8
+    # Round ends read the stats aggregated from the Killfeed, rather than waiting on the scoreboard
+    live_stats: bool = False
+    # Seconds between the scoreboard checks that reconcile the live stats, 0 turns them off
+    reconcile_interval: float = 60
+    # Seconds between reads of each server's info, 0 turns them off
+    server_state_interval: float = 300
+    chat_prefix: str = "-"
+
+
+@dataclass(frozen=True)
+class PlayerSettings:
+    cache_ttl: float = 7 * 24 * 60 * 60
+    cache_size: int = 10000
+    cache_path: Path = root_path.parent / "player_cache.json"
+    prefetch: bool = True
+    prefetch_concurrency: int = 4
+
+
+@dataclass(frozen=True)
+class TeamSettings:
+    cache_ttl: float = 60 * 60
+    cache_size: int = 1000
+    # The upstream API has no endpoint listing every team, teams are only listed when one is set
+    list_endpoint: str = ""
+    refresh_interval: float = 10 * 60
+
+
+# Called with the settings once they're applied, see `on_configure`
+_configures: list[Callable[["Settings"], None]] = []
+_applied: ["Settings", None] = None
+
+
+def on_configure(configure: Callable[["Settings"], None]):
+    """Calls `configure` with the settings when they're applied, straight away if they already were"""
+    _configures.append(configure)
+    if _applied is not None:
+        configure(_applied)
+
+
+@dataclass(frozen=True)
+class Settings:
+    api_url: str
+    api_token: str
+    servers: tuple[ServerSettings, ...]
+    # Splits the servers between this many processes, each tracking its share of them
+    processes: int = 1
+    # Set in the processes started to track a share of the servers, see `Base.run_shards`
+    shard: [int, None] = None
+    pool_size: int = 2
+    command_timeout: float = 10
+    # Whether RCON responses can span several packets, see `tracker.rcon`
+    multi_packet: bool = True
+    log_config_path: Path = root_path / "log_config.yaml"
+    # Log files with relative paths in the log config are written here
+    log_directory: Path = Path(".")
+    api: APISettings = field(default_factory=APISettings)
+    scheduler: SchedulerSettings = field(default_factory=SchedulerSettings)
+    capture: CaptureSettings = field(default_factory=CaptureSettings)
+    outbox: OutboxSettings = field(default_factory=OutboxSettings)
+    ingest: IngestSettings = field(default_factory=IngestSettings)
+    metrics: MetricsSettings = field(default_factory=MetricsSettings)
+    log_queue: LogQueueSettings = field(default_factory=LogQueueSettings)
+    match: MatchSettings = field(default_factory=MatchSettings)
+    player: PlayerSettings = field(default_factory=PlayerSettings)
+    team: TeamSettings = field(default_factory=TeamSettings)
+
+    def apply(self):
+        """Configures every class that registered with `on_configure`, and the ones that register later"""
+        global _applied
+        _applied = self
+        for configure in _configures:
+            configure(self)
+
+    @classmethod
+    def from_environment(cls, environment: Mapping[str, str] = None) -> "Settings":
+        """Reads the settings from the environment, or the mapping given, raising a ConfigError if any are invalid"""
+        environment = os.environ if environment is None else environment
+        problems = []
+
+        def variable(*names: str) -> tuple[str, [str, None]]:
+            """The first of the variables that is set, and its value"""
+            for name in names:
+                if value := environment.get(name, "").strip():
+                    return name, value
+            return names[0], None
+
+        def number(name: str, default, kind=int, minimum=None, maximum=None, above=None):
+            """A number from `minimum` to `maximum`, or strictly greater than `above`. nan and inf are never valid"""
+            if not (value := environment.get(name, "").strip()):
+                return default
+            try:
+                result = kind(value)
+            except ValueError:
+                result = None
+            if result is None or not math.isfinite(result):
+                problems.append(f"{name} should be a {'WHOLE ' if kind is int else ''}number, not \"{value}\"")
+                return default
+            if minimum is not None and result < minimum:
+                problems.append(f"{name} should be at least {minimum}, not \"{value}\"")
+                return default
+            if maximum is not None and result > maximum:
+                problems.append(f"{name} should be at most {maximum}, not \"{value}\"")
+                return default
+            if above is not None and result <= above:
+                problems.append(f"{name} should be above {above}, not \"{value}\"")
+                return default
+            return result
+
+        def flag(name: str, default: bool) -> bool:
+            if not (value := environment.get(name, "").strip()):
+                return default
+            return value.casefold() not in ("false", "0", "no")
+
+        def choice(name: str, default: str, choices: tuple[str, ...]) -> str:
+            if not (value := environment.get(name, "").strip().casefold()):
+                return default
+            if value not in choices:
+                problems.append(f"{name} should be one of {', '.join(choices)}, not \"{value}\"")
+                return default
+            return value
+
+        def names(name: str) -> tuple[str, ...]:
+            """A comma delimited list"""
+            return tuple(item.strip() for item in environment.get(name, "").split(",") if item.strip())
+
+        def path(name: str, default: [Path, None]) -> [Path, None]:
+            return Path(value) if (value := environment.get(name, "").strip()) else default
+
+        api_url_variable, api_url = variable("API_URL")
+        if not api_url:
+            problems.append(f"A(n) API URL ({api_url_variable}) was not set in the environment")
+        elif not all(getattr(parse.urlparse(api_url), part) for part in ("scheme", "netloc")):
+            problems.append(f"The API URL ({api_url_variable}) should be a full URL (e.g. https://example.com/api), "
+                            f"not \"{api_url}\"")
+        api_token_variable, api_token = variable("API_TOKEN")
+        if not api_token:
+            problems.append(f"A(n) API Token ({api_token_variable}) was not set in the environment")
+
+        server_ids = [server_id.strip() for server_id in environment.get("RCON_SERVERS", "").split(",")
+                      if server_id.strip()] or [DEFAULT_SERVER]
+        servers = []
+        for server_id in dict.fromkeys(server_ids):
+            # A server's own variables, falling back to the shared ones, the default server only has the latter
+            prefixes = ["RCON_"] if server_id == DEFAULT_SERVER else [f"RCON_{server_id.upper()}_", "RCON_"]
+            ip_variable, ip = variable(*(f"{prefix}IP" for prefix in prefixes))
+            if not ip:
+                problems.append(f"A(n) IP address ({ip_variable}) was not set in the environment")
+            port_variable, port = variable(*(f"{prefix}PORT" for prefix in prefixes))
+            if not port:
+                problems.append(f"A(n) RCON port ({port_variable}) was not set in the environment")
+            elif not port.isdigit() or not 0 < int(port) < 65536:
+                problems.append(f"The RCON port ({port_variable}) was not a valid port number, should be a WHOLE "
+                                f"number (e.g. 123), not \"{port}\"")
+            password_variable, password = variable(*(f"{prefix}PASSWORD" for prefix in prefixes))
+            if not password:
+                problems.append(f"A(n) RCON password ({password_variable}) was not set in the environment")
+            if ip and port and port.isdigit() and password:
+                servers.append(ServerSettings(server_id, ip, int(port), password))
+
+        ordered_types = names("INGEST_ORDERED_TYPES")
+        settings = cls(
+            api_url=(api_url or "").strip("/"),
+            api_token=api_token or "",
+            servers=tuple(servers),
+            processes=number("RCON_PROCESSES", 1, minimum=1),
+            shard=number("RCON_SHARD", None, minimum=0),
+            pool_size=number("RCON_POOL_SIZE", 2, minimum=1),
+            command_timeout=number("RCON_COMMAND_TIMEOUT", 10.0, float, above=0),
+            multi_packet=flag("RCON_MULTI_PACKET", True),
+            log_config_path=path("LOG_CONFIG_PATH", cls.log_config_path),
+            log_directory=path("LOG_DIRECTORY", cls.log_directory),
+            api=APISettings(
+                connect_timeout=number("API_CONNECT_TIMEOUT", APISettings.connect_timeout, float, minimum=0),
+                read_timeout=number("API_READ_TIMEOUT", APISettings.read_timeout, float, minimum=0),
+                connection_limit=number("API_CONNECTION_LIMIT", APISettings.connection_limit, minimum=0),
+                connection_limit_per_host=number("API_CONNECTION_LIMIT_PER_HOST",
+                                                 APISettings.connection_limit_per_host, minimum=0),
+                keepalive_timeout=number("API_KEEPALIVE_TIMEOUT", APISettings.keepalive_timeout, float, minimum=0),
+                get_retries=number("API_GET_RETRIES", APISettings.get_retries, minimum=0),
+                retry_backoff=number("API_RETRY_BACKOFF", APISettings.retry_backoff, float, minimum=0),
+                compression=flag("API_COMPRESSION", APISettings.compression),
+                compression_min_size=number("API_COMPRESSION_MIN_SIZE", APISettings.compression_min_size, minimum=0),
+                compression_level=number("API_COMPRESSION_LEVEL", APISettings.compression_level, minimum=1, maximum=9),
+                json=choice("API_JSON", APISettings.json, ("auto", *JSON_CODECS)),
+                round_submission=choice("API_ROUND_SUBMISSION", APISettings.round_submission, ROUND_SUBMISSIONS),
+            ),
+            scheduler=SchedulerSettings(
+                max_in_flight=number("RCON_MAX_IN_FLIGHT", SchedulerSettings.max_in_flight, minimum=1),
+                chat_rate=number("RCON_CHAT_RATE", SchedulerSettings.chat_rate, float, minimum=0),
+                chat_burst=number("RCON_CHAT_BURST", SchedulerSettings.chat_burst, float, minimum=0),
+                chat_merge_window=number("RCON_CHAT_MERGE_WINDOW", SchedulerSettings.chat_merge_window, float,
+                                           minimum=0),
+            ),
+            capture=CaptureSettings(
+                format=choice("CAPTURE_FORMAT", CaptureSettings.format, CAPTURE_FORMATS),
+                path=path("CAPTURE_PATH", CaptureSettings.path),
+                block_size=number("CAPTURE_BLOCK_SIZE", CaptureSettings.block_size, minimum=1),
+                flush_interval=number("CAPTURE_FLUSH_INTERVAL", CaptureSettings.flush_interval, float, minimum=0),
+                compression_level=number("CAPTURE_COMPRESSION_LEVEL", CaptureSettings.compression_level,
+                                         minimum=1, maximum=9),
+            ),
+            outbox=OutboxSettings(
+                path=path("OUTBOX_PATH", OutboxSettings.path),
+                backoff=number("OUTBOX_BACKOFF", OutboxSettings.backoff, float, minimum=0),
+                max_backoff=number("OUTBOX_MAX_BACKOFF", OutboxSettings.max_backoff, float, minimum=0),
+                retention=number("OUTBOX_RETENTION", OutboxSettings.retention, float, minimum=0),
+                batch_size=number("OUTBOX_BATCH_SIZE", OutboxSettings.batch_size, minimum=1),
+                max_attempts=number("OUTBOX_MAX_ATTEMPTS", OutboxSettings.max_attempts, minimum=0),
+            ),
+            ingest=IngestSettings(
+                workers=number("INGEST_WORKERS", IngestSettings.workers, minimum=1),
+                queue_size=number("INGEST_QUEUE_SIZE", IngestSettings.queue_size, minimum=0),
+                shed_threshold=number("INGEST_SHED_THRESHOLD", IngestSettings.shed_threshold, float, maximum=1,
+                                      above=0),
+                drain_timeout=number("INGEST_DRAIN_TIMEOUT", IngestSettings.drain_timeout, float, minimum=0),
+                ordered_types=tuple(f"{mord_type.rstrip(':')}:" for mord_type in ordered_types)
+                if ordered_types else IngestSettings.ordered_types,
+            ),
+            metrics=MetricsSettings(
+                host=variable("METRICS_HOST")[1] or MetricsSettings.host,
+                port=number("METRICS_PORT", 0, minimum=0) or None,
+                snapshot_path=path("METRICS_SNAPSHOT_PATH", None),
+                snapshot_interval=number("METRICS_SNAPSHOT_INTERVAL", MetricsSettings.snapshot_interval, float,
+                                         above=0),
+            ),
+            log_queue=LogQueueSettings(
+                enabled=flag("LOG_QUEUE", LogQueueSettings.enabled),
+                size=number("LOG_QUEUE_SIZE", LogQueueSettings.size, minimum=0),
+                overflow=choice("LOG_QUEUE_OVERFLOW", LogQueueSettings.overflow, OVERFLOW_POLICIES),
+            ),
+            match=MatchSettings(
+                admins=names("MATCH_ADMINS"),
+                valid_maps=names("MATCH_VALID_MAPS"),
+                round_end_concurrency=number("MATCH_ROUND_END_CONCURRENCY", MatchSettings.round_end_concurrency,
+                                             minimum=1),
+                live_stats=flag("MATCH_LIVE_STATS", MatchSettings.live_stats),
+                reconcile_interval=number("MATCH_RECONCILE_INTERVAL", MatchSettings.reconcile_interval, float,
+                                            minimum=0),
+                server_state_interval=number("SERVER_STATE_RECONCILE_INTERVAL", MatchSettings.server_state_interval,
+                                             float, minimum=0),
+                chat_prefix=variable("CHAT_PREFIX")[1] or MatchSettings.chat_prefix,
+            ),
+            player=PlayerSettings(
+                cache_ttl=number("PLAYER_CACHE_TTL", PlayerSettings.cache_ttl, float, minimum=0),
+                cache_size=number("PLAYER_CACHE_SIZE", PlayerSettings.cache_size, minimum=1),
+                cache_path=path("PLAYER_CACHE_PATH", PlayerSettings.cache_path),
+                prefetch=flag("PLAYER_PREFETCH", PlayerSettings.prefetch),
+                prefetch_concurrency=number("PLAYER_PREFETCH_CONCURRENCY", PlayerSettings.prefetch_concurrency,
+                                            minimum=1),
+            ),
+            team=TeamSettings(
+                cache_ttl=number("TEAM_CACHE_TTL", TeamSettings.cache_ttl, float, minimum=0),
+                cache_size=number("TEAM_CACHE_SIZE", TeamSettings.cache_size, minimum=1),
+                list_endpoint=variable("TEAM_LIST_ENDPOINT")[1] or TeamSettings.list_endpoint,
+                refresh_interval=number("TEAM_REFRESH_INTERVAL", TeamSettings.refresh_interval, float, minimum=0),
+            ),
+        )
+        if problems:
+            raise ConfigError(problems)
+        return settings
+
+
+__all__ = [
+    "ConfigError",
+    "Settings",
+    "load_environment",
+    "on_configure"
+]